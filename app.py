@@ -1,5 +1,7 @@
 import streamlit as st
 import requests
+import json
+import time
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
 
@@ -33,6 +35,8 @@ def render_qa_history(placeholder, qa_list):
             for qa in qa_list:
                 st.markdown(f"**Q:** {qa['question']}")
                 st.markdown(f"**A:** {qa['answer']}")
+                if qa.get("sources"):
+                    st.caption(f"📚 근거: {qa['sources']}")
                 st.markdown(
                     f"<small>{qa.get('created_at', '')}</small>",
                     unsafe_allow_html=True,
@@ -42,15 +46,52 @@ def render_qa_history(placeholder, qa_list):
             st.info("❗ 질문 히스토리가 없습니다.")
 
 
+# ✅ 조건부 GET: 이전 응답의 ETag를 보내고 304면 세션에 보관한 본문 재사용
+def _cached_get(url, params=None):
+    cache = st.session_state.setdefault("http_cache", {})
+    key = (url, tuple(sorted((params or {}).items())))
+    prev = cache.get(key)
+    headers = {"If-None-Match": prev["etag"]} if prev else {}
+    r = requests.get(url, params=params, headers=headers)
+    if r.status_code == 304 and prev:
+        return prev["body"], prev["next"]
+    r.raise_for_status()
+    body, nxt = r.json(), r.headers.get("X-Next-Cursor")
+    if r.headers.get("ETag"):
+        cache[key] = {"etag": r.headers["ETag"], "body": body, "next": nxt}
+    return body, nxt
+
+
+def fetch_document_list():
+    """선택 목록용: id/filename만, 페이지를 따라가며 전체 수집"""
+    docs, cursor = [], None
+    while True:
+        params = {"fields": "id,filename", "limit": 500}
+        if cursor:
+            params["after_id"] = cursor
+        page, cursor = _cached_get(f"{FASTAPI_URL}/documents", params)
+        docs.extend(page)
+        if not cursor:
+            return docs
+
+
+def fetch_document(doc_id):
+    try:
+        doc, _ = _cached_get(f"{FASTAPI_URL}/documents/{doc_id}")
+        return doc
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
+
+
 # ----------------- 🔹 사이드바 -------------------
 with st.sidebar:
     st.markdown(f"👤 **사용자:** `{user_email}`")
     st.markdown("### 📁 문서 선택")
 
     try:
-        resp = requests.get(f"{FASTAPI_URL}/documents")
-        resp.raise_for_status()
-        doc_list = resp.json()
+        doc_list = fetch_document_list()
     except Exception as e:
         st.error(f"문서 목록 조회 실패: {e}")
         doc_list = []
@@ -133,6 +174,25 @@ if st.session_state["selected_doc_id"] is None and st.session_state["is_new_anal
                 response.raise_for_status()
                 result = response.json()
 
+                # ⏳ 202(작업 등록)이면 상태 엔드포인트를 폴링하며 노드별 진행률 표시
+                if response.status_code == 202:
+                    progress = st.progress(0.0, text="분석 대기 중...")
+                    while True:
+                        status = requests.get(
+                            f"{FASTAPI_URL}/documents/{result['document_id']}/status"
+                        ).json()
+                        nodes = status.get("nodes") or {}
+                        done = sum(1 for v in nodes.values() if v == "done")
+                        progress.progress(
+                            done / len(nodes) if nodes else 0.0,
+                            text=f"분석 중... ({done}/{len(nodes)} 단계)",
+                        )
+                        if status.get("status") == "done":
+                            break
+                        if status.get("status") == "failed":
+                            raise RuntimeError(status.get("error") or "분석 실패")
+                        time.sleep(1)
+
                 # 🔁 업로드 성공 후 상태 갱신 & 상세 화면으로 전환
                 st.session_state["selected_doc_id"] = result["document_id"]
                 st.session_state["is_new_analysis"] = False
@@ -147,8 +207,7 @@ if st.session_state["selected_doc_id"] is None and st.session_state["is_new_anal
 elif st.session_state["selected_doc_id"] is not None:
     doc_id = st.session_state["selected_doc_id"]
     try:
-        docs = requests.get(f"{FASTAPI_URL}/documents").json()
-        doc_info = next((doc for doc in docs if doc["id"] == doc_id), None)
+        doc_info = fetch_document(doc_id)
 
         if doc_info:
             st.subheader("🧠 기술 도메인")
@@ -183,28 +242,63 @@ elif st.session_state["selected_doc_id"] is not None:
 user_question = st.chat_input("질문을 입력하세요.")
 doc_id = st.session_state.get("selected_doc_id")
 
-if user_question and doc_id is not None:
-    with st.spinner("⏳ 답변 생성 중..."):
-        try:
-            r = requests.post(
-                f"{FASTAPI_URL}/qa/ask_existing",
-                json={"document_id": doc_id, "question": user_question},
-            )
-            r.raise_for_status()
-            ans = r.json().get("answer", "")
-            KST = timezone(timedelta(hours=9))
-            created_at_str = datetime.now(KST).strftime("%Y-%m-%d %H:%M:%S")
-
-            st.session_state["qa_list"].append(
-                {
-                    "question": user_question,
-                    "answer": ans,
-                    "created_at": created_at_str,
-                }
-            )
+def stream_answer(doc_id, question, placeholder, sources_placeholder):
+    """
+    SSE 스트림을 읽으며 토큰을 placeholder에 점진적으로 렌더링, (최종 답변, 근거 문자열) 반환
+    근거는 답변 토큰이 덮어쓰지 않도록 별도 sources_placeholder에 표시
+    """
+    answer = ""
+    sources = ""
+    event = None
+    with requests.post(
+        f"{FASTAPI_URL}/qa/ask_existing/stream",
+        json={"document_id": doc_id, "question": question},
+        stream=True,
+    ) as r:
+        r.raise_for_status()
+        for line in r.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+                continue
+            if not line.startswith("data:"):
+                continue
+            data = json.loads(line[len("data:"):].strip())
+            if event == "citations" and data:
+                sources = ", ".join(
+                    f"Doc#{c['doc']}({c.get('section') or 'N/A'})" for c in data
+                )
+                sources_placeholder.caption(f"📚 근거: {sources}")
+            elif event == "token":
+                answer += data.get("text", "")
+                placeholder.markdown(f"**Q:** {question}\n\n**A:** {answer}▌")
+            elif event == "done":
+                answer = data.get("answer", answer)
+            elif event == "error":
+                raise RuntimeError(data.get("detail"))
+    return answer, sources
 
-            # 🔁 전체 다시 렌더링!
-            st.rerun()
 
-        except Exception as e:
-            st.error(f"❌ 질문 실패: {e}")
+if user_question and doc_id is not None:
+    try:
+        answer_placeholder = st.empty()
+        sources_placeholder = st.empty()
+        ans, sources = stream_answer(doc_id, user_question, answer_placeholder, sources_placeholder)
+        KST = timezone(timedelta(hours=9))
+        created_at_str = datetime.now(KST).strftime("%Y-%m-%d %H:%M:%S")
+
+        st.session_state["qa_list"].append(
+            {
+                "question": user_question,
+                "answer": ans,
+                "sources": sources,
+                "created_at": created_at_str,
+            }
+        )
+
+        # 🔁 전체 다시 렌더링!
+        st.rerun()
+
+    except Exception as e:
+        st.error(f"❌ 질문 실패: {e}")
@@ -0,0 +1,269 @@
+# backend/bulk_ingest.py
+# ------------------------------------------------------------
+# PDF 대량 적재 (디렉터리 / 여러 파일 일괄)
+# - 2단 파이프라인:
+#     read 단계   : 내용 주소 저장 + SHA-256 중복 검사 + PDF 파싱 (BULK_READ_WORKERS)
+#     analyze 단계: 청크/임베딩/요약/분류 그래프 + DB/인덱스 저장 (BULK_ANALYZE_WORKERS)
+#   → 다음 파일 파싱이 앞 파일의 임베딩/LLM 호출과 겹쳐 실행
+# - 파싱을 마치고 분석을 기다리는 문서 수는 BULK_PREFETCH로 제한 (메모리 상한)
+# - 파일별 오류 격리: 한 파일 실패가 나머지 적재를 멈추지 않음
+# - 진행 상황은 JSON 파일에 기록 → 같은 진행 파일로 재실행하면 done/duplicate 파일은 건너뜀
+#   파일 상태가 바뀔 때마다 쓰지 않고 BULK_PROGRESS_SAVE_SEC마다 한 번 (+ 실행 종료 시) 임시 파일 → os.replace
+#   (중단되면 마지막 저장 이후 끝난 파일은 다시 처리되지만 checksum 중복 검사로 duplicate 처리)
+# - 처리량 보고: 문서/분, 토큰/초
+# ------------------------------------------------------------
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from backend import models
+from backend.database import SessionLocal
+from backend.jobs import prepare_state, run_graph
+from backend.storage import UPLOAD_DIR, store_file
+
+from services.token_utils import count_tokens
+
+BULK_READ_WORKERS = int(os.getenv("BULK_READ_WORKERS", "2"))
+BULK_ANALYZE_WORKERS = int(os.getenv("BULK_ANALYZE_WORKERS", "2"))
+BULK_PREFETCH = int(os.getenv("BULK_PREFETCH", "4"))  # 파싱 완료 후 분석 대기 중인 문서 수 상한
+BULK_PROGRESS_FILE = ".bulk_ingest.json"              # 디렉터리 적재 시 진행 파일 이름
+BULK_JOB_DIR = os.path.join(UPLOAD_DIR, ".bulk")      # 업로드 일괄 적재의 진행 파일 위치
+BULK_INGEST_ROOT = os.getenv("BULK_INGEST_ROOT", UPLOAD_DIR)  # API로 지정 가능한 디렉터리의 상위 경로
+BULK_PROGRESS_SAVE_SEC = float(os.getenv("BULK_PROGRESS_SAVE_SEC", "2"))  # 진행 파일 저장 최소 간격
+
+_FINISHED = ("done", "duplicate")
+
+logger = logging.getLogger(__name__)
+
+_BULK_JOBS: Dict[str, "BulkIngest"] = {}
+_BULK_LOCK = threading.Lock()
+
+
+def list_pdfs(directory: str) -> List[str]:
+    """디렉터리(하위 포함)의 PDF 경로 목록 (정렬)."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".pdf"))
+    return paths
+
+
+def resolve_directory(directory: str) -> Optional[str]:
+    """BULK_INGEST_ROOT 하위 디렉터리면 실제 경로, 아니면 None (API 입력 검증용)."""
+    root = os.path.realpath(BULK_INGEST_ROOT)
+    path = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+        return None
+    return path
+
+
+class BulkIngest:
+    """
+    items: [(원본 경로, 표시용 파일명)] — 파일명은 제목/출처 메타와 Document.filename에 사용
+    progress_path: 진행 파일 경로 (있으면 불러와 이어서 실행)
+    """
+
+    def __init__(
+        self,
+        items: List[Tuple[str, str]],
+        progress_path: str,
+        user_id: int = 1,
+        read_workers: int = BULK_READ_WORKERS,
+        analyze_workers: int = BULK_ANALYZE_WORKERS,
+        prefetch: int = BULK_PREFETCH,
+    ):
+        self.items = items
+        self.progress_path = progress_path
+        self.user_id = user_id
+        self.read_workers = max(1, read_workers)
+        self.analyze_workers = max(1, analyze_workers)
+        self._buffer = threading.BoundedSemaphore(max(1, prefetch))
+        self._lock = threading.Lock()
+        self._files: Dict[str, Dict[str, Any]] = self._load_progress()
+        self._dirty = False
+        self._saved_at = 0.0
+        self._pending: List[Future] = []
+        self.status = "queued"
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.tokens = 0    # 이번 실행에서 분석한 문서의 청크 토큰 합 (임베딩 입력 기준)
+        self.analyzed = 0  # 이번 실행에서 분석을 마친 문서 수
+
+    # ---- 진행 파일 ----
+    def _load_progress(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.progress_path):
+            return {}
+        try:
+            with open(self.progress_path, encoding="utf-8") as f:
+                return json.load(f).get("files", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_progress_locked(self) -> None:
+        os.makedirs(os.path.dirname(self.progress_path) or ".", exist_ok=True)
+        tmp = f"{self.progress_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self._files}, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.progress_path)
+        self._dirty = False
+        self._saved_at = time.time()
+
+    def _record(self, src: str, **fields: Any) -> None:
+        with self._lock:
+            entry = self._files.setdefault(src, {})
+            entry.update(fields)
+            self._dirty = True
+            if time.time() - self._saved_at >= BULK_PROGRESS_SAVE_SEC:
+                self._save_progress_locked()
+
+    def _flush_progress(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._save_progress_locked()
+
+    # ---- 파이프라인 단계 ----
+    def _read(self, src: str, filename: str, analyze_pool: ThreadPoolExecutor) -> None:
+        self._buffer.acquire()
+        handed_off = False
+        db = SessionLocal()
+        try:
+            self._record(src, status="reading", error=None)
+            file_path, checksum = store_file(src)
+
+            # 같은 내용이 이미 분석돼 있으면 건너뜀 (분석 실패로 결과가 없는 행은 재사용)
+            document = (
+                db.query(models.Document)
+                .filter(models.Document.user_id == self.user_id)
+                .filter(models.Document.checksum == checksum)
+                .first()
+            )
+            if document is not None and document.summary is not None:
+                self._record(src, status="duplicate", checksum=checksum, document_id=document.id)
+                return
+            if document is None:
+                document = models.Document(
+                    user_id=self.user_id,
+                    filename=filename,
+                    file_path=file_path,
+                    checksum=checksum,
+                    uploaded_at=datetime.utcnow(),
+                )
+                db.add(document)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # 같은 내용을 다른 작업/업로드가 먼저 등록 (uq_documents_user_checksum)
+                    db.rollback()
+                    self._record(src, status="duplicate", checksum=checksum)
+                    return
+                db.refresh(document)
+
+            state = prepare_state(document.file_path or file_path, filename)
+            self._record(src, status="parsed", checksum=checksum, document_id=document.id)
+            fut = analyze_pool.submit(self._analyze, src, document.id, state)
+            with self._lock:
+                self._pending.append(fut)
+            handed_off = True
+        except Exception as e:
+            db.rollback()
+            logger.exception("bulk ingest: reading %s failed", src)
+            self._record(src, status="failed", error=str(e))
+        finally:
+            db.close()
+            if not handed_off:
+                self._buffer.release()
+
+    def _analyze(self, src: str, document_id: int, state: Dict[str, Any]) -> None:
+        db = SessionLocal()
+        t0 = time.time()
+        try:
+            self._record(src, status="analyzing")
+            out = run_graph(db, document_id, state)
+            # 토큰 수는 실제 청크 텍스트 기준 (스트리밍 모드의 raw_text는 분류용 앞부분뿐)
+            tokens = sum(count_tokens(t) for t in out.get("raw_texts") or [])
+            with self._lock:
+                self.tokens += tokens
+                self.analyzed += 1
+            self._record(src, status="done", tokens=tokens, seconds=round(time.time() - t0, 2))
+        except Exception as e:
+            db.rollback()
+            logger.exception("bulk ingest: analyzing %s (document %s) failed", src, document_id)
+            self._record(src, status="failed", error=str(e))
+        finally:
+            db.close()
+            self._buffer.release()
+
+    # ---- 실행 ----
+    def run(self) -> Dict[str, Any]:
+        self.status = "running"
+        self.started_at = time.time()
+        todo = [(src, name) for src, name in self.items if self._files.get(src, {}).get("status") not in _FINISHED]
+        for src, _ in todo:
+            self._record(src, status="pending")
+        self._flush_progress()
+
+        analyze_pool = ThreadPoolExecutor(max_workers=self.analyze_workers, thread_name_prefix="bulk-analyze")
+        try:
+            with ThreadPoolExecutor(max_workers=self.read_workers, thread_name_prefix="bulk-read") as read_pool:
+                for src, name in todo:
+                    read_pool.submit(self._read, src, name, analyze_pool)
+            # read 단계가 모두 끝난 뒤에는 analyze 작업이 더 늘어나지 않음
+            for fut in list(self._pending):
+                fut.result()
+        finally:
+            analyze_pool.shutdown(wait=True)
+            self._flush_progress()
+            self.finished_at = time.time()
+            self.status = "done"
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        """진행 현황 + 처리량 (이번 실행에서 분석한 문서 기준)."""
+        with self._lock:
+            files = {src: dict(v) for src, v in self._files.items()}
+            tokens, analyzed = self.tokens, self.analyzed
+        counts: Dict[str, int] = {}
+        for v in files.values():
+            counts[v.get("status", "pending")] = counts.get(v.get("status", "pending"), 0) + 1
+
+        elapsed = 0.0
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "status": self.status,
+            "total": len(self.items),
+            "counts": counts,
+            "elapsed_sec": round(elapsed, 2),
+            "analyzed": analyzed,
+            "docs_per_min": round(analyzed / elapsed * 60, 2) if elapsed else 0.0,
+            "tokens_per_sec": round(tokens / elapsed, 1) if elapsed else 0.0,
+            "failed": {src: v.get("error") for src, v in files.items() if v.get("status") == "failed"},
+        }
+
+
+# ---- 서버용 백그라운드 일괄 작업 ----
+def start_bulk(items: List[Tuple[str, str]], progress_path: Optional[str] = None, user_id: int = 1) -> str:
+    """일괄 적재를 백그라운드 스레드로 시작하고 job_id 반환."""
+    job_id = uuid.uuid4().hex[:12]
+    job = BulkIngest(items, progress_path or os.path.join(BULK_JOB_DIR, f"{job_id}.json"), user_id=user_id)
+    with _BULK_LOCK:
+        _BULK_JOBS[job_id] = job
+    threading.Thread(target=job.run, name=f"bulk-{job_id}", daemon=True).start()
+    return job_id
+
+
+def get_bulk(job_id: str) -> Optional[Dict[str, Any]]:
+    with _BULK_LOCK:
+        job = _BULK_JOBS.get(job_id)
+    return {"job_id": job_id, **job.report()} if job else None
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 from datetime import datetime
 
 from backend import models, schemas
@@ -69,6 +69,18 @@ def save_qa_history(db: Session, qa: schemas.QACreate):
     return db_qa
 
 
+def save_qa_histories(db: Session, document_id: int, pairs: List[Tuple[str, str]]):
+    """배치 QA 결과 (question, answer) 목록을 한 트랜잭션으로 저장"""
+    now = datetime.utcnow()
+    rows = [
+        models.QAHistory(document_id=document_id, question=q, answer=a, created_at=now)
+        for q, a in pairs
+    ]
+    db.add_all(rows)
+    db.commit()
+    return rows
+
+
 def get_qa_by_document(db: Session, document_id: int):
     return (
         db.query(models.QAHistory)
@@ -78,5 +90,17 @@ def get_qa_by_document(db: Session, document_id: int):
     )
 
 
+def get_recent_qa_by_document(db: Session, document_id: int, limit: int):
+    """최근 QA limit건 (답변 캐시 warm-up용, 오래된 것부터 반환)"""
+    rows = (
+        db.query(models.QAHistory)
+        .filter(models.QAHistory.document_id == document_id)
+        .order_by(models.QAHistory.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+    return list(reversed(rows))
+
+
 def get_document_by_id(db: Session, document_id: int):
     return db.query(models.Document).filter(models.Document.id == document_id).first()
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -13,9 +15,36 @@ POSTGRES_URL = os.getenv("POSTGRES_URL")
 if not POSTGRES_URL:
     raise ValueError("⚠️ POSTGRES_URL 환경변수가 설정되지 않았습니다.")
 
+# 비동기 엔진 URL: 지정하지 않으면 POSTGRES_URL의 드라이버만 asyncpg로 교체
+ASYNC_POSTGRES_URL = os.getenv("ASYNC_POSTGRES_URL") or make_url(POSTGRES_URL).set(
+    drivername="postgresql+asyncpg"
+).render_as_string(hide_password=False)
+
+# 커넥션 풀 설정 (동기/비동기 엔진 각각 적용)
+# - DB_POOL_SIZE: 상시 유지 커넥션 수, DB_MAX_OVERFLOW: 순간 초과 허용 수
+# - DB_POOL_PRE_PING: 체크아웃 시 생존 확인 (DB 재시작/유휴 끊김 후 첫 요청 실패 방지)
+# - DB_POOL_RECYCLE: 이 시간(초)보다 오래된 커넥션은 재연결
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+_POOL_KWARGS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
 # SQLAlchemy 엔진 생성
-engine = create_engine(POSTGRES_URL)
+# - 동기: 분석/일괄 적재 워커 스레드, LLM 호출이 있는 동기 라우트(스레드풀에서 실행)
+# - 비동기: 이벤트 루프에서 실행되는 async 라우트
+engine = create_engine(POSTGRES_URL, **_POOL_KWARGS)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+async_engine = create_async_engine(ASYNC_POSTGRES_URL, **_POOL_KWARGS)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # ✅ get_db 함수 정의
@@ -25,3 +54,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ✅ async 라우트용 세션
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,220 @@
+# backend/jobs.py
+# ------------------------------------------------------------
+# 문서 분석 백그라운드 작업 큐
+# - 업로드 요청은 Document 행만 만들고 즉시 document_id 반환
+# - 실제 분석(파싱→임베딩/요약/분류→DB 저장)은 워커 풀에서 실행
+# - 큐 길이는 (워커 수 + 대기열 크기)로 제한 → 초과 시 QueueFullError
+# - 노드별 진행 상황은 _GRAPH.stream(stream_mode="updates")로 추적
+# ------------------------------------------------------------
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from backend import models
+from backend.database import SessionLocal
+
+from services.file_reader import file_reader, read_head, file_meta
+from services.embedder import INGEST_STREAMING
+from services.graph_builder import build_graph
+from services.retriever_cache import generation, set_retriever
+from services.index_store import delete_index, save_index
+from services.corpus_index import corpus_index
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "32"))
+JOB_RETENTION_SEC = int(os.getenv("ANALYSIS_JOB_RETENTION_SEC", "3600"))  # 완료된 작업 상태 보관 시간
+
+# 그래프는 서버 구동 시 1회 컴파일
+_GRAPH = build_graph()
+
+logger = logging.getLogger(__name__)
+
+# 진행률 표시용 노드 목록 (qa_node는 질문이 있을 때만 실행)
+GRAPH_NODES = ["reader", "embedder", "summary_node", "classify_node", "join_node"]
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="analysis")
+_SLOTS = threading.BoundedSemaphore(ANALYSIS_WORKERS + ANALYSIS_QUEUE_SIZE)
+_JOBS: Dict[int, Dict[str, Any]] = {}
+_LOCK = threading.Lock()
+
+
+class QueueFullError(Exception):
+    """분석 대기열이 가득 찬 경우"""
+
+
+def _prune_finished() -> None:
+    now = time.time()
+    with _LOCK:
+        for doc_id in [
+            k for k, j in _JOBS.items()
+            if j["status"] in ("done", "failed") and now - (j["finished_at"] or now) > JOB_RETENTION_SEC
+        ]:
+            _JOBS.pop(doc_id, None)
+
+
+def submit_analysis(
+    document_id: int,
+    file_path: str,
+    question: Optional[str] = None,
+    filename: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    분석 작업 등록. 대기열이 가득 차면 QueueFullError.
+    filename: 원본 파일명 (제목/출처 메타용, 없으면 저장 경로의 파일명)
+    반환: 작업 상태 스냅샷
+    """
+    _prune_finished()
+    if not _SLOTS.acquire(blocking=False):
+        raise QueueFullError("분석 대기열이 가득 찼습니다.")
+
+    nodes = GRAPH_NODES + (["qa_node"] if question else [])
+    job = {
+        "document_id": document_id,
+        "status": "queued",
+        "nodes": {n: "pending" for n in nodes},
+        "error": None,
+        "result": None,
+        "submitted_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+    with _LOCK:
+        _JOBS[document_id] = job
+    _EXECUTOR.submit(_run_analysis, document_id, file_path, question, filename)
+    return get_job(document_id)
+
+
+def get_job(document_id: int) -> Optional[Dict[str, Any]]:
+    """작업 상태 스냅샷 (result 제외). 등록된 작업이 없으면 None."""
+    with _LOCK:
+        job = _JOBS.get(document_id)
+        if job is None:
+            return None
+        snap = {k: v for k, v in job.items() if k != "result"}
+        snap["nodes"] = dict(job["nodes"])
+    return snap
+
+
+def get_job_result(document_id: int) -> Optional[Dict[str, Any]]:
+    with _LOCK:
+        job = _JOBS.get(document_id)
+        return dict(job["result"]) if job and job["result"] else None
+
+
+def _update(document_id: int, **fields: Any) -> None:
+    with _LOCK:
+        job = _JOBS.get(document_id)
+        if job:
+            job.update(fields)
+
+
+def _mark_node(document_id: int, node: str) -> None:
+    with _LOCK:
+        job = _JOBS.get(document_id)
+        if job:
+            job["nodes"][node] = "done"
+
+
+def prepare_state(file_path: str, filename: Optional[str] = None) -> Dict[str, Any]:
+    """
+    그래프 입력 상태 준비 (텍스트 추출 실패는 ValueError).
+    - 스트리밍 모드: 앞부분만 읽고, 나머지 페이지는 embedder가 파싱하며 바로 임베딩
+    - filename: 원본 파일명 → 내용 주소 경로(<sha256>.pdf) 대신 제목/출처 메타로 사용
+    """
+    if INGEST_STREAMING:
+        state: Dict[str, Any] = {
+            "file": file_path,
+            "streaming": True,
+            "raw_text": read_head(file_path),
+            "meta": file_meta(file_path),
+        }
+    else:
+        state = file_reader({"file": file_path})
+    if not state.get("raw_text"):
+        raise ValueError("PDF에서 텍스트를 추출하지 못했습니다.")
+    if filename:
+        state["meta"] = {**state.get("meta", {}), **file_meta(filename)}
+    return state
+
+
+def run_graph(
+    db,
+    document_id: int,
+    state: Dict[str, Any],
+    question: Optional[str] = None,
+    on_node: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    그래프 실행 → Document 결과 저장 → retriever 캐시/디스크/코퍼스 인덱스 등록.
+    on_node: 노드 완료 시마다 호출 (진행 상황 갱신용)
+    반환: {"summary", "domain", "answer", "raw_texts"(청크 텍스트)}
+    """
+    if question:
+        state["user_input"] = question
+    # 삭제 라우트는 DB 삭제 후 clear_retriever로 세대를 올리고 인덱스를 지움
+    # → 시작 시 세대를 기억해 두고, 등록 전후로 바뀌었으면 등록하지 않거나 되돌림
+    gen = generation(document_id)
+
+    # 1) 그래프 실행 (노드 완료 시마다 진행 상황 갱신)
+    result: Dict[str, Any] = {}
+    for update in _GRAPH.stream(state, stream_mode="updates"):
+        for node, out in update.items():
+            if on_node:
+                on_node(node)
+            if out:
+                result.update(out)
+
+    summary = result.get("summary", "") or ""
+    domain = result.get("domain", "") or ""
+    answer = result.get("answer")
+    retriever = result.get("retriever")
+    vectorstore = result.get("vectorstore")
+
+    # 2) Document 결과 저장
+    document = db.query(models.Document).filter(models.Document.id == document_id).first()
+    if document is None:
+        raise ValueError("분석 도중 문서가 삭제되었습니다.")
+    document.summary = summary
+    document.domain = domain
+
+    # 3) 업로드와 함께 받은 질문이 있으면 QA 히스토리 저장 (검색 단계 안내 문구는 제외)
+    if question and answer is not None and result.get("grounded"):
+        db.add(models.QAHistory(
+            document_id=document_id,
+            question=question,
+            answer=answer,
+            created_at=datetime.utcnow(),
+        ))
+    db.commit()
+
+    # 4) retriever 캐시 + 디스크 인덱스 + 공용 코퍼스 인덱스 등록 (그 사이 삭제된 문서는 되살리지 않음)
+    if retriever and vectorstore and set_retriever(document_id, retriever, vectorstore, generation=gen):
+        save_index(document_id, vectorstore)
+        corpus_index.add_document(document_id, domain, vectorstore)
+        if generation(document_id) != gen:
+            # 등록 도중 삭제됨: 삭제 라우트의 정리보다 늦게 쓴 것을 되돌림
+            delete_index(document_id)
+            corpus_index.remove_document(document_id)
+
+    return {"summary": summary, "domain": domain, "answer": answer, "raw_texts": result.get("raw_texts") or []}
+
+
+def _run_analysis(document_id: int, file_path: str, question: Optional[str], filename: Optional[str]) -> None:
+    _update(document_id, status="running", started_at=time.time())
+    db = SessionLocal()
+    try:
+        state = prepare_state(file_path, filename)
+        result = run_graph(db, document_id, state, question, on_node=lambda n: _mark_node(document_id, n))
+        _update(document_id, status="done", finished_at=time.time(), result=result)
+    except Exception as e:
+        db.rollback()
+        logger.exception("document %s analysis failed", document_id)
+        _update(document_id, status="failed", finished_at=time.time(), error=str(e))
+    finally:
+        db.close()
+        _SLOTS.release()
@@ -1,9 +1,17 @@
 from fastapi import FastAPI, Depends, HTTPException
 from sqlalchemy.orm import Session
 from backend import models, schemas, crud
-from backend.database import SessionLocal, engine, Base
+from backend.database import SessionLocal, engine, async_engine, Base
+from backend.migrations import run_migrations
 from typing import List
+import threading
 from backend.routes import qa, document, user
+from services.embedding_cache import embedding_cache_stats
+from services.embedder import get_embedding_model
+from services.answer_cache import answer_cache
+from services.retriever_cache import cache_stats as retriever_cache_stats
+from services.corpus_index import corpus_index
+from services.context_packer import context_packer
 
 from dotenv import load_dotenv
 load_dotenv() 
@@ -11,6 +19,9 @@ load_dotenv()
 # 테이블 생성
 models.Base.metadata.create_all(bind=engine)
 
+# 기존 테이블 컬럼/인덱스 보강 (create_all은 기존 테이블을 바꾸지 않음)
+run_migrations(engine)
+
 app = FastAPI()
 # app.include_router(qa.router)  # ← 추가
 app.include_router(document.router, prefix="")
@@ -18,6 +29,31 @@ app.include_router(qa.router, prefix="")
 app.include_router(user.router)
 
 
+# 코퍼스 인덱스 도입 전에 분석된 문서를 디스크 인덱스에서 등록 (백그라운드, 임베딩 호출 없음)
+def _backfill_corpus() -> None:
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(models.Document.id, models.Document.domain)
+            .filter(models.Document.summary.isnot(None))
+            .all()
+        )
+    finally:
+        db.close()
+    corpus_index.backfill(rows)
+
+
+@app.on_event("startup")
+def start_corpus_backfill():
+    threading.Thread(target=_backfill_corpus, name="corpus-backfill", daemon=True).start()
+
+
+# 종료 시 비동기 풀 커넥션 정리
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
+
 # DB 세션 의존성
 def get_db():
     db = SessionLocal()
@@ -38,3 +74,17 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 @app.get("/qa/{document_id}", response_model=List[schemas.QAHistory])
 def get_qa_list(document_id: int, db: Session = Depends(get_db)):
     return crud.get_qa_by_document(db, document_id)
+
+
+# 캐시 통계 (임베딩/질문 임베딩/답변/retriever 캐시 hit/miss, 축출, 상주 바이트 등)
+# + QA 컨텍스트 패킹 (패킹 전/후 프롬프트 토큰, 제거한 중복 문장/겹침)
+@app.get("/stats/cache")
+def get_cache_stats():
+    return {
+        "embedding_cache": embedding_cache_stats(),
+        "query_embedding_cache": get_embedding_model().queries.stats(),
+        "retriever_cache": retriever_cache_stats(),
+        "answer_cache": answer_cache.stats(),
+        "corpus_index": corpus_index.stats(),
+        "qa_context": context_packer.stats(),
+    }
@@ -0,0 +1,116 @@
+# backend/migrations.py
+# ------------------------------------------------------------
+# 스키마 마이그레이션 (create_all 이후 실행)
+# - create_all은 새 테이블만 만들고 기존 테이블에 컬럼/인덱스를 추가하지 않음
+#   → 이미 운영 중인 DB는 여기 순서대로 보강
+# - 적용 이력은 schema_migrations 테이블에 기록 (이미 적용된 항목은 건너뜀)
+# - 각 문장은 IF [NOT] EXISTS로 재실행해도 안전하게 작성
+# - SQL로 못 하는 데이터 보정은 함수(conn을 받음)로 같은 목록에 넣음
+#
+# 실행: 서버 기동 시 자동 (backend/main.py), 또는 python -m backend.migrations
+# ------------------------------------------------------------
+
+import logging
+import os
+from typing import Callable, List, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from backend.storage import file_checksum
+
+logger = logging.getLogger(__name__)
+
+Step = Union[str, Callable[[Connection], None]]
+
+
+def _backfill_document_checksums(conn: Connection) -> None:
+    """
+    0001 이전에 올라온 문서는 checksum이 NULL → 중복 검사에서 빠짐.
+    저장된 파일에서 SHA-256을 다시 계산해 채움.
+    - 파일이 없으면 NULL 유지 (유니크 인덱스는 NULL끼리 충돌하지 않음)
+    - 같은 사용자에게 같은 해시가 이미 있으면 NULL 유지 (uq_documents_user_checksum 위반 방지)
+    """
+    taken = {
+        (row[0], row[1])
+        for row in conn.execute(text("SELECT user_id, checksum FROM documents WHERE checksum IS NOT NULL"))
+    }
+    rows = conn.execute(text("SELECT id, user_id, file_path FROM documents WHERE checksum IS NULL")).fetchall()
+    filled = missing = duplicate = 0
+    for doc_id, user_id, file_path in rows:
+        if not file_path or not os.path.isfile(file_path):
+            missing += 1
+            continue
+        checksum = file_checksum(file_path)
+        if (user_id, checksum) in taken:
+            duplicate += 1
+            continue
+        taken.add((user_id, checksum))
+        conn.execute(
+            text("UPDATE documents SET checksum = :checksum WHERE id = :id"),
+            {"checksum": checksum, "id": doc_id},
+        )
+        filled += 1
+    logger.info(
+        "checksum backfill: filled=%d missing_file=%d duplicate=%d", filled, missing, duplicate
+    )
+
+
+MIGRATIONS: List[Tuple[str, List[Step]]] = [
+    (
+        "0001_documents_checksum",
+        [
+            "ALTER TABLE documents ADD COLUMN IF NOT EXISTS checksum VARCHAR(64)",
+        ],
+    ),
+    (
+        "0002_hot_lookup_indexes",
+        [
+            # 중복 검사 (user_id, checksum) → 유니크 인덱스 1회 탐색
+            # 기존 데이터에 같은 사용자/같은 해시 행이 있으면 실패 → 중복 행 정리 후 재기동
+            "DROP INDEX IF EXISTS ix_documents_checksum",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_user_checksum ON documents (user_id, checksum)",
+            # QA 히스토리 조회 (document_id = ? ORDER BY created_at) → 인덱스 순서 그대로 반환, 정렬 없음
+            "CREATE INDEX IF NOT EXISTS ix_qa_history_document_created ON qa_history (document_id, created_at)",
+        ],
+    ),
+    (
+        "0003_backfill_documents_checksum",
+        [
+            _backfill_document_checksums,
+        ],
+    ),
+]
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """미적용 마이그레이션을 순서대로 실행하고 적용한 id 목록 반환 (각 항목은 한 트랜잭션)."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " id VARCHAR(64) PRIMARY KEY,"
+            " applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        done = {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+
+    applied = []
+    for mig_id, statements in MIGRATIONS:
+        if mig_id in done:
+            continue
+        with engine.begin() as conn:
+            for stmt in statements:
+                if callable(stmt):
+                    stmt(conn)
+                else:
+                    conn.execute(text(stmt))
+            conn.execute(text("INSERT INTO schema_migrations (id) VALUES (:id)"), {"id": mig_id})
+        applied.append(mig_id)
+    return applied
+
+
+if __name__ == "__main__":
+    from backend import models
+    from backend.database import engine
+
+    models.Base.metadata.create_all(bind=engine)
+    print(run_migrations(engine) or "적용할 마이그레이션이 없습니다.")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from backend.database import Base
 from datetime import datetime
@@ -19,11 +19,17 @@ class Document(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     filename = Column(String)
     file_path = Column(String)
+    checksum = Column(String(64))  # 업로드 본문 SHA-256 (내용 기준 중복 판정)
     summary = Column(Text)
     domain = Column(String)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     qa_histories = relationship("QAHistory", backref="document", cascade="all, delete")
 
+    # 중복 검사(user_id, checksum)는 유니크 인덱스 1회 탐색 — backend/migrations.py와 이름 일치
+    __table_args__ = (
+        Index("uq_documents_user_checksum", "user_id", "checksum", unique=True),
+    )
+
 
 class QAHistory(Base):
     __tablename__ = "qa_history"
@@ -32,3 +38,8 @@ class QAHistory(Base):
     question = Column(Text)
     answer = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # 문서별 히스토리 조회 (document_id = ? ORDER BY created_at ASC/DESC)
+    __table_args__ = (
+        Index("ix_qa_history_document_created", "document_id", "created_at"),
+    )
@@ -1,172 +1,238 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException  # ☆ HTTPException 추가
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, Request  # ☆ HTTPException 추가
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from backend.database import get_async_db
 from backend import models
 
-from services.file_reader import file_reader
-from services.graph_builder import build_graph
-from services.summarizer import qa_agent  # ☆ 업로드+질문 엔드포인트에서 사용
-from services.retriever_cache import set_retriever  # ☆ retriever 캐시 등록
+from backend.jobs import submit_analysis, get_job, get_job_result, QueueFullError
+from backend.storage import store_stream
+from backend.bulk_ingest import BULK_PROGRESS_FILE, list_pdfs, resolve_directory, start_bulk, get_bulk
+from services.retriever_cache import clear_retriever  # ☆ 삭제 시 retriever 캐시/인덱스 정리
+from services.answer_cache import answer_cache
+from services.corpus_index import corpus_index
 
+import hashlib
+import json
 import os
-import shutil
 from datetime import datetime
+from typing import List, Optional
 
 router = APIRouter()
-UPLOAD_DIR = "uploaded_docs"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# ☆ 그래프는 서버 구동 시 1회 컴파일 → 매 요청마다 재컴파일 비용 절약
-_GRAPH = build_graph()
 
+# 라우트는 이벤트 루프에서 실행 → DB는 AsyncSession, 파일 I/O·디스크 정리는 run_in_threadpool
 
-@router.post("/documents/upload")
-async def upload_document(
-    file: UploadFile = File(...),
-    question: str = Form(...),
-    db: Session = Depends(get_db),
-):
-    """
-    업로드 + 즉시 질문까지 한번에 처리.
-    1) 파일 저장
-    2) file_reader로 raw_text/meta 준비
-    3) 그래프 실행(임베딩→요약→분류)
-    4) Document 저장
-    5) retriever 캐시에 보관
-    6) qa_agent로 질문 답변 생성
-    7) QA 히스토리 저장
-    """
+
+async def _get_or_create_user(db: AsyncSession) -> models.User:
     # 사용자 하드코딩 (id=1) — 운영에서는 인증 연동
-    user = db.query(models.User).filter_by(id=1).first()
+    user = await db.get(models.User, 1)
     if not user:
         # 존재하지 않으면 생성 (초기 세팅 편의)
         user = models.User(id=1, email="test@example.com")
         db.add(user)
-        db.commit()
-        db.refresh(user)
-
-    # 💡 중복 문서 체크(같은 사용자, 같은 파일명)
-    existing_doc = (
-        db.query(models.Document)
-        .filter(models.Document.user_id == user.id)
-        .filter(models.Document.filename == file.filename)
-        .first()
+        await db.commit()
+        await db.refresh(user)
+    return user
+
+
+async def _get_document(db: AsyncSession, document_id: int) -> Optional[models.Document]:
+    return await db.get(models.Document, document_id)
+
+
+async def _find_duplicate(db: AsyncSession, user: models.User, checksum: str):
+    # 💡 중복 문서 체크(같은 사용자, 같은 내용 해시) — 파일명이 달라도 같은 바이트면 재분석하지 않음
+    result = await db.execute(
+        select(models.Document)
+        .where(models.Document.user_id == user.id)
+        .where(models.Document.checksum == checksum)
+        .limit(1)
     )
+    return result.scalars().first()
+
+
+def _existing_response(document: models.Document, file_path: str):
+    """
+    같은 내용의 문서가 이미 있을 때의 응답.
+    - 분석 중이면 202 + 작업 상태 (클라이언트는 기존 document_id로 폴링)
+    - 이전 분석이 실패했으면(결과 없음) 같은 행으로 분석 재등록
+    - 완료된 문서는 요약/도메인을 바로 반환
+    """
+    job = get_job(document.id)
+    if document.summary is None and not (job and job["status"] in ("queued", "running", "done")):
+        try:
+            job = submit_analysis(document.id, file_path, filename=document.filename)
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    if job and job["status"] in ("queued", "running"):
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": "File already uploaded. Analysis in progress.",
+                "document_id": document.id,
+                "status": job["status"],
+            },
+        )
+    return {
+        "message": "File already uploaded.",
+        "document_id": document.id,
+        "summary": document.summary,
+        "domain": document.domain,
+    }
+
+
+async def _enqueue(db: AsyncSession, user: models.User, file: UploadFile, question: Optional[str] = None):
+    """
+    파일 저장(+SHA-256) → 같은 내용이 있으면 재사용 → 없으면
+    Document 행 생성(summary/domain 비어 있음) → 분석 작업 등록.
+    대기열이 가득 차면 만든 행을 되돌리고 503.
+    """
+    # 1) 파일 저장 + 내용 해시
+    file_path, checksum = await run_in_threadpool(store_stream, file.file, file.filename)
+
+    # 2) 중복 검사 (해시 기준)
+    existing_doc = await _find_duplicate(db, user, checksum)
     if existing_doc:
-        # 이미 분석된 문서라면, retriever 캐시가 비어있을 수 있으므로
-        # 여기서 캐시 복구는 하지 않고 문서 정보만 반환 (질문은 /qa/ask_existing에서 복구 로직 처리 권장)
-        return {
-            "message": "File already uploaded.",
-            "document_id": existing_doc.id,
-            "summary": existing_doc.summary,
-            "domain": existing_doc.domain,
-        }
-
-    # 1) 파일 저장
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-
-    # 2) 파일 읽기 (raw_text/meta/documents 생성)
-    file_state = file_reader({"file": file_path})
-    raw_text = file_state.get("raw_text", "")
-    if not raw_text:
-        raise HTTPException(status_code=400, detail="PDF에서 텍스트를 추출하지 못했습니다.")
-
-    # 3) 그래프 실행 (임베딩 → 요약 → 분류)
-    # ☆ 핵심: raw_text 뿐 아니라 meta도 포함된 state를 그대로 전달
-    result = _GRAPH.invoke(file_state)
-
-    summary = result.get("summary", "") or ""
-    domain = result.get("domain", "") or ""
-    retriever = result.get("retriever")
-    vectorstore = result.get("vectorstore")
-
-    # 4) Document 저장
+        # 이미 분석된 문서라면 retriever는 /qa/ask_existing에서 디스크 인덱스로 복구
+        return _existing_response(existing_doc, existing_doc.file_path or file_path)
+
+    # 3) Document 저장 (분석 결과는 작업 완료 시 채워짐)
     document = models.Document(
         user_id=user.id,
         filename=file.filename,
         file_path=file_path,
-        summary=summary,
-        domain=domain,
+        checksum=checksum,
         uploaded_at=datetime.utcnow(),
     )
     db.add(document)
-    db.commit()
-    db.refresh(document)
-
-    # 5) retriever 캐시에 보관 → /qa/ask_existing에서 재사용
-    if retriever and vectorstore:
-        set_retriever(document.id, retriever, vectorstore)
-
-    # 6) 업로드와 동시에 받은 질문에 답변 생성 (빠르게: qa_agent만 호출)
-    qa_out = qa_agent.invoke({
-        "user_input": question,
-        "retriever": retriever,
-        "top_k": 5,
-    }) if retriever else {"answer": "retriever가 없어 즉시 QA를 수행할 수 없습니다."}
-    answer = qa_out.get("answer", "")
-
-    # 7) QA 히스토리 저장
-    qa_entry = models.QAHistory(
-        document_id=document.id,
-        question=question,
-        answer=answer,
-        created_at=datetime.utcnow(),
-    )
-    db.add(qa_entry)
-    db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # 같은 내용의 동시 업로드가 먼저 행을 만든 경우 (uq_documents_user_checksum) → 그 문서 재사용
+        await db.rollback()
+        existing_doc = await _find_duplicate(db, user, checksum)
+        return _existing_response(existing_doc, existing_doc.file_path or file_path)
+
+    # 4) 분석 작업 등록
+    try:
+        job = submit_analysis(document.id, file_path, question=question, filename=file.filename)
+    except QueueFullError as e:
+        await db.delete(document)
+        await db.commit()
+        raise HTTPException(status_code=503, detail=str(e))
 
-    # 8) 최종 응답
     return JSONResponse(
+        status_code=202,
         content={
-            "filename": file.filename,
-            "summary": summary,
-            "domain": domain,
-            "answer": answer,
+            "message": "Analysis queued.",
             "document_id": document.id,
-        }
+            "status": job["status"] if job else "queued",
+        },
     )
 
 
+@router.post("/documents/upload")
+async def upload_document(
+    file: UploadFile = File(...),
+    question: str = Form(...),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    업로드 + 질문을 분석 작업으로 등록하고 document_id를 즉시 반환 (202).
+    - 작업: 파싱 → 임베딩/요약/분류 → Document 저장 → retriever 캐시 → 질문 답변 → QA 히스토리 저장
+    - 진행 상황: GET /documents/{id}/status, 결과(요약/도메인/답변): GET /documents/{id}/result
+    """
+    user = await _get_or_create_user(db)
+
+    # 같은 내용(SHA-256)의 문서가 있으면 재분석 없이 기존 문서 반환
+    return await _enqueue(db, user, file, question=question)
+
+
+_LIST_FIELDS = ("id", "filename", "domain", "summary", "uploaded_at")
+DOCUMENT_PAGE_MAX = int(os.getenv("DOCUMENT_PAGE_MAX", "500"))
+
+
+def _etag_response(request: Request, content, headers: Optional[dict] = None):
+    """
+    본문 해시로 ETag 생성 → If-None-Match가 같으면 본문 없이 304.
+    (목록 쿼리는 실행되지만 변경 없는 응답의 전송/파싱 비용이 사라짐)
+    """
+    body = json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":"))
+    etag = f'W/"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+    headers = {**(headers or {}), "ETag": etag}
+    inm = request.headers.get("if-none-match", "")
+    if etag in [t.strip() for t in inm.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/documents")
-def get_documents(db: Session = Depends(get_db)):
+async def get_documents(
+    request: Request,
+    after_id: Optional[int] = Query(None, description="이 id 다음부터 (이전 응답의 X-Next-Cursor)"),
+    limit: int = Query(100, ge=1),
+    fields: Optional[str] = Query(None, description="쉼표로 구분한 컬럼 (id,filename,domain,summary,uploaded_at)"),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    app.py가 기대하는 필드(id, filename, domain, summary, uploaded_at)를 반환.
+    문서 목록 (id 오름차순 keyset 페이지네이션).
+    - fields 미지정 시 app.py가 기대하는 필드(id, filename, domain, summary, uploaded_at) 전체
+      지정 시 해당 컬럼만 SELECT (예: fields=id,filename → 요약 본문을 읽지도 보내지도 않음)
+    - 다음 페이지가 있으면 X-Next-Cursor 헤더에 마지막 id → ?after_id= 로 전달
+    - ETag / If-None-Match: 변경이 없으면 304
     """
-    documents = db.query(models.Document).all()
-    return [
-        {
-            "id": doc.id,
-            "filename": doc.filename,
-            "domain": doc.domain,
-            "summary": doc.summary,
-            "uploaded_at": doc.uploaded_at,
-        }
-        for doc in documents
-    ]
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(_LIST_FIELDS)
+    unknown = [f for f in selected if f not in _LIST_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"알 수 없는 필드: {', '.join(unknown)}")
+    if "id" not in selected:
+        selected.insert(0, "id")  # 커서용
+    limit = min(limit, DOCUMENT_PAGE_MAX)
+
+    stmt = select(*[getattr(models.Document, f) for f in selected])
+    if after_id is not None:
+        stmt = stmt.where(models.Document.id > after_id)
+    rows = (await db.execute(stmt.order_by(models.Document.id.asc()).limit(limit + 1))).all()
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1].id)
+    return _etag_response(request, [dict(zip(selected, row)) for row in rows], headers)
+
+
+@router.get("/documents/{document_id}")
+async def get_document(document_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """문서 1건 상세 (요약/도메인 포함), ETag / If-None-Match 지원."""
+    document = await _get_document(db, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return _etag_response(request, {f: getattr(document, f) for f in _LIST_FIELDS})
 
 
 @router.delete("/documents/{document_id}")
-def delete_document(document_id: int, db: Session = Depends(get_db)):
+async def delete_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     문서 삭제 시 관련 QA 히스토리도 함께 삭제.
     """
-    document = (
-        db.query(models.Document).filter(models.Document.id == document_id).first()
-    )
+    document = await _get_document(db, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
     # QA 레코드 삭제
-    db.query(models.QAHistory).filter(
-        models.QAHistory.document_id == document_id
-    ).delete()
+    await db.execute(delete(models.QAHistory).where(models.QAHistory.document_id == document_id))
 
     # 문서 삭제
-    db.delete(document)
-    db.commit()
+    await db.delete(document)
+    await db.commit()
+
+    # retriever 캐시 + 디스크 인덱스 정리 (디스크 삭제/코퍼스 인덱스 갱신은 스레드풀에서)
+    await run_in_threadpool(clear_retriever, document_id, remove_index=True)
+    answer_cache.invalidate(document_id)
+    await run_in_threadpool(corpus_index.remove_document, document_id)
 
     return {"message": "Document deleted successfully"}
 
@@ -174,79 +240,112 @@ def delete_document(document_id: int, db: Session = Depends(get_db)):
 @router.post("/documents/analyze_only")
 async def analyze_document_only(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    업로드 → 분석만 수행 (질문 없음)
-    1) 파일 저장
-    2) file_reader로 state 생성
-    3) 그래프 실행(임베딩→요약→분류)
-    4) Document 저장
-    5) retriever 캐시에 등록
+    업로드 → 분석 작업 등록 (질문 없음), document_id 즉시 반환 (202)
+    - 작업: 파싱 → 임베딩/요약/분류 → Document 저장 → retriever 캐시/디스크 인덱스 등록
+    - 처리량은 워커 풀 크기(ANALYSIS_WORKERS)로 결정
     """
-    # 사용자 하드코딩 (id=1)
-    user = db.query(models.User).filter_by(id=1).first()
-    if not user:
-        user = models.User(id=1, email="test@example.com")
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-
-    # 중복 문서 검사
-    existing_doc = (
-        db.query(models.Document)
-        .filter(models.Document.user_id == user.id)
-        .filter(models.Document.filename == file.filename)
-        .first()
-    )
-    if existing_doc:
-        # 이미 분석된 문서. retriever 캐시는 없을 수 있지만 여기서는 문서 정보만 반환.
-        return {
-            "message": "File already uploaded.",
-            "document_id": existing_doc.id,
-            "summary": existing_doc.summary,
-            "domain": existing_doc.domain,
-        }
-
-    # 1) 파일 저장
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-
-    # 2) 파일 읽기
-    file_state = file_reader({"file": file_path})
-    raw_text = file_state.get("raw_text", "")
-    if not raw_text:
-        raise HTTPException(status_code=400, detail="PDF에서 텍스트를 추출하지 못했습니다.")
-
-    # 3) 그래프 실행 (meta 포함 state 전체 전달)
-    result = _GRAPH.invoke(file_state)
-
-    summary = result.get("summary", "") or ""
-    domain = result.get("domain", "") or ""
-    retriever = result.get("retriever")
-    vectorstore = result.get("vectorstore")
-
-    # 4) Document 저장
-    document = models.Document(
-        user_id=user.id,
-        filename=file.filename,
-        file_path=file_path,
-        summary=summary,
-        domain=domain,
-        uploaded_at=datetime.utcnow()
-    )
-    db.add(document)
-    db.commit()
-    db.refresh(document)
+    user = await _get_or_create_user(db)
+
+    # 중복 문서 검사는 내용 해시 기준 (_enqueue 내부)
+    return await _enqueue(db, user, file)
 
-    # 5) retriever 캐시에 등록
-    if retriever and vectorstore:
-        set_retriever(document.id, retriever, vectorstore)
 
+@router.post("/documents/bulk")
+async def bulk_ingest(
+    files: List[UploadFile] = File(None),
+    directory: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    여러 PDF를 한 번에 적재하는 일괄 작업 등록 (202 + job_id).
+    - files: 멀티파트로 여러 파일 업로드, 또는
+    - directory: 서버의 BULK_INGEST_ROOT 하위 디렉터리 (하위 폴더 포함 *.pdf)
+      같은 디렉터리로 다시 요청하면 진행 파일을 이어받아 완료된 파일은 건너뜀
+    - 파싱/임베딩·LLM 단계를 파이프라인으로 실행, 파일별 오류는 격리
+    - 진행 상황/처리량: GET /documents/bulk/{job_id}
+    """
+    user = await _get_or_create_user(db)
+
+    if directory:
+        path = resolve_directory(directory)
+        if path is None:
+            raise HTTPException(status_code=400, detail="허용되지 않은 디렉터리입니다.")
+        items = [(p, os.path.basename(p)) for p in await run_in_threadpool(list_pdfs, path)]
+        progress_path = os.path.join(path, BULK_PROGRESS_FILE)  # CLI와 같은 진행 파일 → 서로 이어받기 가능
+    elif files:
+        # 업로드 본문은 먼저 내용 주소 경로에 저장 (같은 내용은 한 번만 기록)
+        items = []
+        for f in files:
+            file_path, _ = await run_in_threadpool(store_stream, f.file, f.filename)
+            items.append((file_path, f.filename or os.path.basename(file_path)))
+        progress_path = None
+    else:
+        raise HTTPException(status_code=400, detail="files 또는 directory가 필요합니다.")
+
+    if not items:
+        raise HTTPException(status_code=400, detail="적재할 PDF가 없습니다.")
+
+    job_id = start_bulk(items, progress_path, user_id=user.id)
+    return JSONResponse(status_code=202, content={"job_id": job_id, "total": len(items), "status": "queued"})
+
+
+@router.get("/documents/bulk/{job_id}")
+def get_bulk_status(job_id: str):
+    """일괄 적재 진행 현황 (파일 상태별 개수, 실패 목록, 문서/분, 토큰/초)."""
+    job = get_bulk(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+    return job
+
+
+@router.get("/documents/{document_id}/status")
+async def get_document_status(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    분석 작업 진행 상황.
+    - status: queued | running | done | failed
+    - nodes: 그래프 노드별 pending/done
+    작업 기록이 없으면(서버 재시작 등) DB의 summary 유무로 판단.
+    """
+    job = get_job(document_id)
+    if job:
+        return job
+
+    document = await _get_document(db, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
     return {
-        "message": "Document analyzed.",
-        "document_id": document.id,
-        "summary": summary,
-        "domain": domain,
+        "document_id": document_id,
+        "status": "done" if document.summary is not None else "failed",
+        "nodes": {},
+        "error": None if document.summary is not None else "분석 작업 기록이 없습니다. 재업로드가 필요합니다.",
+    }
+
+
+@router.get("/documents/{document_id}/result")
+async def get_document_result(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    분석 결과(summary/domain, 업로드 질문이 있었다면 answer).
+    작업이 아직 끝나지 않았으면 202 + 상태, 실패했으면 500.
+    """
+    job = get_job(document_id)
+    if job and job["status"] in ("queued", "running"):
+        return JSONResponse(status_code=202, content=job)
+    if job and job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"] or "분석 실패")
+
+    result = get_job_result(document_id)
+    if result:
+        return {"document_id": document_id, **result}
+
+    document = await _get_document(db, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {
+        "document_id": document_id,
+        "summary": document.summary,
+        "domain": document.domain,
+        "answer": None,
     }
@@ -1,34 +1,53 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
+import json
 import os
+from datetime import timezone
 
-from backend.database import get_db
+from backend.database import get_async_db, get_db, SessionLocal
 from backend import models, schemas, crud
 
-from services.summarizer import qa_agent
-from services.retriever_cache import get_retriever, set_retriever
-from services.file_reader import file_reader
+from services.summarizer import (
+    qa_agent, stream_qa, answer_from_docs, answer_many, NO_DOCS_NOTICE,
+)
+from services.corpus_index import corpus_index
+from langchain_core.documents import Document
+from services.answer_cache import answer_cache, ANSWER_CACHE_MAX_PER_DOC
+from services.embedder import get_embedding_model
+from services.retriever_cache import get_or_build
+from services.index_store import save_index
+from services.file_reader import file_reader, file_meta
 from services.graph_builder import build_graph
+from services.hybrid_retriever import is_lexical_query, RETRIEVAL_MODE
 
 router = APIRouter()
 
-# 그래프는 서버 기동 시 1회 컴파일 → 복구(캐시 미존재) 시만 사용
-_GRAPH = build_graph()
+QA_BATCH_MAX_QUESTIONS = int(os.getenv("QA_BATCH_MAX_QUESTIONS", "100"))
+
+# 그래프는 서버 기동 시 1회 컴파일 → 복구(캐시/디스크 인덱스 미존재) 시만 사용
+# retrieval_only: reader → embedder 만 실행 (요약/분류는 DB에 이미 있으므로 생략)
+_GRAPH = build_graph(retrieval_only=True)
+
+# 임베딩/LLM을 호출하는 라우트는 동기 def 유지 → FastAPI 스레드풀에서 실행 (이벤트 루프 비차단)
+#   DB는 동기 풀(get_db) 사용, 단순 조회 라우트만 async + AsyncSession
 
 
 @router.get("/qa/{document_id}", response_model=List[schemas.QAHistoryOut])
-def get_qa_history(document_id: int, db: Session = Depends(get_db)):
+async def get_qa_history(document_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     app.py가 기대하는 형식으로 QA 히스토리를 반환합니다.
     - 키: question, answer, created_at
     """
-    rows = (
-        db.query(models.QAHistory)
-        .filter(models.QAHistory.document_id == document_id)
+    result = await db.execute(
+        select(models.QAHistory)
+        .where(models.QAHistory.document_id == document_id)
         .order_by(models.QAHistory.created_at.asc())
-        .all()
     )
+    rows = result.scalars().all()
     # pydantic 모델 매핑을 신뢰해도 되고, 안전하게 dict로 변환해도 됩니다.
     return [
         schemas.QAHistoryOut(
@@ -40,6 +59,86 @@ def get_qa_history(document_id: int, db: Session = Depends(get_db)):
     ]
 
 
+def _ensure_retriever(document: models.Document):
+    """
+    retriever 캐시 조회 (메모리 → 디스크 인덱스 순),
+    캐시 미스 시 file_reader + _GRAPH.invoke 로 retriever 복구 → 캐시/디스크에 저장.
+    같은 문서에 대한 동시 요청은 single-flight로 1번만 복구.
+    """
+    doc_id = document.id
+    file_path = document.file_path
+
+    def rebuild():
+        if not file_path or not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="원본 파일을 찾을 수 없습니다. 재업로드가 필요합니다.")
+
+        # file_reader로 raw_text/meta 준비 → 검색 전용 그래프 실행(청크/임베딩만) → retriever 회수
+        fr_state = file_reader({"file": file_path})
+        if document.filename:
+            # 저장 경로는 내용 해시 이름 → 제목/출처 메타는 원본 파일명 기준
+            fr_state["meta"] = {**fr_state.get("meta", {}), **file_meta(document.filename)}
+        result = _GRAPH.invoke(fr_state)
+        retriever = result.get("retriever")
+        if retriever is None:
+            raise HTTPException(status_code=500, detail="retriever 복구 실패")
+
+        # 디스크 인덱스에 저장 (다음 재시작부터는 디스크에서 바로 로드), 메모리 캐시는 get_or_build가 등록
+        vectorstore = result.get("vectorstore")
+        if vectorstore is not None:
+            save_index(doc_id, vectorstore)
+            if not corpus_index.has_document(doc_id):
+                corpus_index.add_document(doc_id, document.domain, vectorstore)
+        return retriever, vectorstore
+
+    return get_or_build(doc_id, rebuild)
+
+
+def _warm_answer_cache(db: Session, doc_id: int) -> None:
+    # 문서별 최초 조회 시 qa_history의 최근 답변으로 답변 캐시 채움 (DB에 이미 있는 답변 재사용)
+    if not answer_cache.is_warm(doc_id):
+        rows = crud.get_recent_qa_by_document(db, doc_id, ANSWER_CACHE_MAX_PER_DOC)
+        answer_cache.warm(
+            doc_id,
+            # created_at은 naive UTC (datetime.utcnow) → 로컬 시간대로 해석되지 않도록 UTC 지정
+            [
+                (r.question, r.answer, r.created_at.replace(tzinfo=timezone.utc).timestamp() if r.created_at else None)
+                for r in rows
+            ],
+        )
+
+
+def _cached_answer(db: Session, doc_id: int, question: str):
+    """
+    답변 캐시 조회 → (hit, query_vec)
+    - 문서별 최초 조회 시 qa_history의 최근 답변으로 warm-up (DB에 이미 있는 답변 재사용)
+    - exact 미스 시 질문 임베딩 유사도로 near-duplicate 매칭 (BM25 전용 질의는 제외)
+    """
+    _warm_answer_cache(db, doc_id)
+    # 정확한 용어 질의는 BM25만으로 검색 → 답변 캐시 비교용 임베딩도 생략 (exact 매칭만)
+    lexical = RETRIEVAL_MODE != "dense" and is_lexical_query(question)
+    embed_fn = None if lexical else get_embedding_model().embed_query
+    try:
+        return answer_cache.lookup(doc_id, question, embed_fn=embed_fn)
+    except Exception:
+        # 임베딩 실패 등은 캐시 미스로 취급
+        return None, None
+
+
+def _save_history(db: Session, doc_id: int, question: str, answer: str) -> None:
+    # QA 히스토리 저장 (app.py 기대 필드: question/answer/created_at)
+    try:
+        rec_in = schemas.QACreate(
+            document_id=doc_id,
+            question=question,
+            answer=answer,
+        )
+        crud.save_qa_history(db, qa=rec_in)
+    except Exception as e:
+        # 답변은 반환하되, 저장 실패는 로그로 충분
+        # 실제 운영에서는 로깅 시스템에 남기세요.
+        pass
+
+
 @router.post("/qa/ask_existing")
 def ask_existing_document_question(
     payload: schemas.ExistingDocQARequest, db: Session = Depends(get_db)
@@ -47,12 +146,12 @@ def ask_existing_document_question(
     """
     기존 문서에 대해 질문을 수행합니다.
     흐름:
-      1) 문서 존재 확인
-      2) retriever 캐시 조회
-      3) (캐시 미스) file_reader + _GRAPH.invoke 로 retriever 복구 → 캐시에 저장
+      1) 문서 존재 확인 + 답변 캐시 조회 (적중 시 바로 반환)
+      2) retriever 캐시 조회 (메모리 → 디스크 인덱스 순)
+      3) (캐시 미스) file_reader + 검색 전용 _GRAPH.invoke 로 retriever 복구 → 캐시에 저장
       4) qa_agent.invoke 로 답변 생성
       5) QA 히스토리 저장
-    반환: {"answer": "..."}
+    반환: {"answer": "...", "cached": bool, ("cache_match": "exact"|"semantic")}
     """
     doc_id = payload.document_id
     question = (payload.question or "").strip()
@@ -64,24 +163,13 @@ def ask_existing_document_question(
     if not document:
         raise HTTPException(status_code=404, detail="문서를 찾을 수 없습니다.")
 
-    # 2) retriever 캐시 확인
-    retriever = get_retriever(doc_id)
+    # 1-1) 답변 캐시 (exact / near-duplicate) → 적중 시 검색/LLM 호출 없이 반환
+    hit, query_vec = _cached_answer(db, doc_id, question)
+    if hit:
+        return {"answer": hit["answer"], "cached": True, "cache_match": hit["match"]}
 
-    # 3) 캐시 미스 → 복구
-    if retriever is None:
-        file_path = document.file_path
-        if not file_path or not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="원본 파일을 찾을 수 없습니다. 재업로드가 필요합니다.")
-
-        # file_reader로 raw_text/meta 준비 → 그래프 실행(임베딩) → retriever 회수
-        fr_state = file_reader({"file": file_path})
-        result = _GRAPH.invoke(fr_state)
-        retriever = result.get("retriever")
-        if retriever is None:
-            raise HTTPException(status_code=500, detail="retriever 복구 실패")
-
-        # 메모리 캐시에 등록 (서버 재시작 시 사라짐)
-        set_retriever(doc_id, retriever, result.get("vectorstore"))
+    # 2)~3) retriever 확보 (캐시 미스 시 복구)
+    retriever = _ensure_retriever(document)
 
     # 4) QA 수행 (빠르게: qa_agent만 호출)
     qa_out = qa_agent.invoke({
@@ -93,17 +181,179 @@ def ask_existing_document_question(
     if not answer:
         raise HTTPException(status_code=500, detail="답변 생성 실패")
 
-    # 5) QA 히스토리 저장 (app.py 기대 필드: question/answer/created_at)
-    try:
-        rec_in = schemas.QACreate(
-            document_id=doc_id,
-            question=question,
-            answer=answer,
-        )
-        crud.save_qa_history(db, qa=rec_in)
-    except Exception as e:
-        # 답변은 반환하되, 저장 실패는 로그로 충분
-        # 실제 운영에서는 로깅 시스템에 남기세요.
-        pass
+    # 5) QA 히스토리 저장 + 답변 캐시 등록 (LLM이 생성한 답변만)
+    # - 검색 실패/결과 없음 안내는 저장하지 않음: 캐시 TTL 동안(및 유사 질문에) 재사용되거나
+    #   warm-up으로 히스토리에서 다시 캐시에 올라가는 것을 방지
+    if qa_out.get("grounded"):
+        _save_history(db, doc_id, question, answer)
+        answer_cache.put(doc_id, question, answer, query_vec=query_vec)
+
+    return {"answer": answer, "cached": False}
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/qa/ask_existing/stream")
+def ask_existing_document_question_stream(
+    payload: schemas.ExistingDocQARequest, db: Session = Depends(get_db)
+):
+    """
+    /qa/ask_existing 의 스트리밍(SSE) 버전.
+    이벤트 순서:
+      event: citations  data: [{doc, source, page, section, chunk_id, snippet}, ...]
+      event: token      data: {"text": "..."}   (qa_llm 토큰 도착 시마다)
+      event: done       data: {"answer": "...", "cached": bool} (전체 답변, QA 히스토리 저장 후)
+      event: error      data: {"detail": "..."} (생성 도중 오류)
+    """
+    doc_id = payload.document_id
+    question = (payload.question or "").strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="질문이 비어 있습니다.")
+
+    document = crud.get_document_by_id(db, doc_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="문서를 찾을 수 없습니다.")
+
+    # 답변 캐시 적중 시: 전체 답변을 token 1개로 보내고 종료
+    hit, query_vec = _cached_answer(db, doc_id, question)
+    if hit:
+        def cached_stream():
+            yield _sse("citations", [])
+            yield _sse("token", {"text": hit["answer"]})
+            yield _sse("done", {"answer": hit["answer"], "cached": True, "cache_match": hit["match"]})
+
+        return StreamingResponse(cached_stream(), media_type="text/event-stream")
+
+    # 스트림 시작 전에 retriever 확보 → 실패는 일반 HTTP 에러로 응답
+    retriever = _ensure_retriever(document)
+
+    def event_stream():
+        parts: List[str] = []
+        grounded = True
+        try:
+            for ev in stream_qa({"user_input": question, "retriever": retriever, "top_k": 5}):
+                if ev["event"] in ("token", "notice"):
+                    # 안내 문구도 클라이언트에는 token으로 전달, 저장/캐시만 제외
+                    grounded = grounded and ev["event"] == "token"
+                    parts.append(ev["data"])
+                    yield _sse("token", {"text": ev["data"]})
+                else:
+                    yield _sse(ev["event"], ev["data"])
+        except Exception as e:
+            yield _sse("error", {"detail": f"답변 생성 중 오류가 발생했습니다: {e}"})
+            return
+
+        answer = "".join(parts)
+        # 스트림 완료 후 히스토리 저장 (요청 스코프 세션은 이미 닫혔을 수 있어 별도 세션 사용)
+        if answer and grounded:
+            hist_db = SessionLocal()
+            try:
+                _save_history(hist_db, doc_id, question, answer)
+            finally:
+                hist_db.close()
+            answer_cache.put(doc_id, question, answer, query_vec=query_vec)
+        yield _sse("done", {"answer": answer, "cached": False})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/qa/ask_existing/batch")
+def ask_existing_document_batch(payload: schemas.BatchQARequest, db: Session = Depends(get_db)):
+    """
+    한 문서에 대한 여러 질문을 한 번에 처리 (평가/리포트 생성용).
+    흐름:
+      1) 문서 조회 1회 + 질문 임베딩 1회 배치 요청 (BM25 전용 질의는 제외)
+      2) 답변 캐시 조회 (exact / semantic, 위 임베딩 재사용)
+      3) 캐시 미스 질문만 retriever.retrieve_many로 일괄 검색 (인덱스 search 1회)
+      4) qa_chain 동시 호출 (QA_BATCH_CONCURRENCY)
+      5) QA 히스토리를 한 트랜잭션으로 저장 + 답변 캐시 등록
+    반환: {"document_id", "results": [{"question", "answer", "cached", ("cache_match")}, ...]} (입력 순서)
+    """
+    doc_id = payload.document_id
+    questions = [(q or "").strip() for q in payload.questions]
+    if not questions or not all(questions):
+        raise HTTPException(status_code=400, detail="빈 질문이 포함되어 있습니다.")
+    if len(questions) > QA_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"질문은 최대 {QA_BATCH_MAX_QUESTIONS}개까지 가능합니다.")
+
+    # 1) 문서 조회
+    document = crud.get_document_by_id(db, doc_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="문서를 찾을 수 없습니다.")
+
+    # 같은 질문은 한 번만 처리
+    unique = list(dict.fromkeys(questions))
+    embedding = get_embedding_model()
+
+    # 1-1) 질문 임베딩 1회 (질문 임베딩 LRU에 남아 검색 단계에서 재사용)
+    dense_qs = [q for q in unique if not (RETRIEVAL_MODE != "dense" and is_lexical_query(q))]
+    vectors = {}
+    if dense_qs:
+        try:
+            vectors = dict(zip(dense_qs, embedding.embed_queries(dense_qs)))
+        except Exception:
+            vectors = {}  # 캐시 비교는 exact만, 검색 단계에서 다시 시도
 
-    return {"answer": answer}
+    # 2) 답변 캐시
+    _warm_answer_cache(db, doc_id)
+    results = {}
+    for q in unique:
+        vec = vectors.get(q)
+        hit, _ = answer_cache.lookup(doc_id, q, embed_fn=(lambda _, v=vec: v) if vec is not None else None)
+        if hit:
+            results[q] = {"question": q, "answer": hit["answer"], "cached": True, "cache_match": hit["match"]}
+
+    # 3)~4) 캐시 미스 질문: 일괄 검색 → 동시 답변 생성
+    pending = [q for q in unique if q not in results]
+    if pending:
+        retriever = _ensure_retriever(document)
+        if hasattr(retriever, "retrieve_many"):
+            docs_list = retriever.retrieve_many(pending, embedding.embed_queries)
+        else:
+            docs_list = [retriever.get_relevant_documents(q)[:5] for q in pending]
+        answers = answer_many(pending, docs_list)
+
+        # 5) QA 히스토리 일괄 저장 + 답변 캐시 등록 (LLM 답변만, 검색 결과 없음(None)은 안내 문구로 응답)
+        answered = [(q, a) for q, a in zip(pending, answers) if a is not None]
+        try:
+            crud.save_qa_histories(db, doc_id, answered)
+        except Exception:
+            db.rollback()  # 답변은 반환, 저장 실패는 _save_history와 같이 무시
+        for q, a in answered:
+            answer_cache.put(doc_id, q, a, query_vec=vectors.get(q))
+        for q, a in zip(pending, answers):
+            results[q] = {"question": q, "answer": a if a is not None else NO_DOCS_NOTICE, "cached": False}
+
+    return {"document_id": doc_id, "results": [results[q] for q in questions]}
+
+
+@router.post("/qa/ask_corpus")
+def ask_corpus_question(payload: schemas.CorpusQARequest):
+    """
+    여러 논문에 걸친 질문 (공용 코퍼스 인덱스 사용).
+    - document_ids: 지정한 문서들만 / domain: 해당 도메인 전체 / 둘 다 없으면 전체 코퍼스
+    반환: {"answer": "...", "citations": [{document_id, source, page, section, ...}, ...]}
+    """
+    question = (payload.question or "").strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="질문이 비어 있습니다.")
+
+    query_vec = get_embedding_model().embed_query(question)
+    hits = corpus_index.search(
+        query_vec,
+        k=payload.top_k,
+        document_ids=payload.document_ids,
+        domain=payload.domain,
+    )
+    docs = [
+        Document(page_content=h["text"], metadata={**h["metadata"], "document_id": h["document_id"]})
+        for h in hits
+    ]
+    # citations: 컨텍스트 예산/중복 제거 후 실제로 답변에 쓰인 청크만
+    return answer_from_docs(question, docs)
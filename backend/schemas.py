@@ -29,7 +29,8 @@ class User(UserBase):
 class DocumentBase(BaseModel):
     user_id: int
     filename: str                       # 실제 파일명 (예: paper.pdf)
-    file_path: str                      # 서버 저장 경로 (예: uploaded_docs/paper.pdf)
+    file_path: str                      # 서버 저장 경로 (예: uploaded_docs/<sha256>.pdf)
+    checksum: Optional[str] = None      # 업로드 본문 SHA-256
     title: Optional[str] = None         # 메타/표시용 (없어도 무방)
     summary: Optional[str] = None       # 분석 결과
     domain: Optional[str] = None        # 분석 결과(기술 도메인)
@@ -102,3 +103,17 @@ class QAHistoryOut(BaseModel):
 class ExistingDocQARequest(BaseModel):
     document_id: int
     question: str
+
+
+class BatchQARequest(BaseModel):
+    """한 문서에 대한 여러 질문 (평가/리포트 생성용)"""
+    document_id: int
+    questions: List[str]
+
+
+class CorpusQARequest(BaseModel):
+    """여러 논문(또는 한 도메인 전체)에 대한 질문"""
+    question: str
+    document_ids: Optional[List[int]] = None   # 지정 시 해당 문서들로 제한
+    domain: Optional[str] = None               # 지정 시 해당 도메인 문서들로 제한
+    top_k: int = Field(8, ge=1, le=50)
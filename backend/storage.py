@@ -0,0 +1,76 @@
+# backend/storage.py
+# ------------------------------------------------------------
+# 업로드 파일 내용 주소 저장
+# - 본문을 1MB씩 읽으며 디스크에 쓰고 동시에 SHA-256 계산
+# - 저장 경로: uploaded_docs/<sha256><ext> → 파일명이 같아도 내용이 다르면 충돌하지 않음
+# - 임시 파일에 먼저 쓰고 교체 (같은 내용이 이미 있으면 임시 파일만 삭제)
+# - 업로드 라우트(UploadFile)와 대량 적재(디렉터리의 PDF) 모두 사용
+# ------------------------------------------------------------
+
+import hashlib
+import os
+import shutil
+import uuid
+from typing import BinaryIO, Optional, Tuple
+
+UPLOAD_DIR = "uploaded_docs"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+_COPY_CHUNK = 1024 * 1024  # 본문을 1MB씩 읽으며 저장 + 해시
+
+
+def store_stream(fileobj: BinaryIO, filename: Optional[str]) -> Tuple[str, str]:
+    """
+    파일 객체를 내용 주소 경로에 저장.
+    반환: (file_path, checksum)
+    """
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = fileobj.read(_COPY_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        checksum = digest.hexdigest()
+        ext = os.path.splitext(filename or "")[1].lower() or ".pdf"
+        file_path = os.path.join(UPLOAD_DIR, f"{checksum}{ext}")
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return file_path, checksum
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_COPY_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_file(src_path: str) -> Tuple[str, str]:
+    """
+    디스크에 있는 파일을 내용 주소 경로로 복사 (해시 먼저 → 이미 저장된 내용이면 복사 생략).
+    반환: (file_path, checksum)
+    """
+    checksum = file_checksum(src_path)
+    ext = os.path.splitext(src_path)[1].lower() or ".pdf"
+    file_path = os.path.join(UPLOAD_DIR, f"{checksum}{ext}")
+    if not os.path.exists(file_path):
+        tmp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return file_path, checksum
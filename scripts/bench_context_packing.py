@@ -0,0 +1,116 @@
+# scripts/bench_context_packing.py
+# ------------------------------------------------------------
+# QA 프롬프트 컨텍스트 토큰 측정: 기존 방식(청크 이어붙이기 + 중복 줄 제거) vs context_packer
+# - 청크 출처: 저장된 인덱스(faiss_index/<id>/docstore.pkl)의 실제 청크
+#   질문은 청크에서 뽑은 문장, 검색은 BM25 top-k (임베딩/LLM 호출 없음)
+# - 보고: 호출당 컨텍스트 토큰 평균/p50/p99, 감소율, 포함된 청크 수,
+#   숫자 토큰 보존율(기존 컨텍스트의 수치/모델명 중 패킹 결과에 남은 비율), 패킹 시간
+#
+# 실행: python -m scripts.bench_context_packing --k 5 --queries 200 --budget 2500
+# ------------------------------------------------------------
+
+import argparse
+import os
+import pickle
+import random
+import re
+import time
+
+import numpy as np
+
+from services.context_packer import BLOCK_SEPARATOR, ContextPacker, split_sentences
+from services.index_store import INDEX_DIR
+from services.lexical_index import BM25Index
+from services.token_utils import count_tokens
+
+_NUMERIC = re.compile(r"[A-Za-z]*\d[\w.\-]*")
+
+
+def load_chunks(limit_docs: int):
+    """[(document_id, [Document...])] — 저장된 docstore를 인덱스 순서대로"""
+    out = []
+    if not os.path.isdir(INDEX_DIR):
+        return out
+    for name in sorted(n for n in os.listdir(INDEX_DIR) if n.isdigit())[:limit_docs]:
+        path = os.path.join(INDEX_DIR, name, "docstore.pkl")
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        docs = [docstore.search(index_to_docstore_id[i]) for i in range(len(index_to_docstore_id))]
+        if len(docs) >= 5:
+            out.append((name, docs))
+    return out
+
+
+def naive_context(docs) -> str:
+    """변경 전 _build_context와 같은 형식 (헤더 + 본문, 완전 일치 줄만 제거)"""
+    blocks = []
+    for i, d in enumerate(docs, 1):
+        md = d.metadata or {}
+        blocks.append(f"[Doc#{i} | source={md.get('source') or 'N/A'} | page={md.get('page') or 'N/A'}]\n{d.page_content}")
+    seen, lines = set(), []
+    for line in BLOCK_SEPARATOR.join(blocks).splitlines():
+        key = line.strip()
+        if key and key not in seen:
+            seen.add(key)
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--budget", type=int, default=None, help="기본: QA_CONTEXT_TOKEN_BUDGET")
+    ap.add_argument("--docs", type=int, default=50, help="사용할 저장 인덱스 수 상한")
+    args = ap.parse_args()
+
+    corpus = load_chunks(args.docs)
+    if not corpus:
+        print(f"저장된 인덱스가 없습니다 ({INDEX_DIR}). 문서를 먼저 업로드/분석하세요.")
+        return
+    print(f"인덱스 {len(corpus)}개, 청크 {sum(len(d) for _, d in corpus)}개 사용")
+
+    rng = random.Random(0)
+    packer = ContextPacker() if args.budget is None else ContextPacker(budget=args.budget)
+    lexical = {name: BM25Index([d.page_content for d in docs]) for name, docs in corpus}
+
+    before, after, kept, coverage, ms = [], [], [], [], []
+    for _ in range(args.queries):
+        name, docs = rng.choice(corpus)
+        sentences = split_sentences(rng.choice(docs).page_content)
+        if not sentences:
+            continue
+        hits = lexical[name].search(rng.choice(sentences), args.k)
+        found = [docs[i] for i, _ in hits]
+        if not found:
+            continue
+
+        old = naive_context(found)
+        t0 = time.perf_counter()
+        new, used = packer.pack(found)
+        ms.append((time.perf_counter() - t0) * 1000)
+
+        before.append(count_tokens(old, model=packer.model))
+        after.append(count_tokens(new, model=packer.model))
+        kept.append(len(used) / len(found))
+        facts = set(_NUMERIC.findall(old))
+        coverage.append(len(facts & set(_NUMERIC.findall(new))) / len(facts) if facts else 1.0)
+
+    if not before:
+        print("측정할 질의가 없습니다.")
+        return
+    b, a = np.array(before), np.array(after)
+    print(f"\n{'':<10} {'avg':>8} {'p50':>8} {'p99':>8}")
+    print(f"{'before':<10} {b.mean():>8.0f} {np.percentile(b, 50):>8.0f} {np.percentile(b, 99):>8.0f}")
+    print(f"{'packed':<10} {a.mean():>8.0f} {np.percentile(a, 50):>8.0f} {np.percentile(a, 99):>8.0f}")
+    print(f"\n토큰 감소율      : {1 - a.sum() / b.sum():.1%} (budget={packer.budget}, k={args.k}, 질의 {len(b)}개)")
+    print(f"포함 청크 비율    : {np.mean(kept):.1%}")
+    print(f"숫자 토큰 보존율  : {np.mean(coverage):.1%}")
+    print(f"패킹 시간 p50/p99 : {np.percentile(ms, 50):.2f} / {np.percentile(ms, 99):.2f} ms")
+    print(f"packer stats      : {packer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
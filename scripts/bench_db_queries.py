@@ -0,0 +1,180 @@
+# scripts/bench_db_queries.py
+# ------------------------------------------------------------
+# 라우트 핫 쿼리 지연 측정 (Postgres, POSTGRES_URL)
+# - 전용 사용자(--user-id)로 문서 N개 + QA 1M행 시드 (generate_series, 수십 초)
+# - 라우트와 같은 모양의 ORM 쿼리를 반복 실행해 p50/p99(ms) 보고
+#     duplicate_check  : documents (user_id, checksum) .first()        ← 업로드 중복 검사
+#     qa_history       : qa_history document_id ORDER BY created_at    ← GET /qa/{id}
+#     qa_recent        : 같은 조건 DESC LIMIT 256                       ← 답변 캐시 warm-up
+#     document_detail  : documents id = ?                              ← GET /documents/{id}
+#     document_page    : id,filename WHERE id > ? ORDER BY id LIMIT 100 ← GET /documents
+# - --explain: 각 쿼리의 EXPLAIN (실행 계획에 인덱스 사용 여부 확인)
+# - --compare: 인덱스를 잠시 지우고 같은 측정을 반복 (전/후 비교, 끝나면 다시 생성)
+#
+# 실행: python -m scripts.bench_db_queries --qa-rows 1000000 --docs 2000 --iters 500 --explain
+#       python -m scripts.bench_db_queries --cleanup
+# ------------------------------------------------------------
+
+import argparse
+import random
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from backend import models
+from backend.database import SessionLocal, engine
+from backend.migrations import MIGRATIONS, run_migrations
+
+_INDEX_NAMES = ("uq_documents_user_checksum", "ix_qa_history_document_created")
+
+
+def seed(user_id: int, docs: int, qa_rows: int) -> None:
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT COUNT(*) FROM documents WHERE user_id = :uid"), {"uid": user_id}
+        ).scalar()
+        if exists:
+            print(f"시드 데이터가 이미 있습니다 (user_id={user_id}, 문서 {exists}개) → 재사용")
+            return
+
+        t0 = time.time()
+        conn.execute(
+            text("INSERT INTO users (id, email) VALUES (:uid, :email) ON CONFLICT DO NOTHING"),
+            {"uid": user_id, "email": f"bench-{user_id}@example.com"},
+        )
+        conn.execute(text("""
+            INSERT INTO documents (user_id, filename, file_path, checksum, summary, domain, uploaded_at)
+            SELECT :uid, 'bench-' || g || '.pdf', 'uploaded_docs/bench-' || g || '.pdf',
+                   md5('bench-a' || g) || md5('bench-b' || g), repeat('요약 ', 200), 'bench',
+                   now() - make_interval(mins => g)
+            FROM generate_series(1, :docs) AS g
+        """), {"uid": user_id, "docs": docs})
+        conn.execute(text("""
+            INSERT INTO qa_history (document_id, question, answer, created_at)
+            SELECT d.ids[1 + (g % array_length(d.ids, 1))], '질문 ' || g, repeat('답변 ', 50),
+                   now() - make_interval(secs => random() * 31536000)
+            FROM generate_series(1, :rows) AS g,
+                 (SELECT array_agg(id ORDER BY id) AS ids FROM documents WHERE user_id = :uid) AS d
+        """), {"uid": user_id, "rows": qa_rows})
+        print(f"시드 완료: 문서 {docs}개, QA {qa_rows}행 ({time.time() - t0:.1f}s)")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE documents"))
+        conn.execute(text("ANALYZE qa_history"))
+
+
+def cleanup(user_id: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(
+            "DELETE FROM qa_history WHERE document_id IN (SELECT id FROM documents WHERE user_id = :uid)"
+        ), {"uid": user_id})
+        conn.execute(text("DELETE FROM documents WHERE user_id = :uid"), {"uid": user_id})
+        conn.execute(text("DELETE FROM users WHERE id = :uid"), {"uid": user_id})
+    print(f"시드 데이터 삭제 (user_id={user_id})")
+
+
+def build_queries(db, user_id: int):
+    """이름 → (무작위 파라미터로 ORM 쿼리를 만드는 함수, 종결 연산)"""
+    doc_ids = [r[0] for r in db.query(models.Document.id).filter(models.Document.user_id == user_id)]
+    checksums = [r[0] for r in db.query(models.Document.checksum).filter(models.Document.user_id == user_id)]
+    D, Q = models.Document, models.QAHistory
+    return {
+        "duplicate_check": (
+            lambda: db.query(D).filter(D.user_id == user_id).filter(D.checksum == random.choice(checksums)),
+            "first",
+        ),
+        "qa_history": (
+            lambda: db.query(Q).filter(Q.document_id == random.choice(doc_ids)).order_by(Q.created_at.asc()),
+            "all",
+        ),
+        "qa_recent": (
+            lambda: db.query(Q).filter(Q.document_id == random.choice(doc_ids))
+            .order_by(Q.created_at.desc()).limit(256),
+            "all",
+        ),
+        "document_detail": (
+            lambda: db.query(D).filter(D.id == random.choice(doc_ids)),
+            "first",
+        ),
+        "document_page": (
+            lambda: db.query(D.id, D.filename).filter(D.id > random.choice(doc_ids))
+            .order_by(D.id.asc()).limit(101),
+            "all",
+        ),
+    }
+
+
+def measure(queries, iters: int) -> None:
+    print(f"{'query':<16} {'p50 ms':>8} {'p99 ms':>8} {'rows':>6}")
+    for name, (make, op) in queries.items():
+        for _ in range(min(20, iters)):  # 워밍업 (커넥션/캐시)
+            getattr(make(), op)()
+        times, rows = [], 0
+        for _ in range(iters):
+            q = make()
+            t0 = time.perf_counter()
+            out = getattr(q, op)()
+            times.append((time.perf_counter() - t0) * 1000)
+            rows = len(out) if isinstance(out, list) else int(out is not None)
+        p50, p99 = np.percentile(times, [50, 99])
+        print(f"{name:<16} {p50:>8.2f} {p99:>8.2f} {rows:>6}")
+
+
+def explain(db, queries) -> None:
+    for name, (make, _) in queries.items():
+        sql = str(make().statement.compile(engine, compile_kwargs={"literal_binds": True}))
+        plan = db.execute(text(f"EXPLAIN {sql}")).fetchall()
+        print(f"\n-- {name}")
+        for row in plan:
+            print("  " + row[0])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--user-id", type=int, default=900001)
+    ap.add_argument("--docs", type=int, default=2000)
+    ap.add_argument("--qa-rows", type=int, default=1_000_000)
+    ap.add_argument("--iters", type=int, default=500)
+    ap.add_argument("--explain", action="store_true")
+    ap.add_argument("--compare", action="store_true", help="인덱스 없이도 측정 (전/후 비교)")
+    ap.add_argument("--cleanup", action="store_true", help="시드 데이터 삭제 후 종료")
+    args = ap.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    if args.cleanup:
+        cleanup(args.user_id)
+        return
+    seed(args.user_id, args.docs, args.qa_rows)
+
+    db = SessionLocal()
+    try:
+        queries = build_queries(db, args.user_id)
+        print("\n== 인덱스 있음")
+        measure(queries, args.iters)
+        if args.explain:
+            explain(db, queries)
+
+        if args.compare:
+            db.rollback()
+            with engine.begin() as conn:
+                for name in _INDEX_NAMES:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            try:
+                print("\n== 인덱스 없음")
+                measure(queries, max(1, args.iters // 10))
+                if args.explain:
+                    explain(db, queries)
+            finally:
+                db.rollback()
+                creates = [s for _, stmts in MIGRATIONS for s in stmts if s.startswith("CREATE")]
+                with engine.begin() as conn:
+                    for stmt in creates:
+                        conn.execute(text(stmt))
+                print("\n인덱스 재생성 완료")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
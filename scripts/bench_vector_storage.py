@@ -0,0 +1,123 @@
+# scripts/bench_vector_storage.py
+# ------------------------------------------------------------
+# 벡터 저장 모드(flat/fp16/sq8/pq)별 메모리/recall 트레이드오프 측정
+# - 벡터 출처: 임베딩 캐시(SQLite)에 쌓인 실제 청크 벡터, 없으면 합성 벡터
+# - 기준: flat 정확 검색 top-k
+# - 각 모드: 압축 인덱스만 사용 / fetch_k 후보 정확 재채점 두 가지 recall@k 보고
+# - Matryoshka(256/512차원 1차 검색 + 전체 차원 재순위)도 함께 보고
+# - 바이트는 코드 + 학습 파라미터(PQ 코드북, SQ 범위) 포함 (vector_store.index_nbytes),
+#   직렬화 크기(faiss.serialize_index)와 함께 보고
+# - 문서 단위(--doc-sizes, 기본 100/250/500 청크): retriever 캐시에 실제로 올라가는 크기
+#   PQ는 코드북(2^nbits × d × 4)이 청크 수와 무관하게 붙어 이 구간에선 sq8로 대체됨
+#
+# 실행: python -m scripts.bench_vector_storage --k 5 --fetch-k 30 --queries 200 --doc-sizes 100,250,500
+# ------------------------------------------------------------
+
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from services.embedding_cache import EMBED_CACHE_PATH
+import faiss
+
+from services.vector_store import build_faiss_index, index_nbytes, storage_mode, truncate_normalize
+
+
+def load_vectors(limit: int, dim: int) -> np.ndarray:
+    if os.path.exists(EMBED_CACHE_PATH):
+        conn = sqlite3.connect(EMBED_CACHE_PATH)
+        rows = conn.execute("SELECT vec FROM embeddings LIMIT ?", (limit,)).fetchall()
+        conn.close()
+        if len(rows) >= 300:
+            print(f"임베딩 캐시 벡터 {len(rows)}개 사용 ({EMBED_CACHE_PATH})")
+            return np.vstack([np.frombuffer(r[0], dtype=np.float32) for r in rows])
+    print(f"합성 벡터 {limit}개 사용 (dim={dim})")
+    rng = np.random.default_rng(0)
+    # 실제 임베딩처럼 소수의 군집 주변에 분포하도록 생성
+    centers = rng.standard_normal((32, dim)).astype(np.float32)
+    x = centers[rng.integers(0, 32, limit)] + 0.6 * rng.standard_normal((limit, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def recall(truth: np.ndarray, found: np.ndarray) -> float:
+    return float(np.mean([len(set(t) & set(f)) / len(t) for t, f in zip(truth, found)]))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=5000)
+    ap.add_argument("--dim", type=int, default=3072)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--fetch-k", type=int, default=30)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--doc-sizes", default="100,250,500", help="문서 단위 측정 청크 수 (쉼표 구분)")
+    args = ap.parse_args()
+
+    vectors = load_vectors(args.n + args.queries, args.dim)
+    base, queries = vectors[:-args.queries], vectors[-args.queries:]
+    flat = build_faiss_index(base, "flat")
+    _, truth = flat.search(queries, args.k)
+    flat_bytes = base.shape[0] * base.shape[1] * 4
+
+    print(f"n={len(base)}")
+    print(f"{'mode':<6} {'actual':<6} {'bytes/vec':>10} {'saving':>7} {'recall@k':>9} {'+rescore':>9} {'ms/query':>9}")
+    for mode in ("flat", "fp16", "sq8", "pq"):
+        index = build_faiss_index(base, mode)
+        code_bytes = index_nbytes(index)
+
+        t0 = time.perf_counter()
+        _, approx = index.search(queries, args.k)
+        ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+        # fetch_k 후보를 정확 벡터로 재채점
+        _, cand = index.search(queries, args.fetch_k)
+        rescored = []
+        for q, c in zip(queries, cand):
+            c = c[c >= 0]
+            d = np.sum((base[c] - q) ** 2, axis=1)
+            rescored.append(c[np.argsort(d)[:args.k]])
+
+        print(
+            f"{mode:<6} {storage_mode(index):<6} {code_bytes / index.ntotal:>10.0f} {flat_bytes / code_bytes:>6.1f}x "
+            f"{recall(truth, approx):>9.3f} {recall(truth, rescored):>9.3f} {ms:>9.3f}"
+        )
+
+    # 문서 단위: 청크 수백 개짜리 인덱스 (retriever 캐시 항목 1개 크기)
+    print(f"\n{'n':>5} {'mode':<6} {'actual':<6} {'est bytes':>11} {'serialized':>11} {'saving':>7}")
+    for n in [int(x) for x in args.doc_sizes.split(",") if x.strip()]:
+        sub = base[:n]
+        flat_n = n * sub.shape[1] * 4
+        for mode in ("flat", "fp16", "sq8", "pq"):
+            index = build_faiss_index(sub, mode)
+            est = index_nbytes(index)
+            print(
+                f"{n:>5} {mode:<6} {storage_mode(index):<6} {est:>11} "
+                f"{faiss.serialize_index(index).nbytes:>11} {flat_n / est:>6.1f}x"
+            )
+
+    # Matryoshka: 축소 차원 flat 인덱스로 후보 검색 → 전체 차원 재순위
+    print(f"\n{'dim':<6} {'bytes/vec':>10} {'saving':>7} {'recall@k':>9} {'+rescore':>9} {'ms/query':>9}")
+    for dim in (256, 512):
+        if dim >= base.shape[1]:
+            continue
+        short = truncate_normalize(base, dim)
+        short_q = truncate_normalize(queries, dim)
+        index = build_faiss_index(short, "flat")
+
+        t0 = time.perf_counter()
+        _, approx = index.search(short_q, args.k)
+        ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+        _, cand = index.search(short_q, args.fetch_k)
+        rescored = [c[np.argsort(np.sum((base[c] - q) ** 2, axis=1))[:args.k]] for q, c in zip(queries, cand)]
+        print(
+            f"{dim:<6} {dim * 4:>10} {flat_bytes / (dim * 4 * len(base)):>6.1f}x "
+            f"{recall(truth, approx):>9.3f} {recall(truth, rescored):>9.3f} {ms:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
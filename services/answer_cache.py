@@ -0,0 +1,193 @@
+# services/answer_cache.py
+# 문서별 QA 답변 캐시 (document_id 범위)
+# - exact: 정규화된 질문 텍스트가 같으면 적중
+# - semantic: 질문 임베딩 코사인 유사도가 임계값 이상이면 적중 (near-duplicate)
+# - 문서별 LRU(최대 항목 수) + TTL 만료
+# - 전체 항목 수 상한(ANSWER_CACHE_MAX_ENTRIES): 넘으면 가장 오래 안 쓴 문서의 가장 오래된 항목부터 축출
+#   (항목마다 질문 임베딩을 보관 → float16으로 저장, 문서 버킷은 put에서만 생성)
+# - qa_history 테이블의 기존 답변으로 문서별 최초 1회 warm-up 가능
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+ANSWER_CACHE_TTL_SEC = int(os.getenv("ANSWER_CACHE_TTL_SEC", "86400"))
+ANSWER_CACHE_MAX_PER_DOC = int(os.getenv("ANSWER_CACHE_MAX_PER_DOC", "256"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+ANSWER_CACHE_SIM_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIM_THRESHOLD", "0.95"))
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "1") == "1"
+
+_PUNCT = re.compile(r"[\s\?\!\.\,~·…\"'`]+")
+
+
+def normalize_question(question: str) -> str:
+    """NFKC + 소문자 + 공백/문장부호 정리 ("핵심 기여가 뭐야?" == "핵심 기여가 뭐야")"""
+    q = unicodedata.normalize("NFKC", question or "").lower()
+    return _PUNCT.sub(" ", q).strip()
+
+
+def _unit(vec: List[float]) -> np.ndarray:
+    arr = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm else arr
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        ttl_sec: int = ANSWER_CACHE_TTL_SEC,
+        max_per_doc: int = ANSWER_CACHE_MAX_PER_DOC,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_sec = ttl_sec
+        self.max_per_doc = max_per_doc
+        self.max_entries = max_entries
+        self._docs: "OrderedDict[int, OrderedDict[str, Dict[str, Any]]]" = OrderedDict()  # 문서 LRU 순서
+        self._entries = 0
+        self._warm: set = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _bucket(self, doc_id: int) -> Optional["OrderedDict[str, Dict[str, Any]]"]:
+        """문서 버킷 (만료 항목 정리 후, 비었으면 None). 조회만으로는 버킷을 만들지 않음"""
+        bucket = self._docs.get(doc_id)
+        if bucket is None:
+            return None
+        now = time.time()
+        for key in [k for k, e in bucket.items() if now - e["ts"] > self.ttl_sec]:
+            bucket.pop(key, None)
+            self._entries -= 1
+        if not bucket:
+            self._drop(doc_id)
+            return None
+        self._docs.move_to_end(doc_id)
+        return bucket
+
+    def _drop(self, doc_id: int) -> None:
+        bucket = self._docs.pop(doc_id, None)
+        if bucket is not None:
+            self._entries -= len(bucket)
+
+    def _evict_one(self, bucket: "OrderedDict[str, Dict[str, Any]]") -> None:
+        bucket.popitem(last=False)
+        self._entries -= 1
+        self.evictions += 1
+
+    def lookup(
+        self,
+        doc_id: int,
+        question: str,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """
+        (hit, query_vec) 반환.
+        - hit: {"answer", "match": "exact"|"semantic", "similarity"} 또는 None
+        - query_vec: semantic 비교에 쓴 질문 임베딩 (put에 넘기면 재계산 없음)
+        """
+        key = normalize_question(question)
+        with self._lock:
+            bucket = self._bucket(doc_id)
+            entry = bucket.get(key) if bucket else None
+            if entry:
+                bucket.move_to_end(key)
+                self.hits += 1
+                return {"answer": entry["answer"], "match": "exact", "similarity": 1.0}, entry.get("vec")
+
+        # semantic: 임베딩 호출은 lock 밖에서
+        # (후보가 없어도 계산해 두면 put 시 함께 저장되어 다음 near-duplicate 질문에 쓰임)
+        if not (ANSWER_CACHE_SEMANTIC and embed_fn):
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        qvec = _unit(embed_fn(question))
+        with self._lock:
+            bucket = self._bucket(doc_id) or {}
+            best_key, best_sim = None, -1.0
+            for k, e in bucket.items():
+                if e.get("vec") is None:
+                    continue
+                sim = float(np.dot(qvec, e["vec"]))
+                if sim > best_sim:
+                    best_key, best_sim = k, sim
+            if best_key is not None and best_sim >= ANSWER_CACHE_SIM_THRESHOLD:
+                bucket.move_to_end(best_key)
+                self.hits += 1
+                self.semantic_hits += 1
+                return {"answer": bucket[best_key]["answer"], "match": "semantic", "similarity": round(best_sim, 4)}, qvec
+            self.misses += 1
+        return None, qvec
+
+    def put(
+        self,
+        doc_id: int,
+        question: str,
+        answer: str,
+        query_vec: Optional[Any] = None,
+        ts: Optional[float] = None,
+    ) -> None:
+        key = normalize_question(question)
+        if not key or not answer:
+            return
+        vec = _unit(query_vec).astype(np.float16) if query_vec is not None else None
+        with self._lock:
+            bucket = self._bucket(doc_id)
+            if bucket is None:
+                bucket = self._docs[doc_id] = OrderedDict()
+            if key not in bucket:
+                self._entries += 1
+            bucket[key] = {"answer": answer, "vec": vec, "ts": ts or time.time()}
+            bucket.move_to_end(key)
+            while len(bucket) > self.max_per_doc:
+                self._evict_one(bucket)
+            # 전체 상한: 가장 오래 안 쓴 문서부터 (방금 넣은 문서는 마지막)
+            while self._entries > self.max_entries:
+                oldest_id, oldest = next(iter(self._docs.items()))
+                self._evict_one(oldest)
+                if not oldest:
+                    self._drop(oldest_id)
+
+    def is_warm(self, doc_id: int) -> bool:
+        with self._lock:
+            return doc_id in self._warm
+
+    def warm(self, doc_id: int, rows: Iterable[Tuple[str, str, float]]) -> None:
+        """qa_history 행 (question, answer, created_at epoch)으로 채움 — 오래된 것부터 넣어 LRU 순서 유지"""
+        now = time.time()
+        for question, answer, ts in rows:
+            if ts and now - ts > self.ttl_sec:
+                continue  # 이미 만료된 답변은 넣지 않음
+            self.put(doc_id, question, answer, ts=ts)
+        with self._lock:
+            self._warm.add(doc_id)
+
+    def invalidate(self, doc_id: int) -> None:
+        with self._lock:
+            self._drop(doc_id)
+            self._warm.discard(doc_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "documents": len(self._docs),
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+            }
+
+
+answer_cache = AnswerCache()
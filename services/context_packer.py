@@ -0,0 +1,230 @@
+# services/context_packer.py
+# ------------------------------------------------------------
+# QA 프롬프트 컨텍스트 패킹 (토큰 예산 기반)
+# - 검색 결과를 관련도 순서(retriever 반환 순서) 그대로 채우되 QA_CONTEXT_TOKEN_BUDGET에서 멈춤
+#   (토큰 수는 qa_llm 토크나이저 기준, services.token_utils.count_tokens)
+# - 청크 겹침 제거: 청크화 시 chunk_overlap(120자)으로 이웃 청크가 같은 문장 조각을 공유
+#   → 이미 넣은 같은 출처 청크의 끝과 새 청크의 앞(또는 그 반대)이 겹치면 그 구간을 잘라냄
+# - 유사 문장 제거: 문장(마침표/물음표/느낌표 뒤 공백으로 분리, 줄바꿈은 공백 취급) 단위로
+#   BM25 토크나이저 토큰 집합의 Jaccard 유사도가 QA_NEAR_DUP_THRESHOLD(기본 0.85) 이상인
+#   문장이 이미 들어가 있으면 생략
+#   (숫자 토큰이 다르면 유사해도 유지 — "BLEU 28.4" / "BLEU 27.3"은 서로 다른 사실)
+#   이미 넣은 문장의 일부인 조각(청크 경계에서 잘린 문장)도 생략 — 단 _CONTAIN_MIN_CHARS 이상이고
+#   조각의 숫자 토큰이 모두 원문 문장에 있을 때만 ("6", "28.4" 같은 짧은 조각은 유지)
+#   예산 때문에 넣지 못한 문장/청크는 중복 판정·겹침 비교 대상에 남기지 않음
+# - 청크 헤더([Doc#i | source | page])는 원래 검색 순번을 유지 → citations의 doc 번호와 일치
+# - 예산이 남지 않으면 마지막 청크는 문장 단위로 잘라서 채움
+# ------------------------------------------------------------
+
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services.lexical_index import tokenize
+from services.token_utils import count_tokens
+
+QA_CONTEXT_TOKEN_BUDGET = int(os.getenv("QA_CONTEXT_TOKEN_BUDGET", "2500"))
+QA_NEAR_DUP_THRESHOLD = float(os.getenv("QA_NEAR_DUP_THRESHOLD", "0.85"))
+QA_CONTEXT_MIN_TOKENS = int(os.getenv("QA_CONTEXT_MIN_TOKENS", "48"))  # 남은 예산이 이보다 작으면 부분 청크를 넣지 않음
+QA_TOKENIZER_MODEL = os.getenv("QA_TOKENIZER_MODEL", "gpt-4o")
+
+BLOCK_SEPARATOR = "\n\n------\n\n"
+
+_OVERLAP_MIN_CHARS = 20   # 이보다 짧은 겹침은 우연한 일치로 보고 유지
+_OVERLAP_MAX_CHARS = 400  # chunk_overlap(120자)보다 넉넉히
+_NEAR_DUP_MIN_TERMS = 6   # 토큰(음절 bigram 포함)이 이보다 적은 짧은 문장은 완전 일치/포함만 중복으로 판단
+_CONTAIN_MIN_CHARS = 20   # 이보다 짧은 문장은 다른 문장에 포함돼도 중복으로 보지 않음
+
+# 문장 경계: 마침표/물음표/느낌표(+닫는 괄호·따옴표) 뒤 공백 (줄바꿈만으로는 나누지 않음 —
+# PDF 추출 텍스트는 줄바꿈이 문장 중간·표 셀마다 들어가 짧은 조각이 다른 문장에 "포함"돼 버림)
+_SENTENCE = re.compile(r"(?<=[.!?。])[\"')\]]*\s+")
+_SPACES = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [_SPACES.sub(" ", s).strip() for s in _SENTENCE.split(text or "") if s and s.strip()]
+
+
+def _overlap(a: str, b: str) -> int:
+    """a의 끝과 b의 앞이 겹치는 가장 긴 길이 (공백 차이는 무시하지 않음)."""
+    for n in range(min(len(a), len(b), _OVERLAP_MAX_CHARS), _OVERLAP_MIN_CHARS - 1, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+
+def _source_key(doc: Any) -> Tuple[Any, Any]:
+    md = getattr(doc, "metadata", {}) or {}
+    return md.get("document_id"), md.get("source")
+
+
+def _strip_overlap(text: str, kept: List[str]) -> Tuple[str, int]:
+    """이미 넣은 같은 출처 청크들과 겹치는 앞/뒤 구간 제거 → (남은 본문, 제거한 글자 수)"""
+    removed = 0
+    for prev in kept:
+        head = _overlap(prev, text)  # prev 다음 청크 (prev 끝 == text 앞)
+        if head:
+            text, removed = text[head:], removed + head
+        tail = _overlap(text, prev)  # prev 이전 청크 (text 끝 == prev 앞)
+        if tail:
+            text, removed = text[:-tail], removed + tail
+    return text, removed
+
+
+class _SentenceSet:
+    """넣은 문장들의 정규화 문자열/토큰 집합 (완전 일치·포함 + Jaccard 유사 중복 검사)."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.exact: Set[str] = set()
+        self.keys: List[Tuple[str, Set[str]]] = []         # (정규화 문자열, 숫자 토큰 집합)
+        self.terms: List[Tuple[Set[str], Set[str]]] = []   # (토큰 집합, 숫자 토큰 집합)
+
+    @staticmethod
+    def features(sentence: str) -> Tuple[str, Set[str], Set[str]]:
+        key = _SPACES.sub(" ", sentence).strip().lower()
+        terms = set(tokenize(sentence))
+        return key, terms, {t for t in terms if _NUMBER.search(t)}
+
+    def is_duplicate(self, features: Tuple[str, Set[str], Set[str]]) -> bool:
+        key, terms, numbers = features
+        if key in self.exact:
+            return True
+        if len(key) >= _CONTAIN_MIN_CHARS and any(
+            key in k and numbers <= k_numbers for k, k_numbers in self.keys
+        ):
+            return True
+        if len(terms) >= _NEAR_DUP_MIN_TERMS:
+            for seen, seen_numbers in self.terms:
+                if numbers != seen_numbers:
+                    continue
+                inter = len(terms & seen)
+                if inter and inter / len(terms | seen) >= self.threshold:
+                    return True
+        return False
+
+    def add(self, features: Tuple[str, Set[str], Set[str]]) -> None:
+        """컨텍스트에 실제로 넣은 문장만 등록"""
+        key, terms, numbers = features
+        self.exact.add(key)
+        self.keys.append((key, numbers))
+        if len(terms) >= _NEAR_DUP_MIN_TERMS:
+            self.terms.append((terms, numbers))
+
+
+def _header(i: int, doc: Any) -> str:
+    md = getattr(doc, "metadata", {}) or {}
+    return f"[Doc#{i} | source={md.get('source') or 'N/A'} | page={md.get('page') or 'N/A'}]"
+
+
+class ContextPacker:
+    """
+    검색 청크 → QA 프롬프트 컨텍스트 문자열.
+    stats: 호출 수, 패킹 전/후 토큰 합, 생략한 문장 수, 잘라낸 겹침 글자 수, 예산에서 잘린 청크 수
+    """
+
+    def __init__(
+        self,
+        budget: int = QA_CONTEXT_TOKEN_BUDGET,
+        near_dup_threshold: float = QA_NEAR_DUP_THRESHOLD,
+        model: str = QA_TOKENIZER_MODEL,
+    ):
+        self.budget = budget
+        self.near_dup_threshold = near_dup_threshold
+        self.model = model
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.dropped_sentences = 0
+        self.overlap_chars = 0
+        self.truncated_docs = 0
+
+    def _tokens(self, text: str) -> int:
+        return count_tokens(text, model=self.model)
+
+    def pack(self, docs: List[Any], budget: Optional[int] = None) -> Tuple[str, List[int]]:
+        """(컨텍스트 문자열, 포함된 청크의 검색 순번 목록(1부터))"""
+        budget = self.budget if budget is None else budget
+        sep_tokens = self._tokens(BLOCK_SEPARATOR)
+        sentences = _SentenceSet(self.near_dup_threshold)
+        kept_by_source: Dict[Tuple[Any, Any], List[str]] = {}
+        blocks: List[str] = []
+        used: List[int] = []
+        total = 0
+        tokens_in = 0
+        dropped = 0
+        overlap = 0
+        truncated = 0
+
+        for i, doc in enumerate(docs, 1):
+            header = _header(i, doc)
+            content = doc.page_content or ""
+            tokens_in += self._tokens(header) + self._tokens(content) + (sep_tokens if i > 1 else 0)
+            if total >= budget:
+                truncated += 1
+                continue
+
+            prev = kept_by_source.setdefault(_source_key(doc), [])
+            body, cut = _strip_overlap(content, prev)
+
+            remaining = budget - total - self._tokens(header) - (sep_tokens if blocks else 0)
+            if remaining < QA_CONTEXT_MIN_TOKENS and blocks:
+                truncated += 1
+                continue
+
+            lines: List[str] = []
+            used_tokens = 0
+            cut_short = False
+            for sentence in split_sentences(body):
+                features = _SentenceSet.features(sentence)
+                if sentences.is_duplicate(features):
+                    dropped += 1
+                    continue
+                n = self._tokens(sentence) + 1  # 줄바꿈
+                if used_tokens + n > remaining and (lines or blocks):
+                    truncated += 1
+                    cut_short = True
+                    break
+                lines.append(sentence)
+                sentences.add(features)
+                used_tokens += n
+            if not lines:
+                continue
+
+            block = f"{header}\n" + "\n".join(lines)
+            total += self._tokens(block) + (sep_tokens if blocks else 0)
+            blocks.append(block)
+            used.append(i)
+            # 끝까지 넣은 청크만 겹침 비교 대상으로 (넣지 않은 구간과 겹친다고 잘라내지 않도록)
+            overlap += cut
+            if not cut_short:
+                prev.append(content)
+
+        with self._lock:
+            self.calls += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += total
+            self.dropped_sentences += dropped
+            self.overlap_chars += overlap
+            self.truncated_docs += truncated
+        return BLOCK_SEPARATOR.join(blocks), used
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "calls": self.calls,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+                "avg_tokens_out": round(self.tokens_out / self.calls, 1) if self.calls else 0.0,
+                "reduction": round(1 - self.tokens_out / self.tokens_in, 4) if self.tokens_in else 0.0,
+                "dropped_sentences": self.dropped_sentences,
+                "overlap_chars": self.overlap_chars,
+                "truncated_docs": self.truncated_docs,
+            }
+
+
+context_packer = ContextPacker()
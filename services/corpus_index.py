@@ -0,0 +1,491 @@
+# services/corpus_index.py
+# ------------------------------------------------------------
+# 전체 논문 공용 벡터 인덱스 (cross-paper 검색)
+# - 도메인별 샤드: 도메인 필터 질의는 해당 샤드 하나만 검색
+# - 샤드 = IndexIDMap2(IndexHNSWSQ 8bit, 내적) → 코퍼스가 커져도 검색 지연은 sub-linear
+#   벡터는 CORPUS_DIM(기본 EMBED_SEARCH_DIM, 0이면 전체 차원)으로 잘라 재정규화 후 8bit 양자화
+#   → 3072차원 float32(12KB/청크) 대신 차원 수 바이트 + HNSW 링크 (CORPUS_STORAGE=flat이면 float32)
+#   차원/저장 방식은 샤드 생성 시 정해짐 (기존 샤드는 저장된 설정 그대로, 질의도 샤드 차원으로 자름)
+# - 청크 ID = (document_id << 20) | 청크 번호 → document_id 필터는 IDSelectorBatch로 처리
+#   (선택된 청크가 적으면 HNSW 대신 해당 벡터만 정확히 비교)
+# - 문서 삭제는 메타에서 제거(툼스톤) 후 일정 비율을 넘으면 샤드 재구성
+#   같은 문서 재등록은 HNSW 그래프에서 이전 벡터를 지울 수 없으므로 즉시 재구성 후 추가
+# - 저장: 샤드별 스냅샷(snapshot.pkl: 인덱스 + 메타) + 추가 전용 저널(journal-<seq>.log)
+#   문서 추가/삭제는 그 문서 분량만 저널에 덧붙이고, CORPUS_SNAPSHOT_EVERY건마다(또는 재구성 시)
+#   스냅샷을 새로 쓰고 이전 저널 구간을 삭제 → 추가 비용이 코퍼스 크기와 무관
+#   로드 시 스냅샷 이후 저널을 재생
+# - 잠금: 샤드별 RLock (한 샤드 쓰기가 다른 샤드 검색을 막지 않음)
+#   스냅샷 파일 쓰기는 샤드 잠금 밖에서 (잠금 안에서는 인덱스 직렬화/메타 복사만)
+# - 메모리 예산(CORPUS_MAX_BYTES): 상주 샤드의 인덱스(코드 + HNSW 링크) + 청크 텍스트 합
+#   넘으면 가장 오래 안 쓴 샤드를 스냅샷 후 메모리에서 내림 → 다음 검색/추가 때 디스크에서 다시 로드
+#   (문서 → 샤드 매핑만 항상 상주)
+# - backfill: 코퍼스 인덱스 도입 전에 분석된 문서를 디스크 인덱스에서 등록 (서버 기동 시)
+# ------------------------------------------------------------
+
+import glob
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from services.index_store import INDEX_DIR, has_index, load_index
+from services.vector_store import EMBED_SEARCH_DIM, index_nbytes, truncate_normalize
+
+CORPUS_DIR = os.path.join(INDEX_DIR, "corpus")
+CORPUS_HNSW_M = int(os.getenv("CORPUS_HNSW_M", "32"))
+CORPUS_EF_SEARCH = int(os.getenv("CORPUS_EF_SEARCH", "128"))
+CORPUS_EXACT_FILTER_MAX = int(os.getenv("CORPUS_EXACT_FILTER_MAX", "4096"))  # 이 이하의 필터 결과는 정확 검색
+CORPUS_COMPACT_RATIO = float(os.getenv("CORPUS_COMPACT_RATIO", "0.3"))       # 툼스톤 비율이 넘으면 재구성
+CORPUS_SNAPSHOT_EVERY = int(os.getenv("CORPUS_SNAPSHOT_EVERY", "32"))         # 저널 기록이 이만큼 쌓이면 스냅샷
+CORPUS_STORAGE = os.getenv("CORPUS_STORAGE", "sq8")                          # sq8 | flat
+CORPUS_DIM = int(os.getenv("CORPUS_DIM", str(EMBED_SEARCH_DIM)))             # 0이면 임베딩 전체 차원
+CORPUS_MAX_BYTES = int(os.getenv("CORPUS_MAX_BYTES", str(1024 ** 3)))        # 상주 샤드 예산 (기본 1GB)
+
+_SNAPSHOT_FILE = "snapshot.pkl"
+
+_CHUNK_BITS = 20  # 문서당 최대 약 100만 청크
+
+
+def chunk_uid(document_id: int, chunk_no: int) -> int:
+    return (int(document_id) << _CHUNK_BITS) | int(chunk_no)
+
+
+def _fit(x: np.ndarray, dim: int) -> np.ndarray:
+    """샤드 차원으로 자르고 L2 정규화 (내적 = 코사인)"""
+    return truncate_normalize(np.asarray(x, dtype=np.float32), dim)
+
+
+def _new_index(dim: int) -> Any:
+    if CORPUS_STORAGE == "sq8":
+        hnsw = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, CORPUS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        # 차원별 범위는 첫 추가(또는 재구성) 때의 벡터로 학습 → 이후 문서가 범위를 조금 넘어도 잘리지 않게 여유
+        faiss.downcast_index(hnsw.storage).sq.rangestat_arg = 0.2
+    else:
+        hnsw = faiss.IndexHNSWFlat(dim, CORPUS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    return faiss.IndexIDMap2(hnsw)
+
+
+def _shard_key(domain: Optional[str]) -> str:
+    name = (domain or "").strip() or "미분류"
+    return hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+
+
+class _Shard:
+    def __init__(self, key: str, domain: str, dim: int):
+        self.key = key
+        self.domain = domain
+        self.dim = dim
+        self.index = _new_index(dim)
+        self.meta: Dict[int, Dict[str, Any]] = {}         # uid → {document_id, text, metadata}
+        self.doc_ids: Dict[int, List[int]] = {}           # document_id → [uid, ...]
+        self.tombstones = 0
+        self.seq = 0                                       # 마지막으로 적용한 변경 번호
+        self.pending = 0                                   # 마지막 스냅샷 이후 저널 기록 수
+        self.text_bytes = 0                                # 청크 텍스트(UTF-8) 합
+        self.closed = False                                # 메모리에서 내린 샤드 (이후 변경은 다시 로드한 샤드로)
+        self.lock = threading.RLock()
+        self._save_lock = threading.Lock()                 # 스냅샷 쓰기 직렬화
+        self._journal = None
+
+    # ---- 저장/로드 ----
+    def _dir(self) -> str:
+        return os.path.join(CORPUS_DIR, self.key)
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        """[(구간 시작 seq, 경로)] 오름차순"""
+        out = []
+        for path in glob.glob(os.path.join(self._dir(), "journal-*.log")):
+            try:
+                out.append((int(os.path.basename(path)[8:-4]), path))
+            except ValueError:
+                continue
+        return sorted(out)
+
+    def append(self, record: bytes) -> None:
+        """변경 1건을 현재 저널 구간에 덧붙임 (self.lock 안에서 호출)"""
+        self.seq += 1
+        if self._journal is None:
+            os.makedirs(self._dir(), exist_ok=True)
+            self._journal = open(os.path.join(self._dir(), f"journal-{self.seq:012d}.log"), "ab")
+        pickle.dump((self.seq, record), self._journal, protocol=pickle.HIGHEST_PROTOCOL)
+        self._journal.flush()
+        self.pending += 1
+
+    def snapshot(self) -> None:
+        """
+        현재 상태를 snapshot.pkl로 저장하고 반영된 저널 구간 삭제.
+        잠금 안에서는 직렬화/복사만 하고 파일 쓰기는 잠금 밖 → 쓰는 동안에도 검색 가능
+        """
+        with self._save_lock:
+            with self.lock:
+                data = {
+                    "domain": self.domain, "dim": self.dim, "seq": self.seq,
+                    "meta": dict(self.meta), "doc_ids": dict(self.doc_ids), "tombstones": self.tombstones,
+                    "index": faiss.serialize_index(self.index),
+                }
+                # 이후 변경은 새 저널 구간에 기록
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                self.pending = 0
+            os.makedirs(self._dir(), exist_ok=True)
+            target = os.path.join(self._dir(), _SNAPSHOT_FILE)
+            with open(f"{target}.tmp", "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{target}.tmp", target)
+            for start, path in self._segments():
+                if start <= data["seq"]:
+                    os.remove(path)
+
+    @classmethod
+    def load(cls, key: str) -> "_Shard":
+        path = os.path.join(CORPUS_DIR, key)
+        snapshot = os.path.join(path, _SNAPSHOT_FILE)
+        legacy = not os.path.exists(snapshot)
+        if legacy:
+            # 이전 형식 (index.faiss + meta.pkl 전체 재작성) → 읽은 뒤 스냅샷으로 변환
+            with open(os.path.join(path, "meta.pkl"), "rb") as f:
+                data = pickle.load(f)
+            index = faiss.read_index(os.path.join(path, "index.faiss"))
+        else:
+            with open(snapshot, "rb") as f:
+                data = pickle.load(f)
+            index = faiss.deserialize_index(data["index"])
+
+        shard = cls(key, data["domain"], data["dim"])
+        shard.index = index
+        shard.meta = data["meta"]
+        shard.doc_ids = data["doc_ids"]
+        shard.tombstones = data["tombstones"]
+        shard.seq = data.get("seq", 0)
+        shard.text_bytes = sum(len(m["text"].encode("utf-8")) for m in shard.meta.values())
+
+        # 스냅샷 이후 저널 재생 (마지막 기록이 쓰다 만 상태면 거기서 중단)
+        for _, seg in shard._segments():
+            with open(seg, "rb") as f:
+                while True:
+                    try:
+                        seq, record = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError):
+                        break
+                    if seq <= shard.seq:
+                        continue
+                    op, payload = pickle.loads(record)
+                    shard.apply(op, payload)
+                    shard.seq = seq
+                    shard.pending += 1
+
+        if legacy:
+            shard.snapshot()
+            for name in ("index.faiss", "meta.pkl"):
+                try:
+                    os.remove(os.path.join(path, name))
+                except FileNotFoundError:
+                    pass
+        return shard
+
+    def close(self) -> None:
+        """메모리에서 내리기 전: 저널에만 있는 변경을 스냅샷으로 남기고 이후 변경을 받지 않음"""
+        while True:
+            if self.pending:
+                self.snapshot()
+            with self.lock:
+                if self.pending == 0:
+                    self.closed = True
+                    if self._journal is not None:
+                        self._journal.close()
+                        self._journal = None
+                    return
+
+    def nbytes(self) -> int:
+        """상주 크기: 양자화 코드/학습 범위 + HNSW 링크 + ID 맵 + 청크 텍스트"""
+        hnsw = faiss.downcast_index(self.index.index)
+        return (
+            index_nbytes(hnsw.storage)
+            + int(hnsw.hnsw.neighbors.size()) * 4
+            + int(self.index.ntotal) * 16
+            + self.text_bytes
+        )
+
+    # ---- 변경 (self.lock 안에서 호출) ----
+    def apply(self, op: str, payload: tuple) -> bool:
+        """저널 기록 1건 적용 (라이브/재생 공용). 재구성이 일어났으면 True"""
+        if op == "add":
+            document_id, vectors, texts, metadatas = payload
+            # 재등록: 이전 벡터를 그래프에서 빼기 위해 재구성 (uid가 같아 툼스톤으로는 구분 불가)
+            compacted = self.remove(document_id, rebuild=True) if document_id in self.doc_ids else False
+            self.add(document_id, vectors, texts, metadatas)
+            return compacted
+        if op == "remove":
+            return self.remove(payload[0])
+        raise ValueError(f"unknown corpus journal op: {op}")
+
+    def add(self, document_id: int, vectors: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        uids = [chunk_uid(document_id, i) for i in range(len(texts))]
+        vectors = _fit(vectors, self.dim)
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add_with_ids(vectors, np.asarray(uids, dtype=np.int64))
+        for uid, text, md in zip(uids, texts, metadatas):
+            self.meta[uid] = {"document_id": document_id, "text": text, "metadata": md}
+            self.text_bytes += len(text.encode("utf-8"))
+        self.doc_ids[document_id] = uids
+
+    def remove(self, document_id: int, rebuild: bool = False) -> bool:
+        """
+        HNSW는 벡터 삭제를 지원하지 않음 → 메타만 지우고 검색 결과에서 제외,
+        툼스톤 비율이 넘거나 rebuild=True면 살아 있는 벡터로 재구성. 재구성했으면 True
+        """
+        removed = 0
+        for uid in self.doc_ids.pop(document_id, []):
+            m = self.meta.pop(uid, None)
+            if m is not None:
+                self.tombstones += 1
+                self.text_bytes -= len(m["text"].encode("utf-8"))
+                removed += 1
+        if self.index.ntotal and ((rebuild and removed) or self.tombstones / self.index.ntotal > CORPUS_COMPACT_RATIO):
+            self._compact()
+            return True
+        return False
+
+    def _compact(self) -> None:
+        # 저장된 코드에서 복원한 벡터로 재구성 (sq8이면 범위도 살아 있는 벡터로 다시 학습)
+        live = sorted(self.meta.keys())
+        old, self.index = self.index, _new_index(self.dim)
+        if live:
+            vectors = _fit(np.vstack([old.reconstruct(uid) for uid in live]), self.dim)
+            self.index.train(vectors)
+            self.index.add_with_ids(vectors, np.asarray(live, dtype=np.int64))
+        self.tombstones = 0
+
+    # ---- 검색 (self.lock 안에서 호출) ----
+    def search(self, qvec: np.ndarray, k: int, document_ids: Optional[Iterable[int]] = None):
+        """[(score, uid), ...] (내적 = 코사인 유사도, 높을수록 관련)"""
+        if self.index.ntotal == 0:
+            return []
+
+        if document_ids is not None:
+            uids = [u for d in document_ids for u in self.doc_ids.get(d, [])]
+            if not uids:
+                return []
+            if len(uids) <= CORPUS_EXACT_FILTER_MAX:
+                # 필터 결과가 작으면 정확 비교가 HNSW+selector보다 빠르고 recall도 100%
+                mat = np.vstack([self.index.reconstruct(u) for u in uids])
+                scores = mat @ qvec[0]
+                top = np.argsort(-scores)[:k]
+                return [(float(scores[i]), uids[i]) for i in top]
+            sel = faiss.IDSelectorBatch(np.asarray(uids, dtype=np.int64))
+            params = faiss.SearchParametersHNSW(sel=sel, efSearch=max(CORPUS_EF_SEARCH, k))
+            scores, ids = self.index.search(qvec, k, params=params)
+        else:
+            # 툼스톤을 감안해 조금 더 가져온 뒤 걸러냄
+            fetch = k + min(self.tombstones, k * 4)
+            params = faiss.SearchParametersHNSW(efSearch=max(CORPUS_EF_SEARCH, fetch))
+            scores, ids = self.index.search(qvec, fetch, params=params)
+
+        # 재등록 시 재구성하기 전 버전의 스냅샷에는 같은 uid의 이전 벡터가 남아 있을 수 있음 → uid 기준 중복 제거
+        out, seen = [], set()
+        for s, u in zip(scores[0], ids[0]):
+            u = int(u)
+            if u >= 0 and u in self.meta and u not in seen:
+                seen.add(u)
+                out.append((float(s), u))
+        return out[:k]
+
+
+class CorpusIndex:
+    def __init__(self, max_bytes: int = CORPUS_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._shards: "OrderedDict[str, _Shard]" = OrderedDict()  # 상주 샤드 (LRU 순서)
+        self._doc_shard: Dict[int, str] = {}
+        self._lock = threading.RLock()   # 샤드 목록/문서→샤드 매핑 + 샤드 로드/내림 (샤드 검색·쓰기는 샤드 잠금)
+        self._loaded = False
+        self.unloads = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _on_disk(key: str) -> bool:
+        path = os.path.join(CORPUS_DIR, key)
+        return os.path.exists(os.path.join(path, _SNAPSHOT_FILE)) or os.path.exists(os.path.join(path, "meta.pkl"))
+
+    def _ensure_loaded(self) -> None:
+        """기동 후 처음 한 번: 모든 샤드를 읽어 문서 → 샤드 매핑을 만들고 예산까지 내림"""
+        if self._loaded:
+            return
+        if os.path.isdir(CORPUS_DIR):
+            for key in os.listdir(CORPUS_DIR):
+                if not self._on_disk(key):
+                    continue
+                shard = _Shard.load(key)
+                self._shards[key] = shard
+                for doc_id in shard.doc_ids:
+                    self._doc_shard[doc_id] = key
+                self._enforce_budget_locked()
+        self._loaded = True
+
+    def _shard_locked(self, key: str) -> Optional[_Shard]:
+        """상주 샤드 (내려갔으면 디스크에서 다시 로드), 최근 사용으로 표시"""
+        shard = self._shards.get(key)
+        if shard is None:
+            if not self._on_disk(key):
+                return None
+            shard = self._shards[key] = _Shard.load(key)
+            self.reloads += 1
+        self._shards.move_to_end(key)
+        return shard
+
+    def _enforce_budget_locked(self) -> None:
+        # 가장 오래 안 쓴 샤드부터 내림 (방금 쓴 샤드 하나는 남김)
+        while len(self._shards) > 1 and sum(s.nbytes() for s in self._shards.values()) > self.max_bytes:
+            _, shard = self._shards.popitem(last=False)
+            shard.close()
+            self.unloads += 1
+
+    def _write(self, key: str, op: str, payload: tuple) -> None:
+        """샤드에 변경 적용 + 저널 기록, 필요하면 스냅샷 (직렬화는 샤드 잠금 밖에서)"""
+        record = pickle.dumps((op, payload), protocol=pickle.HIGHEST_PROTOCOL)
+        while True:
+            with self._lock:
+                shard = self._shard_locked(key)
+            if shard is None:
+                return
+            with shard.lock:
+                if shard.closed:
+                    continue  # 그 사이 메모리에서 내려감 → 다시 로드한 샤드에 기록
+                compacted = shard.apply(op, payload)
+                shard.append(record)
+                due = compacted or shard.pending >= CORPUS_SNAPSHOT_EVERY
+            break
+        if due:
+            shard.snapshot()
+        with self._lock:
+            self._enforce_budget_locked()
+
+    def has_document(self, document_id: int) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            return document_id in self._doc_shard
+
+    def add_document(self, document_id: int, domain: Optional[str], vectorstore: Any) -> None:
+        """문서별 FAISS 벡터스토어의 벡터/청크를 공용 인덱스에 추가 (재추가 시 교체)"""
+        index = vectorstore.index
+        if index.ntotal == 0:
+            return
+        # 압축/축소 차원 저장 모드면 근사 복원 대신 정확 벡터 사용
+        exact = getattr(vectorstore, "exact_vectors", None)
+        vectors = np.asarray(exact, dtype=np.float32) if exact is not None else index.reconstruct_n(0, index.ntotal)
+        docs = [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]) for i in range(index.ntotal)]
+        texts = [d.page_content for d in docs]
+        metadatas = [dict(d.metadata) for d in docs]
+
+        key = _shard_key(domain)
+        with self._lock:
+            self._ensure_loaded()
+            old_key = self._doc_shard.get(document_id)
+            shard = self._shard_locked(key)
+            if shard is None:
+                dim = CORPUS_DIM if 0 < CORPUS_DIM < vectors.shape[1] else vectors.shape[1]
+                shard = self._shards[key] = _Shard(key, (domain or "").strip() or "미분류", dim)
+                shard.snapshot()  # 빈 샤드도 스냅샷을 남겨 도메인/차원을 기록 (내려가도 다시 로드 가능)
+            self._doc_shard[document_id] = key
+            dim = shard.dim
+
+        if old_key and old_key != key:
+            self._write(old_key, "remove", (document_id,))
+        # 저널에도 샤드 차원으로 자른 벡터만 기록
+        self._write(key, "add", (document_id, _fit(vectors, dim), texts, metadatas))
+
+    def remove_document(self, document_id: int) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            key = self._doc_shard.pop(document_id, None)
+        if key:
+            self._write(key, "remove", (document_id,))
+
+    def backfill(self, documents: Iterable[Tuple[int, Optional[str]]]) -> int:
+        """
+        코퍼스에 없는 문서를 디스크 인덱스(faiss_index/<id>)에서 등록 (임베딩 호출 없음).
+        documents: [(document_id, domain)] → 등록한 문서 수
+        qa 경로는 디스크 인덱스를 먼저 로드하므로, 코퍼스 도입 전 문서는 여기서만 등록됨
+        """
+        added = 0
+        for document_id, domain in documents:
+            if self.has_document(document_id) or not has_index(document_id):
+                continue
+            vectorstore = load_index(document_id, None)
+            if vectorstore is None:
+                continue
+            self.add_document(document_id, domain, vectorstore)
+            added += 1
+        return added
+
+    def search(
+        self,
+        query_vector: List[float],
+        k: int = 8,
+        document_ids: Optional[List[int]] = None,
+        domain: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        공용 인덱스 검색 → [{"score", "document_id", "text", "metadata"}, ...] (점수 내림차순)
+        - domain: 해당 도메인 샤드만 검색
+        - document_ids: 해당 문서의 청크로만 제한
+        """
+        query = np.asarray([query_vector], dtype=np.float32)
+        with self._lock:
+            self._ensure_loaded()
+            if document_ids:
+                keys = {self._doc_shard[d] for d in document_ids if d in self._doc_shard}
+                if domain:
+                    keys &= {_shard_key(domain)}
+            elif domain:
+                keys = {_shard_key(domain)}
+            else:
+                keys = set(self._doc_shard.values())
+
+        hits = []
+        for key in sorted(keys):
+            # 샤드 하나씩 로드/검색 → 예산을 넘는 코퍼스 전체 검색도 상주 크기는 예산 + 샤드 1개
+            with self._lock:
+                shard = self._shard_locked(key)
+                self._enforce_budget_locked()
+            if shard is None:
+                continue
+            with shard.lock:
+                for score, uid in shard.search(_fit(query, shard.dim), k, document_ids):
+                    m = shard.meta[uid]
+                    hits.append({
+                        "score": score,
+                        "document_id": m["document_id"],
+                        "domain": shard.domain,
+                        "text": m["text"],
+                        "metadata": m["metadata"],
+                    })
+        hits.sort(key=lambda h: h["score"], reverse=True)
+        return hits[:k]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_loaded()
+            shards = list(self._shards.values())
+            return {
+                "shards": len(set(self._doc_shard.values())),
+                "resident_shards": len(shards),
+                "documents": len(self._doc_shard),
+                "resident_chunks": sum(len(s.meta) for s in shards),
+                "resident_bytes": sum(s.nbytes() for s in shards),
+                "max_bytes": self.max_bytes,
+                "storage": CORPUS_STORAGE,
+                "dim": CORPUS_DIM,
+                "unloads": self.unloads,
+                "reloads": self.reloads,
+                "journal_pending": sum(s.pending for s in shards),
+            }
+
+
+corpus_index = CorpusIndex()
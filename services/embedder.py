@@ -7,14 +7,41 @@ from langchain_text_splitters import (
     RecursiveCharacterTextSplitter,
     MarkdownHeaderTextSplitter,
 )
+from langchain_core.embeddings import Embeddings
 from typing import TypedDict, List, Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import os
+import random
+import threading
+import time
+import openai
 from dotenv import load_dotenv
 
+from services.embedding_cache import CachedEmbeddings
+from services.token_utils import count_tokens
+from services.vector_store import build_vectorstore
+from services.hybrid_retriever import HybridRetriever, RETRIEVAL_MODE
+from services.file_reader import iter_pages
+
 load_dotenv()
 
 from langsmith import traceable
 
+# 임베딩 배치/동시성 설정
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "16000"))    # 요청 1건당 토큰 예산
+EMBED_BATCH_MAX_INPUTS = int(os.getenv("EMBED_BATCH_MAX_INPUTS", "256"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))          # 동시에 날리는 배치 수 상한
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+# 스트리밍 수집: 페이지 단위로 파싱→청크→임베딩 (state["streaming"]으로 요청별 지정도 가능)
+INGEST_STREAMING = os.getenv("INGEST_STREAMING", "0") == "1"
+
+# 청크 길이/겹침 (스트리밍 모드는 페이지 경계에서도 같은 겹침을 이어 붙임)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 120
+
 
 
 class EmbedState(TypedDict, total=False):
@@ -23,25 +50,182 @@ class EmbedState(TypedDict, total=False):
     total=False: 모든 키는 optional (동적 파이프라인 호환)
     """
     # 입력
-    raw_text: str                      # 업로드/파싱된 전체 텍스트
+    raw_text: str                      # 업로드/파싱된 전체 텍스트 (스트리밍 모드에선 앞부분만)
     meta: Dict[str, Any]               # 문서 메타 (예: {"title": "...", "source": "filename.pdf"})
+    file: str                          # 스트리밍 모드에서 페이지를 직접 읽을 PDF 경로
+    streaming: bool                    # True면 file을 페이지 단위로 읽으며 청크/임베딩
 
     # 출력
     raw_texts: List[str]               # 요약 모델이 사용할 청크 텍스트 목록
     chunks: List[str]                  # (과거 호환) 단순 문자열 청크
+    chunk_metadatas: List[Dict[str, Any]]  # raw_texts와 같은 순서의 청크 메타 (section 등)
     vectorstore: FAISS                 # 임베딩된 벡터스토어
     retriever: Any                     # 검색기 (as_retriever)
     # 옵션
     top_k: int                         # QA 검색 문서 수 (기본값 내부에서 설정)
 
+def _pack_batches(texts: List[str]) -> List[List[int]]:
+    """토큰 예산/입력 개수 상한에 맞춰 텍스트 인덱스를 배치로 묶음 (입력 순서 유지)"""
+    batches: List[List[int]] = []
+    cur: List[int] = []
+    cur_tokens = 0
+    for i, text in enumerate(texts):
+        n = count_tokens(text)
+        if cur and (cur_tokens + n > EMBED_BATCH_TOKENS or len(cur) >= EMBED_BATCH_MAX_INPUTS):
+            batches.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append(i)
+        cur_tokens += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+class _AdaptiveLimiter:
+    """
+    동시 요청 수 제한 (AIMD)
+    - 429 발생 시 허용 동시성을 절반으로 줄이고, 성공할 때마다 1씩 회복
+    """
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.active = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+
+    def release(self, throttled: bool) -> None:
+        with self._cond:
+            self.active -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+            elif self.limit < self.max_limit:
+                self.limit += 1
+            self._cond.notify_all()
+
+
+def _retry_delay(err: Exception, attempt: int) -> float:
+    """Retry-After 헤더가 있으면 따르고, 없으면 지수 백오프 + 지터"""
+    response = getattr(err, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after:
+            return float(retry_after)
+    except ValueError:
+        pass
+    return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    임베딩 단계: 청크를 토큰 예산 배치로 묶고, 제한된 스레드풀에서 동시에 요청.
+    - 429(RateLimitError) 시 동시성을 줄이고 백오프 후 재시도
+    - 벽시계 시간은 청크 수가 아니라 (배치 수 / 동시성)에 비례
+    """
+
+    def __init__(self, inner: Embeddings, concurrency: int = EMBED_CONCURRENCY):
+        self.inner = inner
+        self.concurrency = max(1, concurrency)
+        self._limiter = _AdaptiveLimiter(self.concurrency)
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            throttled = False
+            self._limiter.acquire()
+            try:
+                return self.inner.embed_documents(batch)
+            except openai.RateLimitError as e:
+                throttled = True
+                err = e
+            except (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError) as e:
+                err = e
+            finally:
+                self._limiter.release(throttled)
+            if attempt == EMBED_MAX_RETRIES:
+                raise err
+            time.sleep(_retry_delay(err, attempt))
+        return []  # 도달하지 않음
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = _pack_batches(texts)
+        if len(batches) == 1:
+            return self._embed_batch(texts)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(lambda idx: self._embed_batch([texts[i] for i in idx]), batches))
+
+        # 배치 결과를 원래 순서대로 복원
+        vectors: List[List[float]] = [[] for _ in texts]
+        for idx, vecs in zip(batches, results):
+            for i, v in zip(idx, vecs):
+                vectors[i] = v
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        # 클라이언트 재시도(max_retries=0)가 꺼져 있으므로 질문 임베딩도 같은 재시도/백오프 경로로
+        return self._embed_batch([text])[0]
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model() -> CachedEmbeddings:
+    """
+    임베딩 모델을 프로세스당 1회만 생성해서 재사용.
+    - 객체 생성 자체는 API 호출이 없으므로, 디스크 인덱스 로드 시에도 안전하게 사용 가능
+      (실제 임베딩 호출은 검색 시점의 질문 임베딩에서만 발생)
+    - CachedEmbeddings로 감싸 동일 청크(텍스트+배포명)는 로컬 캐시에서 재사용
+    - 캐시 미스분은 BatchedEmbeddings가 토큰 예산 배치로 나눠 동시에 요청
+    """
+    deployment = os.getenv("AOAI_DEPLOY_EMBED_3_LARGE")
+    # ☆ 중요: Azure에선 azure_deployment 파라미터 사용
+    # max_retries=0: 429 재시도는 BatchedEmbeddings가 동시성 조절과 함께 직접 처리
+    #   (embed_documents / embed_query 모두 _embed_batch 경유 → 질문 임베딩도 재시도)
+    inner = AzureOpenAIEmbeddings(
+        azure_deployment=deployment,
+        openai_api_version="2024-02-01",
+        api_key=os.getenv("AOAI_API_KEY"),
+        azure_endpoint=os.getenv("AOAI_ENDPOINT"),
+        max_retries=0,
+    )
+    return CachedEmbeddings(BatchedEmbeddings(inner), namespace=deployment or "default")
+
+
+def build_retriever(vectorstore: FAISS, top_k: int = 5):
+    """
+    벡터스토어 → retriever 구성 (embedder 노드 / 디스크 인덱스 복구 경로 공용)
+    기본값: MMR(다양성) + 상위 5개
+    fetch_k는 후보군, k는 최종 반환 개수
+    BM25 역색인이 있으면 BM25 + MMR을 RRF로 합치는 하이브리드 retriever (RETRIEVAL_MODE)
+    """
+    if getattr(vectorstore, "lexical", None) is not None and RETRIEVAL_MODE != "dense":
+        return HybridRetriever(vectorstore=vectorstore, k=top_k, fetch_k=max(20, top_k * 6), lambda_mult=0.5)
+    return vectorstore.as_retriever(
+        search_type="mmr",          # "similarity" 보다 논문 QA에 안정적
+        search_kwargs={
+            "k": top_k,
+            "fetch_k": max(20, top_k * 6),   # 후보군은 넉넉히
+            "lambda_mult": 0.5,              # 다양성(0~1), 0.5 정도 중립
+        },
+    )
+
+
 @traceable  # ★ 이 1줄만 추가
 
-def _build_chunks(raw_text: str, meta: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+def _build_chunks(
+    raw_text: str, meta: Dict[str, Any] | None = None, section: str | None = None
+) -> List[Dict[str, Any]]:
     """
     텍스트를 섹션-친화적으로 청크화하여,
     [ {"text": str, "metadata": {...}}, ... ] 형태로 반환.
     - 1차: MarkdownHeaderTextSplitter로 섹션 경계 보존
     - 2차: RecursiveCharacterTextSplitter로 길이 맞춤
+    - section: 헤더 없이 시작하는 앞부분에 붙일 섹션명 (스트리밍 모드에서 이전 페이지의 섹션을 이어받음)
     """
     meta = meta or {}
     # 1) 섹션 인식: 논문이 꼭 마크다운은 아니어도, 헤더 패턴(#, ##) 혹은 우리가 나중에 전처리해줄 수도 있음
@@ -51,15 +235,18 @@ def _build_chunks(raw_text: str, meta: Dict[str, Any] | None = None) -> List[Dic
     )
     try:
         header_docs = header_splitter.split_text(raw_text)
-        base_sections = [{"text": d.page_content, "metadata": {"section": d.metadata.get("header", "")}} for d in header_docs]
+        base_sections = [
+            {"text": d.page_content, "metadata": {"section": d.metadata.get("section") or d.metadata.get("subsection") or section or ""}}
+            for d in header_docs
+        ]
     except Exception:
         # 헤더가 없거나 실패하면 전체를 하나의 섹션으로 취급
-        base_sections = [{"text": raw_text, "metadata": {"section": "whole_document"}}]
+        base_sections = [{"text": raw_text, "metadata": {"section": section or "whole_document"}}]
 
     # 2) 길이 맞춤: 한글 기준 900~1200자 권장(= 대략 350~500 토큰)
     body_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,      # ← 기존 500보다 늘려 맥락 보존
-        chunk_overlap=120,    # ← 문장 경계 부드럽게
+        chunk_size=CHUNK_SIZE,        # ← 기존 500보다 늘려 맥락 보존
+        chunk_overlap=CHUNK_OVERLAP,  # ← 문장 경계 부드럽게
         separators=["\n\n", "\n", " ", ""],  # 문단→문장→공백→문자 단위
     )
 
@@ -76,54 +263,117 @@ def _build_chunks(raw_text: str, meta: Dict[str, Any] | None = None) -> List[Dic
             results.append({"text": piece, "metadata": md})
     return results
 
+
+def _page_tail(text: str) -> str:
+    """다음 페이지 앞에 붙일 겹침 꼬리: 마지막 CHUNK_OVERLAP자, 잘린 첫 단어는 버림"""
+    tail = text[-CHUNK_OVERLAP:]
+    if len(text) > CHUNK_OVERLAP:
+        cut = tail.find(" ")
+        tail = tail[cut + 1:] if cut >= 0 else tail
+    return tail.strip()
+
+
+def _embed_streaming(file_path: str, meta: Dict[str, Any], embedding_model: Embeddings):
+    """
+    페이지를 하나씩 파싱 → 청크화 → 토큰 예산이 찬 배치부터 바로 임베딩 요청.
+    - 뒤쪽 페이지를 파싱하는 동안 앞쪽 배치 임베딩이 진행 (파싱/인덱싱 시간 중첩)
+    - 진행 중 배치는 EMBED_CONCURRENCY개로 제한 → 파싱이 임베딩보다 빨라도 메모리가 쌓이지 않음
+    - 전체 raw_text 문자열은 만들지 않음
+    - 페이지 경계: 이전 페이지 꼬리(CHUNK_OVERLAP자)를 다음 페이지 앞에 붙이고 마지막 섹션명을 이어받음
+      → 한 번에 청크화할 때와 같은 겹침/섹션 연속성 유지
+    반환: (texts, metadatas, vectors)
+    """
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    vectors: List[List[float]] = []
+    pending: List[str] = []
+    pending_tokens = 0
+
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as pool:
+        inflight = deque()
+
+        def submit() -> None:
+            nonlocal pending, pending_tokens
+            inflight.append(pool.submit(embedding_model.embed_documents, pending))
+            pending, pending_tokens = [], 0
+            # 백프레셔: 가장 오래된 배치부터 결과 회수 (순서 유지)
+            while len(inflight) > EMBED_CONCURRENCY:
+                vectors.extend(inflight.popleft().result())
+
+        tail, section = "", None
+        for page in iter_pages(file_path):
+            page_no = page.metadata.get("page")
+            text = page.page_content
+            if not text.strip():
+                continue
+            chunks = _build_chunks(f"{tail}\n{text}" if tail else text, meta=meta, section=section)
+            tail = _page_tail(text)
+            if chunks:
+                section = chunks[-1]["metadata"]["section"]
+            for c in chunks:
+                md = c["metadata"]
+                md["page"] = page_no
+                md["chunk_id"] = f"p{page_no}-{md['chunk_id']}"
+                texts.append(c["text"])
+                metadatas.append(md)
+                pending.append(c["text"])
+                pending_tokens += count_tokens(c["text"])
+                if pending_tokens >= EMBED_BATCH_TOKENS or len(pending) >= EMBED_BATCH_MAX_INPUTS:
+                    submit()
+
+        if pending:
+            submit()
+        while inflight:
+            vectors.extend(inflight.popleft().result())
+
+    return texts, metadatas, vectors
+
+
 @traceable  # ★ 이 1줄만 추가
 def embedder(state: EmbedState) -> EmbedState:
     """
     1) 텍스트를 섹션-보존 방식으로 청크화
-    2) Azure OpenAI 임베딩으로 FAISS 벡터스토어 구성
+    2) Azure OpenAI 임베딩으로 FAISS 벡터스토어 구성 (캐시에 없는 청크만 임베딩 요청)
     3) retriever 생성 (MMR/TopK 설정)
     4) 요약용 raw_texts도 함께 반환
+    스트리밍 모드(state["streaming"] 또는 INGEST_STREAMING)에선 1)~2)를 페이지 단위로 겹쳐 실행
     """
-    # ---- 입력 파싱 ----
-    raw_text = (state.get("raw_text") or "").strip()
-    if not raw_text:
-        return {**state, "retriever": None, "vectorstore": None, "chunks": [], "raw_texts": []}
-
+    empty = {**state, "retriever": None, "vectorstore": None, "chunks": [], "raw_texts": [], "chunk_metadatas": []}
     meta: Dict[str, Any] = state.get("meta", {}) or {}
 
-    # ---- 1) 청크 생성 (섹션 보존 + 길이 맞춤) ----
-    chunk_dicts = _build_chunks(raw_text, meta=meta)  # [{"text":..., "metadata":...}, ...]
-    # 요약 모델이 바로 쓸 수 있도록 문자열 리스트도 준비
-    raw_texts: List[str] = [c["text"] for c in chunk_dicts]
+    # ---- 임베딩 모델 준비 ----
+    embedding_model = get_embedding_model()
 
-    # ---- 2) 임베딩 모델 준비 ----
-    # ☆ 중요: Azure에선 azure_deployment 파라미터 사용
-    embedding_model = AzureOpenAIEmbeddings(
-        azure_deployment=os.getenv("AOAI_DEPLOY_EMBED_3_LARGE"),
-        openai_api_version="2024-02-01",
-        api_key=os.getenv("AOAI_API_KEY"),
-        azure_endpoint=os.getenv("AOAI_ENDPOINT"),
-    )
+    streaming = state.get("streaming", INGEST_STREAMING) and state.get("file")
+    if streaming:
+        # ---- 1)+2) 페이지 스트리밍: 파싱/청크/임베딩을 겹쳐서 실행 ----
+        texts, metadatas, vectors = _embed_streaming(state["file"], meta, embedding_model)
+        if not texts:
+            return empty
+    else:
+        # ---- 입력 파싱 ----
+        raw_text = (state.get("raw_text") or "").strip()
+        if not raw_text:
+            return empty
 
-    # ---- 3) 벡터스토어 구축 (메타데이터 포함) ----
-    texts = [c["text"] for c in chunk_dicts]
-    metadatas = [c["metadata"] for c in chunk_dicts]
+        # ---- 1) 청크 생성 (섹션 보존 + 길이 맞춤) ----
+        chunk_dicts = _build_chunks(raw_text, meta=meta)  # [{"text":..., "metadata":...}, ...]
+        texts = [c["text"] for c in chunk_dicts]
+        metadatas = [c["metadata"] for c in chunk_dicts]
 
-    # faiss-cpu가 없을 때를 대비한 안내를 두고 싶다면 try/except로 감싸도 좋음
-    vectorstore = FAISS.from_texts(texts=texts, embedding=embedding_model, metadatas=metadatas)
+        # ---- 2) 임베딩 ----
+        vectors = embedding_model.embed_documents(texts)
+
+    # 요약 모델이 바로 쓸 수 있도록 문자열 리스트도 준비
+    raw_texts: List[str] = texts
+
+    # ---- 3) 벡터스토어 구축 (메타데이터 포함) ----
+    # 저장 모드(VECTOR_STORAGE: flat/fp16/sq8/pq)에 맞춰 인덱스 구성
+    vectorstore = build_vectorstore(texts, vectors, metadatas, embedding_model)
 
     # ---- 4) 리트리버 구성 ----
-    # 기본값: MMR(다양성) + 상위 5개
-    # fetch_k는 후보군, k는 최종 반환 개수
     top_k = state.get("top_k", 5)
-    retriever = vectorstore.as_retriever(
-        search_type="mmr",          # "similarity" 보다 논문 QA에 안정적
-        search_kwargs={
-            "k": top_k,
-            "fetch_k": max(20, top_k * 6),   # 후보군은 넉넉히
-            "lambda_mult": 0.5,              # 다양성(0~1), 0.5 정도 중립
-        },
-    )
+    retriever = build_retriever(vectorstore, top_k)
 
     # ---- 5) 반환 ----
     # - 기존 호환을 위해 "chunks"는 문자열 리스트로 유지
@@ -132,6 +382,7 @@ def embedder(state: EmbedState) -> EmbedState:
         **state,
         "raw_texts": raw_texts,     # 새 summarizer는 이걸 우선 사용
         "chunks": raw_texts,        # 기존 호환(동일 내용)
+        "chunk_metadatas": metadatas,  # 섹션별 map-reduce 요약에서 사용
         "vectorstore": vectorstore,
         "retriever": retriever,
         "top_k": top_k,             # 상태에 보존(qa 노드에서 재사용)
@@ -0,0 +1,268 @@
+# services/embedding_cache.py
+# 청크 임베딩 로컬 캐시 (content-addressed)
+# - 키: sha256(임베딩 배포명 + 청크 텍스트) → 같은 텍스트는 문서/업로드가 달라도 재사용
+# - 값: float32 벡터를 BLOB으로 SQLite에 저장 (3072차원 = 12KB)
+# - CachedEmbeddings: 누락된 벡터만 실제 임베딩 모델로 요청
+# - QueryEmbeddingCache: 질문 임베딩 메모리 LRU (정규화 텍스트 키)
+#   + 짧은 시간 창(QUERY_EMBED_WINDOW_MS) 안에 들어온 질문들을 한 번의 배치 요청으로 합침
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "faiss_index/embedding_cache.sqlite3")
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "4096"))
+QUERY_EMBED_WINDOW_MS = float(os.getenv("QUERY_EMBED_WINDOW_MS", "10"))  # 동시 질문을 모으는 시간 창
+QUERY_EMBED_MAX_BATCH = int(os.getenv("QUERY_EMBED_MAX_BATCH", "64"))
+
+
+def _cache_key(namespace: str, text: str) -> str:
+    h = hashlib.sha256()
+    h.update(namespace.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite 기반 벡터 캐시. 스레드 간 공유 가능하도록 lock으로 직렬화."""
+
+    def __init__(self, path: str = EMBED_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vec BLOB)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        with self._lock:
+            # SQLite 변수 개수 제한(999)을 피하기 위해 나눠서 조회
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    list(part),
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        rows = []
+        for key, vec in items.items():
+            arr = np.asarray(vec, dtype=np.float32)
+            rows.append((key, int(arr.shape[0]), arr.tobytes()))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vec) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": entries,
+        }
+
+
+def normalize_query(text: str) -> str:
+    # 공백 차이만 있는 질문은 같은 키 (임베딩도 정규화된 텍스트로 요청 → 키와 벡터가 일치)
+    return " ".join((text or "").split())
+
+
+class QueryEmbeddingCache:
+    """
+    질문 임베딩 LRU + 동시 요청 합치기.
+    - 캐시 적중: 임베딩 호출 없음
+    - 같은 질문이 요청 중이면 그 결과를 기다림
+    - 새 질문: 시간 창 동안 모인 질문들을 inner.embed_documents 배치 1건으로 요청
+      (창을 연 첫 호출자가 리더로 배치를 보내고 나머지는 Future로 결과 수신)
+    """
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        max_entries: int = QUERY_EMBED_CACHE_SIZE,
+        window_ms: float = QUERY_EMBED_WINDOW_MS,
+        max_batch: int = QUERY_EMBED_MAX_BATCH,
+    ):
+        self.inner = inner
+        self.max_entries = max_entries
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._full = threading.Event()  # 배치 상한 도달 → 리더가 창을 기다리지 않고 바로 전송
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.batches = 0
+
+    def embed(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        leader = False
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return vec
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                fut = Future()
+                self._inflight[key] = fut
+                self._pending.append(key)
+                leader = len(self._pending) == 1
+                if leader:
+                    self._full.clear()
+                elif len(self._pending) >= self.max_batch:
+                    self._full.set()
+        if leader:
+            self._flush()
+        return fut.result()
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        여러 질문을 한 번에 (배치 QA용): LRU 적중분 제외, 나머지는 중복 제거 후 embed_documents 1건.
+        """
+        keys = [normalize_query(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vec
+            self.hits += sum(1 for k in keys if k in found)
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing:
+            vectors = self.inner.embed_documents(missing)
+            with self._lock:
+                self.misses += len(missing)
+                self.batches += 1
+                for key, vec in zip(missing, vectors):
+                    self._lru[key] = vec
+                    self._lru.move_to_end(key)
+                while len(self._lru) > self.max_entries:
+                    self._lru.popitem(last=False)
+            found.update(zip(missing, vectors))
+        return [found[k] for k in keys]
+
+    def _flush(self) -> None:
+        if self.window > 0:
+            self._full.wait(self.window)
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self.batches += 1
+        try:
+            vectors = self.inner.embed_documents(batch)
+        except BaseException as e:
+            with self._lock:
+                futs = [self._inflight.pop(k) for k in batch]
+            for fut in futs:
+                fut.set_exception(e)
+            return
+        with self._lock:
+            for key, vec in zip(batch, vectors):
+                self._lru[key] = vec
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+            futs = [self._inflight.pop(k) for k in batch]
+        for fut, vec in zip(futs, vectors):
+            fut.set_result(vec)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "batches": self.batches,
+                "hit_rate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+                "entries": len(self._lru),
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    임베딩 모델 래퍼: embed_documents는 캐시에 없는 텍스트만 inner 모델로 요청.
+    - namespace: 임베딩 배포명 (모델이 바뀌면 캐시도 분리)
+    - embed_query는 QueryEmbeddingCache 경유 (LRU 적중 / 동시 질문 배치 합치기)
+    """
+
+    def __init__(self, inner: Embeddings, namespace: str, cache: Optional[EmbeddingCache] = None):
+        self.inner = inner
+        self.namespace = namespace
+        self.cache = cache or get_embedding_cache()
+        self.queries = QueryEmbeddingCache(inner)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [_cache_key(self.namespace, t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        # 누락된 텍스트만 (중복 제거 후) 요청
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.inner.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.queries.embed(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.queries.embed_many(texts)
+
+
+_CACHE: Optional[EmbeddingCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = EmbeddingCache()
+        return _CACHE
+
+
+def embedding_cache_stats() -> Dict[str, float]:
+    """hit/miss 카운터 (프로세스 시작 이후 누적) + 저장된 벡터 수"""
+    return get_embedding_cache().stats()
@@ -1,7 +1,22 @@
 # services/file_reader.py
 from langchain_community.document_loaders import PyMuPDFLoader
-from typing import TypedDict, List, Dict, Any
+from langchain_core.documents import Document
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import TypedDict, List, Dict, Any, Iterator, Optional, Tuple
+import multiprocessing
 import os
+import threading
+
+# 대용량 PDF 병렬 추출: 페이지 수가 PDF_PARALLEL_MIN_PAGES 이상이면
+# 페이지 구간을 나눠 프로세스 풀에서 추출 (PyMuPDF 추출은 CPU 바운드 → GIL 회피)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# 구간 1개의 최대 페이지 수 + 동시에 진행하는 구간 수(워커 수) → 메모리에 올라오는 페이지 수 상한
+PDF_RANGE_MAX_PAGES = int(os.getenv("PDF_RANGE_MAX_PAGES", "16"))
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
 
 
 class DocState(TypedDict, total=False):
@@ -23,9 +38,8 @@ def file_reader(state: DocState) -> DocState:
     if not file_path or not os.path.exists(file_path):
         return {**state, "raw_text": "", "documents": [], "meta": {}}
 
-    # ---- PyMuPDF로 로드 ----
-    loader = PyMuPDFLoader(file_path)
-    documents = loader.load()  # List[Document] ← 각 문서에 .page_content, .metadata 있음
+    # ---- PyMuPDF로 로드 (대용량이면 페이지 구간 병렬 추출) ----
+    documents = list(_load_pages(file_path))  # List[Document] ← 각 문서에 .page_content, .metadata 있음
 
     # ---- 메타데이터 생성 ----
     file_name = os.path.basename(file_path)
@@ -50,3 +64,111 @@ def file_reader(state: DocState) -> DocState:
             "source": file_name,
         }
     }
+
+
+def file_meta(file_path: str) -> Dict[str, Any]:
+    file_name = os.path.basename(file_path)
+    return {"title": os.path.splitext(file_name)[0], "source": file_name}
+
+
+def iter_pages(file_path: str) -> Iterator[Any]:
+    """
+    스트리밍 수집용: 페이지를 하나씩 파싱해서 yield (전체 페이지를 메모리에 올리지 않음)
+    - 메타데이터는 file_reader와 동일 (source/title/page)
+    """
+    meta = file_meta(file_path)
+    for idx, doc in enumerate(_load_pages(file_path)):
+        doc.metadata["source"] = meta["source"]
+        doc.metadata["title"] = meta["title"]
+        doc.metadata["page"] = idx + 1
+        yield doc
+
+
+def read_head(file_path: str, max_chars: int = 3000) -> str:
+    """앞쪽 페이지만 읽어 max_chars까지의 텍스트 반환 (스트리밍 모드에서 분류기 입력용)"""
+    # 앞 몇 페이지만 필요하므로 병렬 추출 없이 순차 로드
+    parts: List[str] = []
+    size = 0
+    for doc in PyMuPDFLoader(file_path).lazy_load():
+        parts.append(doc.page_content)
+        size += len(doc.page_content)
+        if size >= max_chars:
+            break
+    return "\n".join(parts)[:max_chars]
+
+
+# ------------------------------------------------------------
+# 병렬 추출
+# ------------------------------------------------------------
+def _page_count(file_path: str) -> int:
+    import pymupdf  # PyMuPDFLoader와 같은 의존성
+
+    with pymupdf.open(file_path) as pdf:
+        return pdf.page_count
+
+
+def _extract_range(file_path: str, start: int, end: int) -> List[str]:
+    """워커 프로세스: [start, end) 페이지 텍스트 추출 (PyMuPDFLoader와 같은 get_text 기본 모드 + strip)"""
+    import pymupdf
+
+    with pymupdf.open(file_path) as pdf:
+        return [pdf[i].get_text().strip() for i in range(start, end)]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # 워커는 1회 생성 후 재사용. 서버는 스레드를 쓰므로 fork 대신 spawn으로 시작
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _POOL
+
+
+def _page_ranges(total: int, workers: int) -> List[Tuple[int, int]]:
+    # 워커당 2구간 정도로 나눠 페이지별 추출 비용 차이를 흡수 (구간당 PDF_RANGE_MAX_PAGES 이하)
+    size = max(1, min(PDF_RANGE_MAX_PAGES, -(-total // (workers * 2))))
+    return [(s, min(s + size, total)) for s in range(0, total, size)]
+
+
+def _load_pages(file_path: str) -> Iterator[Document]:
+    """
+    페이지 순서대로 Document를 yield
+    - 작은 문서(또는 워커 1개): PyMuPDFLoader.lazy_load 그대로
+    - 큰 문서: 페이지 구간을 프로세스 풀에서 추출, 원래 순서대로 yield
+      진행 중인 구간은 워커 수만큼만 유지 (앞 구간을 yield한 뒤 다음 구간 제출)
+      → 스트리밍 수집에서도 메모리에 올라오는 페이지 수가 문서 크기와 무관
+    """
+    total = _page_count(file_path) if PDF_EXTRACT_WORKERS > 1 else 0
+    if total < max(PDF_PARALLEL_MIN_PAGES, 2):
+        yield from PyMuPDFLoader(file_path).lazy_load()
+        return
+
+    pool = _get_pool()
+    pending_ranges = iter(_page_ranges(total, PDF_EXTRACT_WORKERS))
+    window = deque()
+
+    def submit_next() -> None:
+        r = next(pending_ranges, None)
+        if r is not None:
+            window.append((r[0], pool.submit(_extract_range, file_path, r[0], r[1])))
+
+    for _ in range(PDF_EXTRACT_WORKERS):
+        submit_next()
+    try:
+        while window:
+            start, fut = window.popleft()
+            texts = fut.result()
+            submit_next()
+            for offset, text in enumerate(texts):
+                yield Document(
+                    page_content=text,
+                    metadata={"source": file_path, "file_path": file_path, "page": start + offset, "total_pages": total},
+                )
+    finally:
+        # 소비자가 중간에 멈추면(예외/조기 종료) 아직 시작 안 한 구간은 취소
+        for _, fut in window:
+            fut.cancel()
+
@@ -1,41 +1,114 @@
 # backend/services/graph_builder.py
 # ------------------------------------------------------------
 # LangGraph 파이프라인:
-# 1) embedder  : 문서 파싱/임베딩/벡터스토어 생성 및 retriever 세팅
+# 0) reader    : PDF 파싱 (라우트에서 이미 raw_text를 넘겼다면 통과)
+# 1) embedder  : 문서 청크/임베딩/벡터스토어 생성 및 retriever 세팅
 # 2) summary   : 업로드 즉시 논문 요약 (리팩토링된 summarizer_agent 사용)
-# 3) classify  : 기술 도메인 분류
-# 4) qa        : 사용자 질문이 들어온 경우에만 실행 (리팩토링된 qa_agent 사용)
+# 3) classify  : 기술 도메인 분류 (raw_text 앞부분만 사용 → 1~2와 병렬 실행)
+# 4) join      : 요약/분류 결과 합류
+# 5) qa        : 사용자 질문이 들어온 경우에만 실행 (리팩토링된 qa_agent 사용)
+#
+#   reader ──→ embedder → summary_node → classify_node → join_node → (qa_node)
+#     └─ 분류 LLM 호출 시작 (백그라운드 스레드) ─────↗ (결과 수거)
+#
+# LangGraph는 superstep 단위로 동기화 → 분류를 별도 갈래 노드로 두면
+# summary_node가 분류 완료까지 대기. 그래서 reader가 분류 호출을 스레드풀에 넣고
+# classify_node는 그 결과만 기다림 → 분류가 임베딩과 요약 모두와 겹침
+#
+# retrieval_only=True: reader → embedder 만 실행 (retriever 복구용, 챗 모델 호출 0회)
 # ------------------------------------------------------------
 
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import TypedDict, Annotated, List, Dict, Any
+import os
 
 from services.summarizer import summarizer_agent, qa_agent
 from services.classifier import classifier_agent
 from services.embedder import embedder
+from services.file_reader import file_reader, read_head, file_meta
 
 class AgentState(TypedDict, total=False):
+    file: str             # 입력 PDF 경로 (reader 노드가 raw_text가 없을 때 사용)
+    streaming: bool       # True면 embedder가 file을 페이지 단위로 스트리밍 수집 (raw_text는 앞부분만)
     user_input: str
     raw_text: str
     raw_texts: List[str]  # 여러 청크 텍스트 (요약 품질↑)
     chunks: list
+    chunk_metadatas: List[Dict[str, Any]]  # 청크별 메타 (section 등, map-reduce 요약용)
     vectorstore: any
     retriever: any 
     meta: Dict[str, Any]  # 문서 메타: {"title": "...", "source": "..."} 등
 
     chat_history: Annotated[list, "Chat History"]
     summary: str
+    summary_mode: str  # "auto" | "stuff" | "map_reduce" (미지정 시 SUMMARY_MODE 환경변수)
     domain: str
+    domain_future: Future  # reader가 시작한 분류 호출 (classify_node가 결과 수거)
     answer: str
+    grounded: bool  # qa_node 답변이 LLM 생성인지 (False면 검색 단계 안내 문구)
+    citations: List[Dict[str, Any]]  # qa_node 답변의 근거 (컨텍스트에 들어간 청크만)
     top_k: int
 
 
 
-def build_graph():
+def _reader(state: AgentState) -> AgentState:
+    # 라우트에서 file_reader를 이미 실행했다면 재파싱하지 않음
+    if state.get("raw_text"):
+        return {}
+    # 스트리밍 모드: 전체 파싱은 embedder가 페이지 단위로 수행, 여기선 분류기용 앞부분만
+    if state.get("streaming") and state.get("file"):
+        return {"raw_text": read_head(state["file"]), "meta": file_meta(state["file"])}
+    out = file_reader({"file": state.get("file")})
+    return {"raw_text": out.get("raw_text", ""), "meta": out.get("meta", {})}
+
+
+# 분류 LLM 호출용 스레드풀 (동시 분석 작업 수만큼이면 충분)
+_CLASSIFY_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CLASSIFY_WORKERS", "4")), thread_name_prefix="classify"
+)
+
+
+def _reader_and_classify(state: AgentState) -> AgentState:
+    # 파싱 직후 분류 호출을 백그라운드로 시작 → embedder/summary와 동시에 진행
+    out = _reader(state)
+    raw_text = out.get("raw_text") or state.get("raw_text", "")
+    out["domain_future"] = _CLASSIFY_POOL.submit(classifier_agent.invoke, {"raw_text": raw_text})
+    return out
+
+
+def _classify(state: AgentState) -> AgentState:
+    future = state.get("domain_future")
+    if future is None:
+        return classifier_agent.invoke(state)
+    return future.result()
+
+
+def _join(state: AgentState) -> AgentState:
+    # 요약/분류 두 갈래가 모두 끝난 뒤 실행되는 합류 지점 (상태 변경 없음)
+    return {}
+
+
+def build_graph(retrieval_only: bool = False):
+    """
+    retrieval_only=True면 reader → embedder만 연결한 그래프를 컴파일.
+    요약/도메인이 이미 DB에 있는 문서의 retriever 복구 시 사용 (요약/분류 LLM 호출 생략).
+    """
     graph = StateGraph(AgentState)
 
+    if retrieval_only:
+        graph.add_node("reader", _reader)
+        graph.add_node("embedder", embedder)
+        graph.add_edge(START, "reader")
+        graph.add_edge("reader", "embedder")
+        graph.add_edge("embedder", END)
+        return graph.compile()
+
 
     # 1) 노드 등록
+    # reader: raw_text가 없으면 file 경로에서 PDF 파싱 + 분류 호출 시작
+    graph.add_node("reader", _reader_and_classify)
+
     # embedder: 업로드된 문서에서 텍스트/청크/임베딩/벡터스토어/리트리버 생성
     graph.add_node("embedder", embedder)
 
@@ -44,10 +117,13 @@ def build_graph():
     # - 출력: {"summary": "..."}
     graph.add_node("summary_node", summarizer_agent)
 
-    # classify_node: 도메인 분류 에이전트
-    # - 기대 입력: summary 또는 raw_texts/raw_text
-    # - 출력: {"domain": "..."} (구현에 따라 다를 수 있음)
-    graph.add_node("classify_node", classifier_agent)
+    # classify_node: 도메인 분류 결과 수거 (호출은 reader에서 시작)
+    # - 기대 입력: domain_future (없으면 raw_text 앞 3000자로 직접 분류)
+    # - 출력: {"domain": "..."}
+    graph.add_node("classify_node", _classify)
+
+    # join_node: 요약/분류 합류
+    graph.add_node("join_node", _join)
 
     # qa_node: 리팩토링된 qa_agent
     # - 기대 입력: user_input, retriever, (선택)top_k
@@ -56,21 +132,24 @@ def build_graph():
 
 
     # 2) 진입점
-    graph.set_entry_point("embedder")
+    graph.add_edge(START, "reader")
 
-    # 3) 엣지 (직렬 흐름)
-    # 업로드 즉시: 임베딩 -> 요약 -> 분류
+    # 3) 엣지
+    # 분류 호출은 reader에서 이미 시작 → 임베딩/요약과 동시에 실행, classify_node는 결과만 수거
+    # (분류를 별도 갈래로 두면 superstep 동기화 때문에 요약이 분류 완료를 기다림)
+    graph.add_edge("reader", "embedder")
     graph.add_edge("embedder", "summary_node")
     graph.add_edge("summary_node", "classify_node")
+    graph.add_edge("classify_node", "join_node")
 
     # QA 노드는 조건부로 실행
     def should_run_qa(state: AgentState) -> bool:
         return "user_input" in state and state["user_input"] is not None
 
-    graph.add_conditional_edges("classify_node", should_run_qa, {
+    graph.add_conditional_edges("join_node", should_run_qa, {
         True: "qa_node",
         False: END,
     })
 
     graph.add_edge("qa_node", END)
-    return graph.compile()
\ No newline at end of file
+    return graph.compile()
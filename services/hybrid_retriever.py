@@ -0,0 +1,128 @@
+# services/hybrid_retriever.py
+# ------------------------------------------------------------
+# BM25 + 벡터(MMR) 하이브리드 검색
+# - 두 결과 목록을 Reciprocal Rank Fusion(RRF)으로 합침: score = Σ 1 / (RRF_K + rank)
+#   → 점수 척도가 다른 BM25/L2 거리를 정규화 없이 결합
+# - 정확한 용어만으로 된 질의(따옴표로 감싼 구문, "ResNet-50" "BLEU 28.4" 같은 식별자 나열)는
+#   BM25만으로 답하고 질문 임베딩을 호출하지 않음 (BM25 결과가 없으면 벡터 검색으로 대체)
+# - RETRIEVAL_MODE: hybrid(기본) | dense(기존 MMR만) | lexical(BM25만)
+# ------------------------------------------------------------
+
+import os
+import re
+from typing import Any, Callable, Dict, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RRF_K = int(os.getenv("RRF_K", "60"))
+LEXICAL_QUERY_MAX_TERMS = int(os.getenv("LEXICAL_QUERY_MAX_TERMS", "4"))
+
+# 숫자 또는 대문자를 포함한 영문/숫자 식별자 (예: GPT-4o, ResNet-50, BLEU, 28.4)
+_IDENT = re.compile(r"^(?=.*[0-9A-Z])[A-Za-z0-9]+(?:[.\-_+/][A-Za-z0-9]+)*$")
+_QUOTES = ("\"\"", "''", "“”", "‘’")
+
+
+def is_lexical_query(question: str) -> bool:
+    """임베딩 없이 BM25만으로 답할 질의인지 (따옴표 구문 또는 짧은 식별자 나열)."""
+    q = (question or "").strip()
+    if len(q) > 2 and any(q[0] == a and q[-1] == b for a, b in _QUOTES):
+        return True
+    words = [w.strip("?!,.:;()") for w in q.split()]
+    words = [w for w in words if w]
+    return 0 < len(words) <= LEXICAL_QUERY_MAX_TERMS and all(_IDENT.match(w) for w in words)
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int) -> List[Document]:
+    """순위 목록들을 RRF로 합쳐 상위 k개. 같은 청크는 본문 기준으로 식별."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """vectorstore.lexical(BM25Index)과 벡터 MMR 검색을 RRF로 결합하는 retriever."""
+
+    vectorstore: Any
+    k: int = 5
+    fetch_k: int = 30
+    lambda_mult: float = 0.5
+    mode: str = RETRIEVAL_MODE
+
+    def _lexical(self, query: str, k: int) -> List[Document]:
+        vs = self.vectorstore
+        hits = vs.lexical.search(query, k)
+        return [vs.docstore.search(vs.index_to_docstore_id[i]) for i, _ in hits]
+
+    def _dense(self, query: str, k: int) -> List[Document]:
+        return self.vectorstore.max_marginal_relevance_search(
+            query, k=k, fetch_k=max(self.fetch_k, k), lambda_mult=self.lambda_mult
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.mode == "dense":
+            return self._dense(query, self.k)
+
+        if self.mode == "lexical" or is_lexical_query(query):
+            lexical = self._lexical(query, self.k)
+            if lexical:
+                return lexical
+            return self._dense(query, self.k)
+
+        # 융합 후보는 양쪽 모두 k의 2배까지
+        depth = self.k * 2
+        return reciprocal_rank_fusion([self._lexical(query, depth), self._dense(query, depth)], self.k)
+
+    def retrieve_many(
+        self, queries: List[str], embed_many: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[Document]]:
+        """
+        여러 질문을 한 번에 검색 (배치 QA용).
+        - 벡터 검색이 필요한 질문만 embed_many 1회로 임베딩 → 인덱스 search 1회
+        - BM25 전용 질의는 임베딩하지 않음 (결과가 없을 때만 벡터 검색에 포함)
+        """
+        depth = self.k if self.mode == "dense" else self.k * 2
+        lexical: List[List[Document]] = [[] for _ in queries]
+        need_dense: List[int] = []
+        for i, q in enumerate(queries):
+            if self.mode != "dense":
+                only_lexical = self.mode == "lexical" or is_lexical_query(q)
+                lexical[i] = self._lexical(q, self.k if only_lexical else depth)
+                if only_lexical and lexical[i]:
+                    continue
+            need_dense.append(i)
+
+        dense: Dict[int, List[Document]] = {}
+        if need_dense:
+            vectors = embed_many([queries[i] for i in need_dense])
+            vs = self.vectorstore
+            fetch_k = max(self.fetch_k, depth)
+            if hasattr(vs, "max_marginal_relevance_search_batch_by_vectors"):
+                found = vs.max_marginal_relevance_search_batch_by_vectors(
+                    vectors, k=depth, fetch_k=fetch_k, lambda_mult=self.lambda_mult
+                )
+            else:
+                found = [
+                    vs.max_marginal_relevance_search_by_vector(v, k=depth, fetch_k=fetch_k, lambda_mult=self.lambda_mult)
+                    for v in vectors
+                ]
+            dense = dict(zip(need_dense, found))
+
+        results: List[List[Document]] = []
+        for i in range(len(queries)):
+            if i not in dense:
+                results.append(lexical[i])
+            elif self.mode == "dense" or not lexical[i]:
+                results.append(dense[i][: self.k])
+            else:
+                results.append(reciprocal_rank_fusion([lexical[i], dense[i]], self.k))
+        return results
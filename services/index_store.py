@@ -0,0 +1,158 @@
+# services/index_store.py
+# 문서별 FAISS 인덱스 + docstore를 디스크에 영속화 (document_id 키)
+# - 분석 시점에 save_index → faiss_index/<document_id>/ 에 저장
+# - 서버 재시작 후 캐시 미스 시 load_index로 mmap 로드 → 임베딩/챗 모델 호출 없이 retriever 복구
+# - 저장 구조: faiss_index/<document_id> 는 버전 디렉터리(<document_id>.<버전>)를 가리키는 심볼릭 링크
+#   새 버전을 다 쓴 뒤 링크만 원자적으로 교체(os.replace) → 동시에 읽는 쪽이 디렉터리가 없는 순간을 보지 않음
+#   읽는 쪽은 링크를 한 번 해석한 버전 디렉터리에서 모든 파일을 읽음 (버전이 섞이지 않음)
+
+import json
+import os
+import pickle
+import shutil
+import uuid
+from typing import Any, Optional
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from services.lexical_index import BM25Index
+from services.vector_store import RescoringFAISS
+
+# uploaded_docs/ 옆에 인덱스 디렉터리를 둠 (환경변수로 변경 가능)
+INDEX_DIR = os.getenv("FAISS_INDEX_DIR", "faiss_index")
+
+_INDEX_FILE = "index.faiss"
+_DOCSTORE_FILE = "docstore.pkl"
+_VECTORS_FILE = "vectors.npy"   # 압축 저장 모드의 재채점용 float32 정확 벡터
+_META_FILE = "meta.json"
+_LEXICAL_FILE = "lexical.pkl"  # BM25 역색인
+
+
+def _doc_dir(doc_id: int) -> str:
+    return os.path.join(INDEX_DIR, str(doc_id))
+
+
+def has_index(doc_id: int) -> bool:
+    return os.path.exists(os.path.join(_doc_dir(doc_id), _INDEX_FILE))
+
+
+def _swap(target: str, version: str) -> Optional[str]:
+    """target 링크를 version 디렉터리로 원자적으로 교체 → 이전 버전 디렉터리 경로 (없으면 None)"""
+    old = os.path.realpath(target) if os.path.islink(target) else None
+    if os.path.isdir(target) and not os.path.islink(target):
+        # 이전 형식(실제 디렉터리): 옆으로 옮긴 뒤 링크 생성 (문서당 한 번)
+        old = f"{target}.{uuid.uuid4().hex[:8]}"
+        os.replace(target, old)
+    link = f"{target}.lnk-{uuid.uuid4().hex[:8]}"
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, target)
+    return old
+
+
+def save_index(doc_id: int, vectorstore: FAISS) -> str:
+    """
+    벡터스토어를 디스크에 저장하고 저장 경로를 반환.
+    - 새 버전 디렉터리에 먼저 쓰고 링크 교체 → 중간 실패 시 깨진 인덱스가 남지 않고,
+      교체 중에도 읽는 쪽은 이전 버전이나 새 버전 중 하나를 온전히 봄
+    """
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    target = _doc_dir(doc_id)
+    tmp = f"{target}.{uuid.uuid4().hex[:8]}"
+    os.makedirs(tmp)
+
+    faiss.write_index(vectorstore.index, os.path.join(tmp, _INDEX_FILE))
+    with open(os.path.join(tmp, _DOCSTORE_FILE), "wb") as f:
+        pickle.dump((vectorstore.docstore, vectorstore.index_to_docstore_id), f)
+
+    lexical = getattr(vectorstore, "lexical", None)
+    if lexical is not None:
+        with open(os.path.join(tmp, _LEXICAL_FILE), "wb") as f:
+            pickle.dump(lexical, f)
+
+    exact = getattr(vectorstore, "exact_vectors", None)
+    if exact is not None:
+        np.save(os.path.join(tmp, _VECTORS_FILE), np.asarray(exact, dtype=np.float32))
+    with open(os.path.join(tmp, _META_FILE), "w") as f:
+        json.dump({
+            "storage": getattr(vectorstore, "storage", "flat"),
+            "search_dim": getattr(vectorstore, "search_dim", 0),
+        }, f)
+
+    old = _swap(target, tmp)
+    if old and old != tmp:
+        shutil.rmtree(old, ignore_errors=True)
+
+    # 정확 벡터는 디스크 mmap으로 교체 → 메모리에는 압축 인덱스만 상주
+    if exact is not None:
+        vectorstore.exact_vectors = np.load(os.path.join(tmp, _VECTORS_FILE), mmap_mode="r")
+    return target
+
+
+def load_index(doc_id: int, embedding: Any) -> Optional[RescoringFAISS]:
+    """
+    디스크에서 벡터스토어를 복구. 인덱스가 없으면 None.
+    - embedding: 검색 시 질문 임베딩용 (로드 자체는 API 호출 없음)
+    - IO_FLAG_MMAP: 인덱스 파일을 메모리 매핑으로 열어 로드 시간을 최소화
+    - 정확 벡터(vectors.npy)가 있으면 mmap으로 열어 재채점에 사용
+    - BM25 역색인(lexical.pkl)이 없는 이전 인덱스는 docstore 청크로 재생성 (임베딩 호출 없음)
+    - 읽는 도중 save_index가 이전 버전을 지우면 새 버전으로 다시 읽음
+    """
+    for _ in range(3):
+        path = os.path.realpath(_doc_dir(doc_id))
+        if not os.path.exists(os.path.join(path, _INDEX_FILE)):
+            return None
+        try:
+            return _load_version(path, embedding)
+        except (OSError, RuntimeError):
+            # faiss는 없는 파일에 RuntimeError → 그 사이 링크가 바뀐 경우만 재시도
+            if os.path.realpath(_doc_dir(doc_id)) == path:
+                raise
+    return None
+
+
+def _load_version(path: str, embedding: Any) -> RescoringFAISS:
+    index_path = os.path.join(path, _INDEX_FILE)
+
+    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    with open(os.path.join(path, _DOCSTORE_FILE), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    meta = {}
+    meta_path = os.path.join(path, _META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    vectors_path = os.path.join(path, _VECTORS_FILE)
+    exact = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+
+    lexical_path = os.path.join(path, _LEXICAL_FILE)
+    if os.path.exists(lexical_path):
+        with open(lexical_path, "rb") as f:
+            lexical = pickle.load(f)
+    else:
+        lexical = BM25Index([
+            docstore.search(index_to_docstore_id[i]).page_content for i in range(len(index_to_docstore_id))
+        ])
+
+    return RescoringFAISS(
+        embedding_function=embedding,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        exact_vectors=exact,
+        storage=meta.get("storage", "flat"),
+        search_dim=meta.get("search_dim", 0),
+        lexical=lexical,
+    )
+
+
+def delete_index(doc_id: int) -> None:
+    target = _doc_dir(doc_id)
+    if os.path.islink(target):
+        version = os.path.realpath(target)
+        os.unlink(target)
+        shutil.rmtree(version, ignore_errors=True)
+    else:
+        shutil.rmtree(target, ignore_errors=True)
@@ -0,0 +1,110 @@
+# services/lexical_index.py
+# ------------------------------------------------------------
+# 문서별 BM25 역색인 (청크 단위)
+# - 청크화 시점(build_vectorstore)에 벡터 인덱스와 같은 순서로 생성 → index_store가 함께 저장
+# - 한국어 토큰화: 한글 어절은 조사를 떼어 어간을 남기고 음절 bigram을 추가
+#   (형태소 분석기 없이 복합명사/띄어쓰기 변형에도 매칭)
+# - 영문/숫자 용어: 모델명·데이터셋명·수치(ResNet-50, GPT-4o, 28.4)를 한 토큰으로 보존하고
+#   구분자로 나눈 조각도 함께 색인
+# - 질문 임베딩 없이 검색 가능 → 정확한 용어 질의는 임베딩 호출 0회
+# ------------------------------------------------------------
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TERM = re.compile(r"[A-Za-z0-9]+(?:[.\-_+/][A-Za-z0-9]+)*|[가-힣]+")
+_SPLIT = re.compile(r"[.\-_+/]")
+_HANGUL = re.compile(r"^[가-힣]+$")
+
+# 긴 조사부터 매칭 (예: "에서는" → "에서" 보다 먼저)
+_JOSA = sorted(
+    [
+        "은", "는", "이", "가", "을", "를", "의", "에", "에서", "에게", "께서", "으로", "로",
+        "와", "과", "도", "만", "까지", "부터", "보다", "처럼", "이나", "나", "이라", "라",
+        "에서는", "에는", "으로는", "로는", "이다", "입니다", "이며", "하고", "랑", "이랑",
+    ],
+    key=len,
+    reverse=True,
+)
+_JOSA_SET = frozenset(_JOSA)
+
+
+def _strip_josa(word: str) -> str:
+    for josa in _JOSA:
+        if len(word) > len(josa) and word.endswith(josa):
+            return word[: -len(josa)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """색인/질의 공용 토크나이저 (소문자화)."""
+    tokens: List[str] = []
+    for m in _TERM.finditer(text or ""):
+        word = m.group().lower()
+        if _HANGUL.match(word):
+            if word in _JOSA_SET:
+                continue  # "ResNet-50의"처럼 영문/숫자 용어에 붙은 조사만 남은 경우
+            stem = _strip_josa(word)
+            tokens.append(stem)
+            if len(stem) > 2:
+                tokens.extend(stem[i:i + 2] for i in range(len(stem) - 1))
+        else:
+            tokens.append(word)
+            parts = [p for p in _SPLIT.split(word) if p]
+            if len(parts) > 1:
+                tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    청크 번호(벡터 인덱스 위치와 동일) → BM25 점수.
+    postings: term → (청크 번호 배열, 출현 횟수 배열)
+    """
+
+    def __init__(self, texts: List[str]):
+        self.n = len(texts)
+        doc_len = np.zeros(self.n, dtype=np.float32)
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for i, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[i] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((i, tf))
+        self.doc_len = doc_len
+        self.avgdl = float(doc_len.mean()) if self.n else 0.0
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            term: (np.array([p[0] for p in plist], dtype=np.int32), np.array([p[1] for p in plist], dtype=np.float32))
+            for term, plist in postings.items()
+        }
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """[(청크 번호, 점수)] 점수 내림차순, 일치하는 용어가 없으면 []"""
+        if not self.n:
+            return []
+        scores = np.zeros(self.n, dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len / (self.avgdl or 1.0))
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids, tf = posting
+            idf = math.log(1 + (self.n - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tf * (BM25_K1 + 1) / (tf + norm[ids])
+        hit = np.flatnonzero(scores)
+        if hit.size == 0:
+            return []
+        top = hit[np.argsort(-scores[hit])[:k]]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def nbytes(self) -> int:
+        return int(self.doc_len.nbytes + sum(
+            len(t.encode("utf-8")) + ids.nbytes + tf.nbytes for t, (ids, tf) in self.postings.items()
+        ))
@@ -1,24 +1,229 @@
 # services/retriever_cache.py
-# 문서별 retriever/vectorstore를 메모리에 보관 (개발/PoC 용)
-# 운영에서는 디스크에 FAISS 저장 또는 외부 벡터DB 권장.
+# 문서별 retriever/vectorstore를 메모리에 보관
+# - 메모리 캐시 미스 시 디스크 인덱스(services/index_store)에서 복구 → 재시작 후에도 재임베딩 불필요
+# - 바이트 예산(RETRIEVER_CACHE_MAX_BYTES) 기반 LRU + TTL 축출
+#   축출된 문서는 다음 조회 때 디스크 인덱스 → (없으면) qa 라우트의 재구축 경로로 복구
+# - get_or_build / aget_or_build: 문서별 single-flight
+#   같은 문서의 동시 복구 요청은 1건만 재구축하고 나머지는 같은 결과를 기다림
+#   스레드(동기 def 라우트)와 asyncio 태스크(async def 라우트)가 같은 Future를 공유
+#   → 섞여서 들어와도 재구축 1건, async 쪽은 리더 작업을 실행기 스레드에서 돌리고 await만 함
+# - 문서별 세대(generation): clear_retriever마다 증가
+#   복구 도중 문서가 삭제/초기화되면 리더가 끝난 뒤 오래된 항목을 다시 등록하지 않음
 
-from typing import Dict, Any, Optional
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Callable, Tuple
 
-_RETRIEVER_CACHE: Dict[int, Dict[str, Any]] = {}
+from services.index_store import load_index, delete_index
+from services.embedder import get_embedding_model, build_retriever
+from services.vector_store import index_nbytes
 
+RETRIEVER_CACHE_MAX_BYTES = int(os.getenv("RETRIEVER_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))  # 기본 2GB
+RETRIEVER_CACHE_TTL_SEC = int(os.getenv("RETRIEVER_CACHE_TTL_SEC", "0"))  # 0이면 TTL 미사용
 
-def set_retriever(doc_id: int, retriever: Any, vectorstore: Any) -> None:
-    _RETRIEVER_CACHE[doc_id] = {"retriever": retriever, "vectorstore": vectorstore}
+_RETRIEVER_CACHE: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_LOCK = threading.RLock()
+_STATS = {"hits": 0, "misses": 0, "disk_loads": 0, "evictions": 0, "resident_bytes": 0, "coalesced": 0}
+_INFLIGHT: Dict[int, Future] = {}
+_GENERATION: Dict[int, int] = {}
+
+# builder: 캐시/디스크 모두 없을 때 호출, (retriever, vectorstore) 반환
+Builder = Callable[[], Tuple[Any, Any]]
+
+
+def estimate_vectorstore_bytes(vectorstore: Any) -> int:
+    """
+    FAISS 벡터스토어의 대략적인 메모리 크기
+    - 인덱스: ntotal × (벡터 1개 코드 크기) + PQ 코드북/SQ 범위 (vector_store.index_nbytes)
+    - docstore: 청크 텍스트(UTF-8) 길이 합
+    - lexical: BM25 역색인 postings 크기
+    """
+    if vectorstore is None:
+        return 0
+    total = 0
+    index = getattr(vectorstore, "index", None)
+    if index is not None:
+        total += index_nbytes(index)
+    docstore = getattr(vectorstore, "docstore", None)
+    for doc in getattr(docstore, "_dict", {}).values():
+        total += len(getattr(doc, "page_content", "").encode("utf-8"))
+    lexical = getattr(vectorstore, "lexical", None)
+    if lexical is not None:
+        total += lexical.nbytes()
+    return total
+
+
+def _evict_locked(doc_id: int) -> None:
+    item = _RETRIEVER_CACHE.pop(doc_id, None)
+    if item:
+        _STATS["resident_bytes"] -= item["bytes"]
+        _STATS["evictions"] += 1
+
+
+def _enforce_budget_locked() -> None:
+    # TTL 만료 항목 먼저, 그 다음 예산을 넘는 동안 가장 오래 안 쓴 항목부터 축출
+    if RETRIEVER_CACHE_TTL_SEC > 0:
+        now = time.time()
+        for doc_id in [k for k, v in _RETRIEVER_CACHE.items() if now - v["last_access"] > RETRIEVER_CACHE_TTL_SEC]:
+            _evict_locked(doc_id)
+    while _STATS["resident_bytes"] > RETRIEVER_CACHE_MAX_BYTES and len(_RETRIEVER_CACHE) > 1:
+        oldest = next(iter(_RETRIEVER_CACHE))
+        _evict_locked(oldest)
+
+
+def generation(doc_id: int) -> int:
+    """문서 세대 (clear_retriever마다 증가) — 복구/분석 시작 시 읽어 두고 등록 시 비교"""
+    with _LOCK:
+        return _GENERATION.get(doc_id, 0)
+
+
+def set_retriever(doc_id: int, retriever: Any, vectorstore: Any, generation: Optional[int] = None) -> bool:
+    """
+    캐시 등록. generation을 주면 그 사이 clear_retriever가 호출되지 않았을 때만 등록.
+    반환: 등록 여부
+    """
+    size = estimate_vectorstore_bytes(vectorstore)
+    with _LOCK:
+        if generation is not None and _GENERATION.get(doc_id, 0) != generation:
+            return False
+        prev = _RETRIEVER_CACHE.pop(doc_id, None)
+        if prev:
+            _STATS["resident_bytes"] -= prev["bytes"]
+        _RETRIEVER_CACHE[doc_id] = {
+            "retriever": retriever,
+            "vectorstore": vectorstore,
+            "bytes": size,
+            "last_access": time.time(),
+        }
+        _STATS["resident_bytes"] += size
+        _enforce_budget_locked()
+    return True
 
 
 def get_retriever(doc_id: int) -> Optional[Any]:
-    item = _RETRIEVER_CACHE.get(doc_id)
-    return item.get("retriever") if item else None
+    with _LOCK:
+        item = _RETRIEVER_CACHE.get(doc_id)
+        if item and RETRIEVER_CACHE_TTL_SEC > 0 and time.time() - item["last_access"] > RETRIEVER_CACHE_TTL_SEC:
+            _evict_locked(doc_id)
+            item = None
+        if item:
+            item["last_access"] = time.time()
+            _RETRIEVER_CACHE.move_to_end(doc_id)
+            _STATS["hits"] += 1
+            return item.get("retriever")
+        _STATS["misses"] += 1
+        gen = _GENERATION.get(doc_id, 0)
+
+    # 캐시 미스 → 디스크 인덱스 로드 (임베딩/챗 모델 호출 없음)
+    vectorstore = load_index(doc_id, get_embedding_model())
+    if vectorstore is None:
+        return None
+    retriever = build_retriever(vectorstore)
+    set_retriever(doc_id, retriever, vectorstore, generation=gen)
+    with _LOCK:
+        _STATS["disk_loads"] += 1
+    return retriever
+
+
+def _claim(doc_id: int) -> Tuple[Future, bool]:
+    """진행 중인 복구가 있으면 (그 Future, False), 없으면 새 Future를 등록하고 (Future, True)"""
+    with _LOCK:
+        fut = _INFLIGHT.get(doc_id)
+        if fut is not None:
+            _STATS["coalesced"] += 1
+            return fut, False
+        fut = Future()
+        _INFLIGHT[doc_id] = fut
+        return fut, True
+
+
+def _lead(doc_id: int, fut: Future, builder: Builder) -> None:
+    """
+    리더: 디스크 로드 → (없으면) builder 실행 → 캐시 등록 → Future에 결과/예외 전달
+    복구 도중 clear_retriever가 호출됐으면(세대 변경) 결과는 대기자에게만 전달하고 캐시에는 넣지 않음
+    """
+    gen = generation(doc_id)
+    try:
+        retriever = get_retriever(doc_id)
+        if retriever is None:
+            retriever, vectorstore = builder()
+            if retriever is not None:
+                set_retriever(doc_id, retriever, vectorstore, generation=gen)
+        fut.set_result(retriever)
+    except BaseException as e:
+        fut.set_exception(e)
+    finally:
+        with _LOCK:
+            if _INFLIGHT.get(doc_id) is fut:
+                _INFLIGHT.pop(doc_id, None)
+
+
+def _resident(doc_id: int) -> Optional[Any]:
+    """메모리에 있는 retriever만 (디스크 로드 없음 → 이벤트 루프에서 호출 가능)"""
+    with _LOCK:
+        if not _RETRIEVER_CACHE.get(doc_id):
+            return None
+    return get_retriever(doc_id)
+
+
+def get_or_build(doc_id: int, builder: Builder) -> Optional[Any]:
+    """
+    retriever 조회, 없으면 single-flight로 복구 (동기/스레드용).
+    builder 예외는 대기 중인 모든 호출자에게 동일하게 전달됨.
+    """
+    if has_retriever(doc_id):
+        retriever = get_retriever(doc_id)
+        if retriever is not None:
+            return retriever
+    fut, leader = _claim(doc_id)
+    if leader:
+        _lead(doc_id, fut, builder)
+    return fut.result()
+
+
+async def aget_or_build(doc_id: int, builder: Builder) -> Optional[Any]:
+    """
+    get_or_build의 asyncio 버전 (async def 라우트용).
+    디스크 로드/builder는 실행기 스레드에서 실행하고 이벤트 루프는 결과만 기다림.
+    """
+    retriever = _resident(doc_id)
+    if retriever is not None:
+        return retriever
+    fut, leader = _claim(doc_id)
+    if leader:
+        asyncio.get_running_loop().run_in_executor(None, _lead, doc_id, fut, builder)
+    return await asyncio.wrap_future(fut)
 
 
 def has_retriever(doc_id: int) -> bool:
-    return doc_id in _RETRIEVER_CACHE
+    with _LOCK:
+        return doc_id in _RETRIEVER_CACHE
+
+
+def clear_retriever(doc_id: int, remove_index: bool = False) -> None:
+    with _LOCK:
+        # 세대 증가 → 진행 중인 복구는 끝나도 캐시에 등록하지 않음, 이후 요청은 새로 복구
+        _GENERATION[doc_id] = _GENERATION.get(doc_id, 0) + 1
+        _INFLIGHT.pop(doc_id, None)
+        item = _RETRIEVER_CACHE.pop(doc_id, None)
+        if item:
+            _STATS["resident_bytes"] -= item["bytes"]
+    if remove_index:
+        delete_index(doc_id)
 
 
-def clear_retriever(doc_id: int) -> None:
-    _RETRIEVER_CACHE.pop(doc_id, None)
+def cache_stats() -> Dict[str, Any]:
+    """hits/misses/evictions/resident_bytes + 예산/항목 수"""
+    with _LOCK:
+        total = _STATS["hits"] + _STATS["misses"]
+        return {
+            **_STATS,
+            "hit_rate": round(_STATS["hits"] / total, 4) if total else 0.0,
+            "entries": len(_RETRIEVER_CACHE),
+            "max_bytes": RETRIEVER_CACHE_MAX_BYTES,
+            "ttl_sec": RETRIEVER_CACHE_TTL_SEC,
+        }
@@ -8,14 +8,27 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import AzureChatOpenAI
 from langchain_core.runnables import RunnableLambda
-from typing import List
+from typing import List, Dict, Any, Optional, Tuple
 import os
 from dotenv import load_dotenv
 from langsmith import traceable
 
+from services.token_utils import count_tokens
+from services.context_packer import context_packer
+
 # 1) 환경변수 로드 (.env 경로가 루트가 아닐 수 있으니 필요 시 지정)
 load_dotenv()
 
+# 요약 모드 설정
+# - stuff: 모든 청크를 한 번에 요약 (짧은 문서에 유리)
+# - map_reduce: 섹션별 부분 요약을 동시에 만든 뒤 최종 통합
+# - auto: 입력 토큰이 예산을 넘으면 map_reduce, 아니면 stuff
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "auto")
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "12000"))  # LLM 호출 1건당 입력 토큰 상한
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+SUMMARY_MAX_COLLAPSE_ROUNDS = int(os.getenv("SUMMARY_MAX_COLLAPSE_ROUNDS", "3"))  # 부분 요약 재요약 단계 상한
+QA_BATCH_CONCURRENCY = int(os.getenv("QA_BATCH_CONCURRENCY", "8"))  # 배치 QA의 동시 qa_chain 호출 상한
+
 # 2) LLM 인스턴스 분리
 # - 요약은 사실성/일관성 중요 → temperature 낮게, 토큰 넉넉히
 summary_llm = AzureChatOpenAI(
@@ -76,6 +89,38 @@ SUMMARY_USER = """\
 - 중복 내용은 제거하고, 동일 개념의 다양한 표기는 일관되게 통일하세요.
 """
 
+# 4-1) map 단계 프롬프트: 섹션 일부에서 핵심 사실만 추출 (최종 요약 형식은 reduce에서)
+SUMMARY_MAP_SYSTEM = """\
+당신은 기술 논문 분석가입니다. 주어진 논문 일부에서 요약에 필요한 사실만 추출하세요.
+- 연구주제, 핵심 기여, 방법, 데이터셋/설정, 실험결과에 해당하는 내용을 불릿으로 정리합니다.
+- 숫자/모델명/데이터셋명은 **원문 표기 그대로** 사용합니다.
+- 해당 내용이 없으면 생략하고, 추정하지 않습니다.
+- 한국어로 200단어 이내.
+"""
+
+SUMMARY_MAP_USER = """\
+[문서 메타]
+- 제목: {title}
+- 섹션: {section}
+
+[논문 일부]
+{chunks}
+"""
+
+# 4-2) reduce 단계 User 프롬프트: 부분 요약들을 최종 섹션 요약으로 통합 (System은 SUMMARY_SYSTEM 재사용)
+SUMMARY_REDUCE_USER = """\
+[문서 메타]
+- 제목: {title}
+- 출처: {source}
+
+[섹션별 부분 요약]
+{chunks}
+
+[요청]
+- 위 부분 요약들을 통합하여 규칙대로 섹션 요약을 생성하세요.
+- 중복 내용은 제거하고, 동일 개념의 다양한 표기는 일관되게 통일하세요.
+"""
+
 # 5) QA 전용 System 프롬프트 (근거/불확실성 가드)
 QA_SYSTEM = """\
 당신은 기술 논문 질의응답 전문가입니다.
@@ -108,6 +153,22 @@ summary_prompt = ChatPromptTemplate.from_messages(
 )
 summary_chain = summary_prompt | summary_llm | StrOutputParser()
 
+summary_map_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", SUMMARY_MAP_SYSTEM),
+        ("user", SUMMARY_MAP_USER),
+    ]
+)
+summary_map_chain = summary_map_prompt | summary_llm | StrOutputParser()
+
+summary_reduce_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", SUMMARY_SYSTEM),
+        ("user", SUMMARY_REDUCE_USER),
+    ]
+)
+summary_reduce_chain = summary_reduce_prompt | summary_llm | StrOutputParser()
+
 qa_prompt = ChatPromptTemplate.from_messages(
     [
         ("system", QA_SYSTEM),
@@ -129,6 +190,75 @@ def _dedup_lines(text: str) -> str:
             out.append(line)
     return "\n".join(out)
 
+def _pack_by_budget(texts: List[str], budget: int) -> List[str]:
+    """텍스트를 순서대로 이어 붙이되, 묶음 하나가 토큰 예산을 넘지 않도록 분할."""
+    packs: List[str] = []
+    cur: List[str] = []
+    cur_tokens = 0
+    for t in texts:
+        n = count_tokens(t, model="gpt-4o")
+        if cur and cur_tokens + n > budget:
+            packs.append("\n\n---\n\n".join(cur))
+            cur, cur_tokens = [], 0
+        cur.append(t)
+        cur_tokens += n
+    if cur:
+        packs.append("\n\n---\n\n".join(cur))
+    return packs
+
+
+def _group_by_section(raw_texts: List[str], metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """연속된 청크를 section 메타 기준으로 묶음 (문서 순서 유지)"""
+    groups: List[Dict[str, Any]] = []
+    for i, text in enumerate(raw_texts):
+        md = metadatas[i] if i < len(metadatas) else {}
+        section = md.get("section") or "N/A"
+        if groups and groups[-1]["section"] == section:
+            groups[-1]["texts"].append(text)
+        else:
+            groups.append({"section": section, "texts": [text]})
+    return groups
+
+
+def _map_reduce_summarize(raw_texts: List[str], metadatas: List[Dict[str, Any]], title: str, source: str) -> str:
+    """
+    계층형 map-reduce 요약
+    1) map: 섹션별(예산 초과 시 섹션 내 분할) 부분 요약을 동시에 생성
+    2) collapse: 부분 요약 합이 예산을 넘으면 다시 묶어서 요약 (반복)
+    3) reduce: 최종 섹션 요약 1회 호출
+    → 호출 1건의 입력이 예산 이하로 유지되어 논문 길이와 무관하게 지연이 평탄
+    """
+    batch_config = {"max_concurrency": SUMMARY_MAP_CONCURRENCY}
+
+    # (1) map
+    map_inputs = []
+    for group in _group_by_section(raw_texts, metadatas):
+        for pack in _pack_by_budget(group["texts"], SUMMARY_TOKEN_BUDGET):
+            map_inputs.append({"title": title, "section": group["section"], "chunks": _dedup_lines(pack)})
+    partials = summary_map_chain.batch(map_inputs, config=batch_config)
+
+    # (2) collapse: 부분 요약이 여전히 예산을 넘으면 한 단계 더 요약
+    # - 묶음 수가 줄지 않거나(부분 요약 1개가 예산의 절반 이상) 최대 단계에 도달하면 중단
+    #   → 남은 묶음을 그대로 합쳐 reduce 1회 (예산은 넘지만 LLM 호출 수는 유한)
+    packs = _pack_by_budget(partials, SUMMARY_TOKEN_BUDGET)
+    rounds = 0
+    while len(packs) > 1 and rounds < SUMMARY_MAX_COLLAPSE_ROUNDS:
+        partials = summary_map_chain.batch(
+            [{"title": title, "section": "부분 요약 통합", "chunks": p} for p in packs],
+            config=batch_config,
+        )
+        rounds += 1
+        collapsed = _pack_by_budget(partials, SUMMARY_TOKEN_BUDGET)
+        if len(collapsed) >= len(packs):
+            packs = ["\n\n---\n\n".join(partials)]
+            break
+        packs = collapsed
+
+    # (3) reduce
+    chunks = packs[0] if len(packs) == 1 else "\n\n---\n\n".join(packs)
+    return summary_reduce_chain.invoke({"title": title, "source": source, "chunks": chunks})
+
+
 @traceable  # ★ 이 1줄만 추가
 # 9) Runnable: 요약 에이전트
 def _run_summarize(state):
@@ -136,6 +266,7 @@ def _run_summarize(state):
     state 요구:
     - raw_texts: List[str] 또는 raw_text: str (둘 중 하나)
     - meta: dict(title, source) (선택)
+    - chunk_metadatas: List[dict] (선택, map-reduce 모드에서 section 그룹핑에 사용)
     """
     # (1) 입력 수집
     title = (state.get("meta") or {}).get("title", "제목 미상")
@@ -152,11 +283,17 @@ def _run_summarize(state):
             "summary": "💡 요약할 텍스트가 없습니다. raw_text 또는 raw_texts를 확인하세요."
         }
 
-    # (2) 청크 합치기 (너무 길면 상위 N개만 사용, 여기선 단순 결합)
+    # (2) 청크 합치기
     chunks = "\n\n---\n\n".join(raw_texts)
     chunks = _dedup_lines(chunks)
 
-    # (3) 모델 호출
+    # (2-1) 예산 초과(또는 map_reduce 강제) 시 섹션별 map-reduce로 전환
+    mode = state.get("summary_mode") or SUMMARY_MODE
+    if mode == "map_reduce" or (mode == "auto" and count_tokens(chunks, model="gpt-4o") > SUMMARY_TOKEN_BUDGET):
+        summary = _map_reduce_summarize(raw_texts, state.get("chunk_metadatas") or [], title, source)
+        return {"summary": summary}
+
+    # (3) 모델 호출 (stuff: 단일 프롬프트)
     summary = summary_chain.invoke(
         {
             "title": title,
@@ -170,25 +307,21 @@ def _run_summarize(state):
 summarizer_agent = RunnableLambda(_run_summarize)
 
 
-@traceable  # ★ 이 1줄만 추가
-# 10) Runnable: QA + Retrieval
-def qa_with_retrieval(state):
+NO_DOCS_NOTICE = "💡 관련 문서를 찾지 못했습니다. 질문을 구체화하거나 문서 업로드를 확인하세요."
+
+
+def _retrieve_docs(state):
     """
-    state 요구:
-    - user_input: str (질문)
-    - retriever: BaseRetriever-like
-    - meta: dict(optional) (문서명/저자/페이지 등 넣으면 UX 좋음)
-    - top_k: int(optional)
+    질문/리트리버 검증 + 검색. (docs, None) 또는 ([], 사용자에게 돌려줄 안내 메시지) 반환.
+    qa_with_retrieval / stream_qa 공용.
     """
     question = state.get("user_input", "")
     if not question:
-        return {"answer": "💡 질문이 비어 있습니다. user_input을 확인하세요."}
+        return [], "💡 질문이 비어 있습니다. user_input을 확인하세요."
 
     retriever = state.get("retriever")
     if retriever is None:
-        return {
-            "answer": "💡 문서를 임베딩하거나 검색할 수 없습니다. retriever가 없습니다."
-        }
+        return [], "💡 문서를 임베딩하거나 검색할 수 없습니다. retriever가 없습니다."
 
     top_k = state.get("top_k", 4)
     try:
@@ -197,27 +330,113 @@ def qa_with_retrieval(state):
         )  # 필요 시 retriever.search_kwargs 조정
         docs = docs[:top_k] if len(docs) > top_k else docs
     except Exception as e:
-        return {"answer": f"검색 중 오류가 발생했습니다: {e}"}
+        return [], f"검색 중 오류가 발생했습니다: {e}"
 
     if not docs:
-        return {
-            "answer": "💡 관련 문서를 찾지 못했습니다. 질문을 구체화하거나 문서 업로드를 확인하세요."
-        }
+        return [], NO_DOCS_NOTICE
+    return docs, None
 
-    # 컨텍스트 생성: page_content + (가능하면) 메타정보도 덧붙이기
-    # LangChain 문서 객체는 .metadata에 source/page 등 있을 수 있음
-    context_blocks = []
+
+def _build_context(docs) -> Tuple[str, List[int]]:
+    # 컨텍스트 생성: 관련도 순서로 QA_CONTEXT_TOKEN_BUDGET까지 채움
+    # - 헤더 [Doc#i | source | page]는 검색 순번 유지 (citations_from_docs의 doc 번호와 동일)
+    # - 이웃 청크의 chunk_overlap 구간, 중복/유사 문장은 제외 (services/context_packer.py)
+    # 반환: (컨텍스트, 실제로 들어간 청크의 검색 순번 목록) → 근거는 이 청크들만
+    return context_packer.pack(docs)
+
+
+def citations_from_docs(docs, used: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """
+    검색 근거 목록 (스트리밍 응답에서 답변 토큰보다 먼저 전송)
+    - used: 컨텍스트에 들어간 청크의 검색 순번(1부터). 주면 그 청크만 (예산/중복으로 빠진 청크는 모델이 보지 않음)
+    """
+    keep = set(used) if used is not None else None
+    out: List[Dict[str, Any]] = []
     for i, d in enumerate(docs, 1):
-        src = d.metadata.get("source") if hasattr(d, "metadata") else None
-        page = d.metadata.get("page") if hasattr(d, "metadata") else None
-        header = f"[Doc#{i} | source={src or 'N/A'} | page={page or 'N/A'}]"
-        context_blocks.append(f"{header}\n{d.page_content}")
+        if keep is not None and i not in keep:
+            continue
+        md = getattr(d, "metadata", {}) or {}
+        out.append({
+            "doc": i,
+            "document_id": md.get("document_id"),
+            "source": md.get("source"),
+            "page": md.get("page"),
+            "section": md.get("section"),
+            "chunk_id": md.get("chunk_id"),
+            "snippet": d.page_content[:200],
+        })
+    return out
 
-    context = "\n\n------\n\n".join(context_blocks)
-    context = _dedup_lines(context)
 
-    answer = qa_chain.invoke({"context": context, "question": question})
-    return {"answer": answer}
+@traceable  # ★ 이 1줄만 추가
+# 10) Runnable: QA + Retrieval
+def qa_with_retrieval(state):
+    """
+    state 요구:
+    - user_input: str (질문)
+    - retriever: BaseRetriever-like
+    - meta: dict(optional) (문서명/저자/페이지 등 넣으면 UX 좋음)
+    - top_k: int(optional)
+    반환: {"answer": str, "grounded": bool, "citations": [...]}
+    - grounded=False: 검색 단계 안내/오류 문구 (LLM 답변 아님 → 답변 캐시/히스토리에 저장하지 않음)
+    - citations: 컨텍스트에 실제로 들어간 청크만
+    """
+    docs, notice = _retrieve_docs(state)
+    if notice:
+        return {"answer": notice, "grounded": False, "citations": []}
+
+    context, used = _build_context(docs)
+    answer = qa_chain.invoke({"context": context, "question": state.get("user_input", "")})
+    return {"answer": answer, "grounded": True, "citations": citations_from_docs(docs, used)}
 
 
 qa_agent = RunnableLambda(qa_with_retrieval)
+
+
+def answer_from_docs(question: str, docs) -> Dict[str, Any]:
+    """
+    이미 검색된 문서들로 답변 생성 (코퍼스 검색 등 retriever 밖에서 문서를 모은 경우)
+    반환: {"answer": str, "citations": [...]} (citations는 컨텍스트에 들어간 청크만)
+    """
+    if not docs:
+        return {"answer": NO_DOCS_NOTICE, "citations": []}
+    context, used = _build_context(docs)
+    answer = qa_chain.invoke({"context": context, "question": question})
+    return {"answer": answer, "citations": citations_from_docs(docs, used)}
+
+
+def answer_many(questions: List[str], docs_list: List[List[Any]]) -> List[Optional[str]]:
+    """
+    배치 QA: 질문별 검색 결과로 qa_chain을 동시에 호출 (QA_BATCH_CONCURRENCY 제한).
+    검색 결과가 없는 질문은 LLM 호출 없이 None (호출 측이 NO_DOCS_NOTICE로 응답, 캐시/저장 제외).
+    """
+    todo = [i for i, docs in enumerate(docs_list) if docs]
+    outputs = qa_chain.batch(
+        [{"context": _build_context(docs_list[i])[0], "question": questions[i]} for i in todo],
+        config={"max_concurrency": QA_BATCH_CONCURRENCY},
+    ) if todo else []
+    answers: List[Optional[str]] = [None] * len(questions)
+    for i, out in zip(todo, outputs):
+        answers[i] = out
+    return answers
+
+
+def stream_qa(state):
+    """
+    스트리밍 QA 제너레이터. 이벤트를 순서대로 yield:
+    1) {"event": "citations", "data": [...]}  ← 컨텍스트 구성 직후 (LLM 호출 전, 컨텍스트에 들어간 청크만)
+    2) {"event": "token", "data": "..."}      ← qa_llm 토큰 도착 시마다
+    검색 단계 안내 메시지(질문 없음/결과 없음/검색 오류)는 notice 이벤트 하나로 전달
+    (LLM 답변이 아님 → 호출 측은 답변 캐시/히스토리에 저장하지 않음).
+    """
+    docs, notice = _retrieve_docs(state)
+    if notice:
+        yield {"event": "citations", "data": []}
+        yield {"event": "notice", "data": notice}
+        return
+
+    context, used = _build_context(docs)
+    yield {"event": "citations", "data": citations_from_docs(docs, used)}
+    for token in qa_chain.stream({"context": context, "question": state.get("user_input", "")}):
+        if token:
+            yield {"event": "token", "data": token}
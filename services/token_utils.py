@@ -0,0 +1,35 @@
+# services/token_utils.py
+# 토큰 수 계산 유틸 (배치 크기/프롬프트 예산 계산용)
+# - tiktoken이 있으면 모델 토크나이저로 정확히 계산
+# - 없거나 인코딩을 불러올 수 없으면 UTF-8 바이트 기반 근사치 사용 (한글 1자 ≈ 1토큰 수준)
+
+from functools import lru_cache
+from typing import Any, Optional
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken은 langchain_openai 의존성
+    tiktoken = None
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Optional[Any]:
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # 인코딩 파일을 받을 수 없는 환경(오프라인 등) → 근사치 사용
+        return None
+
+
+def count_tokens(text: str, model: str = "text-embedding-3-large") -> int:
+    if not text:
+        return 0
+    enc = _encoding(model)
+    if enc is None:
+        return max(1, len(text.encode("utf-8")) // 3)
+    return len(enc.encode(text, disallowed_special=()))
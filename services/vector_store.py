@@ -0,0 +1,259 @@
+# services/vector_store.py
+# ------------------------------------------------------------
+# 압축 벡터 저장 모드 + 정확 벡터 재채점(rescoring)
+# - VECTOR_STORAGE:
+#     flat : float32 그대로 (기존과 동일, 3072차원 ≈ 12KB/청크)
+#     fp16 : float16 스칼라 양자화 (2배 절감)
+#     sq8  : int8 스칼라 양자화 (4배 절감)
+#     pq   : product quantization (코드 VECTOR_PQ_M 바이트/청크 + 코드북 2^nbits × d × 4 바이트)
+#            코드북 크기는 청크 수와 무관 (3072차원, nbits=8이면 약 3MB)
+#            → 문서 하나(청크 수백 개) 단위에서는 코드북이 코드 절감분보다 커서 sq8보다 큼
+#            → 코드북 포함 크기가 sq8 이상이면 sq8로 대체 (대략 청크 1000개 이상부터 pq가 이득)
+# - 압축 인덱스로 fetch_k 후보를 뽑고, 디스크(mmap)의 float32 정확 벡터로 점수/MMR 재계산
+#   → 상주 메모리는 압축 코드 크기, recall은 flat에 근접
+# - EMBED_SEARCH_DIM (Matryoshka 2단계 검색):
+#     text-embedding-3 계열은 앞쪽 차원만 잘라 재정규화해도 의미가 보존됨
+#     → 256/512차원 인덱스로 fetch_k 후보를 찾고, 3072차원 정확 벡터로 재순위(MMR)
+#     → 상주 인덱스의 검색/메모리 비용이 짧은 차원에 비례 (0이면 사용 안 함)
+# - lexical: 같은 청크 순서의 BM25 역색인 (services/lexical_index, 하이브리드 검색용)
+# 측정: scripts/bench_vector_storage.py
+# ------------------------------------------------------------
+
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+
+from services.lexical_index import BM25Index
+
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "flat")       # flat | fp16 | sq8 | pq
+VECTOR_RESCORE = os.getenv("VECTOR_RESCORE", "1") == "1"   # 정확 벡터로 후보 재채점
+VECTOR_PQ_M = int(os.getenv("VECTOR_PQ_M", "768"))         # PQ 서브양자화기 수 (= 청크당 바이트)
+EMBED_SEARCH_DIM = int(os.getenv("EMBED_SEARCH_DIM", "0"))  # 1차 후보 검색 차원 (예: 256, 512)
+
+
+def truncate_normalize(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """앞쪽 dim 차원만 남기고 L2 재정규화 (Matryoshka 표현)"""
+    short = np.ascontiguousarray(vectors[..., :dim], dtype=np.float32)
+    norms = np.linalg.norm(short, axis=-1, keepdims=True)
+    return short / np.where(norms == 0, 1.0, norms)
+
+
+def pq_nbytes(n: int, d: int, m: int, nbits: int) -> int:
+    """PQ 인덱스 상주 크기: 코드(n × m × nbits / 8) + 코드북(2^nbits × d × float32)"""
+    return n * ((m * nbits + 7) // 8) + (2 ** nbits) * d * 4
+
+
+def sq8_nbytes(n: int, d: int) -> int:
+    """sq8 인덱스 상주 크기: 코드(n × d) + 차원별 범위(vmin/vdiff, 2 × d × float32)"""
+    return n * d + 2 * d * 4
+
+
+def index_nbytes(index: Any) -> int:
+    """
+    FAISS 인덱스 상주 크기 (코드 + 학습 파라미터)
+    - sa_code_size × ntotal은 코드만 셈 → PQ 코드북/SQ 범위를 더함
+    """
+    index = faiss.downcast_index(index)
+    try:
+        code_size = index.sa_code_size()
+    except Exception:
+        code_size = index.d * 4
+    total = int(index.ntotal) * int(code_size)
+    if isinstance(index, faiss.IndexPQ):
+        total += index.pq.centroids.size() * 4
+    elif isinstance(index, faiss.IndexScalarQuantizer):
+        total += index.sq.trained.size() * 4
+    return int(total)
+
+
+def storage_mode(index: Any) -> str:
+    """실제 인덱스 종류 (pq 요청이 sq8로 대체된 경우 등)"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def build_faiss_index(vectors: np.ndarray, storage: str = VECTOR_STORAGE) -> Any:
+    """저장 모드에 맞는 FAISS 인덱스 생성 + 학습 + 추가 (L2 거리, LangChain FAISS 기본과 동일)"""
+    n, d = vectors.shape
+    if storage == "fp16":
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif storage == "sq8":
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif storage == "pq":
+        # PQ 코드북 학습에는 2^nbits개 이상의 벡터가 필요 → 청크가 적은 문서는 nbits를 줄이고,
+        # 그래도 부족하거나 코드북 포함 크기가 sq8보다 크면 sq8로 대체
+        m = VECTOR_PQ_M if d % VECTOR_PQ_M == 0 else next(x for x in range(min(VECTOR_PQ_M, d), 0, -1) if d % x == 0)
+        nbits = min(8, int(np.log2(max(n, 1))))
+        if nbits < 4 or pq_nbytes(n, d, m, nbits) >= sq8_nbytes(n, d):
+            return build_faiss_index(vectors, "sq8")
+        index = faiss.IndexPQ(d, m, nbits, faiss.METRIC_L2)
+    else:
+        index = faiss.IndexFlatL2(d)
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+class RescoringFAISS(FAISS):
+    """
+    압축 인덱스 + 정확 벡터 재채점을 지원하는 FAISS 벡터스토어.
+    - exact_vectors: 인덱스 순서와 같은 float32 행렬 (np.ndarray 또는 디스크 np.memmap)
+    - exact_vectors가 없거나 rescore=False면 기본 FAISS와 동일하게 동작
+    """
+
+    def __init__(self, *args: Any, exact_vectors: Optional[np.ndarray] = None,
+                 rescore: bool = VECTOR_RESCORE, storage: str = "flat",
+                 search_dim: int = 0, lexical: Optional[BM25Index] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.exact_vectors = exact_vectors
+        self.rescore = rescore
+        self.storage = storage
+        self.search_dim = search_dim  # >0이면 인덱스는 축소 차원, exact_vectors는 전체 차원
+        self.lexical = lexical        # 인덱스 위치와 같은 순서의 BM25 역색인 (없으면 벡터 검색만)
+
+    def _rescoring(self, filter: Any) -> bool:
+        if self.search_dim:
+            # 축소 차원 인덱스는 전체 차원 질의를 받을 수 없으므로 항상 재순위 경로 사용
+            if filter is not None:
+                raise ValueError("EMBED_SEARCH_DIM 모드에서는 metadata filter를 지원하지 않습니다.")
+            return True
+        return self.rescore and self.exact_vectors is not None and filter is None
+
+    def _candidates(self, embedding: List[float], fetch_k: int) -> np.ndarray:
+        query = np.array([embedding], dtype=np.float32)
+        if self.search_dim:
+            query = truncate_normalize(query, self.search_dim)
+        _, indices = self.index.search(query, fetch_k)
+        return np.array([i for i in indices[0] if i != -1], dtype=np.int64)
+
+    def _doc(self, i: int) -> Document:
+        _id = self.index_to_docstore_id[int(i)]
+        doc = self.docstore.search(_id)
+        if not isinstance(doc, Document):
+            raise ValueError(f"Could not find document for id {_id}, got {doc}")
+        return doc
+
+    def _exact_l2(self, query: np.ndarray, cand: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # memmap이면 후보 행만 디스크에서 읽힘
+        exact = np.asarray(self.exact_vectors[cand], dtype=np.float32)
+        return exact, np.sum((exact - query) ** 2, axis=1)
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Any] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        if not self._rescoring(filter):
+            return super().similarity_search_with_score_by_vector(embedding, k, filter=filter, fetch_k=fetch_k, **kwargs)
+        query = np.asarray(embedding, dtype=np.float32)
+        cand = self._candidates(embedding, max(fetch_k, k * 4))
+        if cand.size == 0:
+            return []
+        _, dists = self._exact_l2(query, cand)
+        top = np.argsort(dists)[:k]
+        return [(self._doc(cand[i]), float(dists[i])) for i in top]
+
+    def max_marginal_relevance_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        *,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Any] = None,
+    ) -> List[Tuple[Document, float]]:
+        if not self._rescoring(filter):
+            return super().max_marginal_relevance_search_with_score_by_vector(
+                embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter
+            )
+        query = np.asarray(embedding, dtype=np.float32)
+        cand = self._candidates(embedding, fetch_k)
+        if cand.size == 0:
+            return []
+        exact, dists = self._exact_l2(query, cand)
+        selected = maximal_marginal_relevance(query[None, :], list(exact), k=k, lambda_mult=lambda_mult)
+        return [(self._doc(cand[i]), float(dists[i])) for i in selected]
+
+
+    def max_marginal_relevance_search_batch_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+    ) -> List[List[Document]]:
+        """
+        여러 질의 벡터의 MMR 검색을 인덱스 search 1회로 처리 (배치 QA용).
+        - 후보: (질의 수 × 차원) 행렬로 한 번에 검색
+        - 재채점/MMR: 정확 벡터가 있으면 그것으로, 없으면 인덱스에서 복원한 벡터로 질의별 계산
+        """
+        if not embeddings:
+            return []
+        queries = np.asarray(embeddings, dtype=np.float32)
+        first = truncate_normalize(queries, self.search_dim) if self.search_dim else queries
+        _, indices = self.index.search(first, max(fetch_k, k))
+
+        results: List[List[Document]] = []
+        for query, row in zip(queries, indices):
+            cand = row[row != -1]
+            if cand.size == 0:
+                results.append([])
+                continue
+            if self.exact_vectors is not None:
+                exact = np.asarray(self.exact_vectors[cand], dtype=np.float32)
+            else:
+                exact = np.vstack([self.index.reconstruct(int(i)) for i in cand])
+            selected = maximal_marginal_relevance(query[None, :], list(exact), k=k, lambda_mult=lambda_mult)
+            results.append([self._doc(cand[i]) for i in selected])
+        return results
+
+
+def build_vectorstore(
+    texts: List[str],
+    vectors: List[List[float]],
+    metadatas: List[Dict[str, Any]],
+    embedding: Any,
+    storage: str = VECTOR_STORAGE,
+    search_dim: int = EMBED_SEARCH_DIM,
+) -> RescoringFAISS:
+    """
+    청크/벡터로 저장 모드에 맞는 벡터스토어 구성
+    - flat이 아니거나 search_dim을 쓰면 전체 차원 정확 벡터를 재채점용으로 보관
+    - 청크 텍스트로 BM25 역색인도 함께 생성 (하이브리드 검색용)
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    search_dim = search_dim if 0 < search_dim < matrix.shape[1] else 0
+    first_pass = truncate_normalize(matrix, search_dim) if search_dim else matrix
+    index = build_faiss_index(first_pass, storage)
+    storage = storage_mode(index)
+
+    ids = [str(uuid.uuid4()) for _ in texts]
+    docstore = InMemoryDocstore({
+        _id: Document(page_content=t, metadata=md) for _id, t, md in zip(ids, texts, metadatas)
+    })
+    return RescoringFAISS(
+        embedding_function=embedding,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(ids)),
+        exact_vectors=None if (storage == "flat" and not search_dim) else matrix,
+        storage=storage,
+        search_dim=search_dim,
+        lexical=BM25Index(texts),
+    )
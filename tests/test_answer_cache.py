@@ -0,0 +1,65 @@
+# tests/test_answer_cache.py
+# AnswerCache: 조회만으로 버킷 생성 안 함, 전체 항목 상한(문서 LRU), TTL, semantic 적중
+
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from services.answer_cache import AnswerCache  # noqa: E402
+
+
+def test_lookup_miss_does_not_create_bucket():
+    cache = AnswerCache()
+    for doc_id in range(100):
+        hit, _ = cache.lookup(doc_id, "핵심 기여가 뭐야?")
+        assert hit is None
+    stats = cache.stats()
+    assert stats["documents"] == 0 and stats["entries"] == 0 and stats["misses"] == 100
+
+
+def test_exact_hit_ignores_punctuation():
+    cache = AnswerCache()
+    cache.put(1, "핵심 기여가 뭐야?", "A")
+    hit, _ = cache.lookup(1, "핵심 기여가 뭐야")
+    assert hit["answer"] == "A" and hit["match"] == "exact"
+
+
+def test_global_cap_evicts_least_recently_used_document_first():
+    cache = AnswerCache(max_per_doc=10, max_entries=4)
+    cache.put(1, "q1", "a")
+    cache.put(1, "q2", "a")
+    cache.put(2, "q1", "b")
+    cache.put(2, "q2", "b")
+    cache.lookup(1, "q1")            # 문서 1을 최근 사용으로
+    cache.put(3, "q1", "c")          # 문서 2의 가장 오래된 항목 축출
+    cache.put(3, "q2", "c")          # 문서 2의 나머지 → 문서 2 버킷 제거
+
+    stats = cache.stats()
+    assert stats["entries"] == 4 and stats["evictions"] == 2
+    assert stats["documents"] == 2
+    assert cache.lookup(2, "q2")[0] is None
+    assert cache.lookup(1, "q2")[0]["answer"] == "a"
+
+
+def test_ttl_expiry_drops_entries_and_empty_bucket():
+    cache = AnswerCache(ttl_sec=60)
+    cache.put(1, "old", "a", ts=time.time() - 120)
+    assert cache.lookup(1, "old")[0] is None
+    assert cache.stats()["documents"] == 0 and cache.stats()["entries"] == 0
+
+
+def test_warm_skips_expired_rows():
+    cache = AnswerCache(ttl_sec=60)
+    now = time.time()
+    cache.warm(1, [("old", "a", now - 120), ("new", "b", now)])
+    assert cache.is_warm(1) and cache.stats()["entries"] == 1
+
+
+def test_semantic_hit_uses_stored_vector():
+    cache = AnswerCache()
+    cache.put(1, "what is the main contribution", "A", query_vec=[1.0, 0.0, 0.0])
+    hit, qvec = cache.lookup(1, "main contribution?", embed_fn=lambda _: [0.99, 0.01, 0.0])
+    assert hit["match"] == "semantic" and hit["answer"] == "A"
+    assert cache.lookup(1, "unrelated", embed_fn=lambda _: [0.0, 1.0, 0.0])[0] is None
@@ -0,0 +1,123 @@
+# tests/test_context_packer.py
+# ContextPacker: 청크 겹침 제거, 유사 문장 규칙, 토큰 예산 자르기
+
+from dataclasses import dataclass, field
+
+from services.context_packer import BLOCK_SEPARATOR, ContextPacker, split_sentences
+from services.token_utils import count_tokens
+
+
+@dataclass
+class Doc:
+    page_content: str
+    metadata: dict = field(default_factory=lambda: {"document_id": 1, "source": "paper.pdf", "page": 1})
+
+
+def _bodies(context: str):
+    return [block.split("\n", 1)[1] for block in context.split(BLOCK_SEPARATOR)]
+
+
+def test_split_sentences_keeps_line_wrapped_sentence_together():
+    text = "The encoder is composed of a stack\nof N = 6 identical layers. Each layer has two sub-layers."
+    assert split_sentences(text) == [
+        "The encoder is composed of a stack of N = 6 identical layers.",
+        "Each layer has two sub-layers.",
+    ]
+
+
+def test_neighbour_chunk_overlap_is_stripped():
+    shared = "Dropout is applied to the output of each sub-layer before it is added."
+    first = "We employ residual connections around each of the two sub-layers. " + shared
+    second = shared + " We also apply dropout to the sums of the embeddings."
+    packer = ContextPacker(budget=10_000)
+
+    context, used = packer.pack([Doc(first), Doc(second)])
+
+    assert used == [1, 2]
+    assert _bodies(context)[1] == "We also apply dropout to the sums of the embeddings."
+    assert context.count(shared) == 1
+    assert packer.stats()["overlap_chars"] == len(shared)
+
+
+def test_overlap_is_not_stripped_from_other_sources():
+    shared = "Dropout is applied to the output of each sub-layer before it is added."
+    other = Doc(shared + " Other paper.", {"document_id": 2, "source": "other.pdf", "page": 3})
+    packer = ContextPacker(budget=10_000)
+
+    context, used = packer.pack([Doc("Intro. " + shared), other])
+
+    assert used == [1, 2]
+    assert _bodies(context)[1] == "Other paper."  # 겹침 자르기가 아니라 같은 문장 중복으로 생략
+    assert packer.stats()["overlap_chars"] == 0
+
+
+def test_sentences_differing_only_in_numbers_are_kept():
+    docs = [
+        Doc("On WMT 2014 English-to-German the big model achieves a BLEU score of 28.4 points."),
+        Doc("On WMT 2014 English-to-German the big model achieves a BLEU score of 27.3 points."),
+    ]
+    context, used = ContextPacker(budget=10_000).pack(docs)
+    assert used == [1, 2]
+    assert "28.4" in context and "27.3" in context
+
+
+def test_distinct_facts_survive_packing():
+    docs = [
+        Doc("The big model uses 6 layers."),
+        Doc("Table 2 summarizes results.\n28.4\n(2017).\nThe base model uses 6 layers."),
+    ]
+    context, used = ContextPacker(budget=10_000).pack(docs)
+    assert used == [1, 2]
+    for fact in ("The big model uses 6 layers.", "Table 2 summarizes results.", "28.4", "(2017).",
+                 "The base model uses 6 layers."):
+        assert fact in context
+
+
+def test_near_duplicates_and_long_fragments_are_dropped():
+    sentence = "Multi-head attention allows the model to jointly attend to information from different subspaces."
+    docs = [
+        Doc(sentence),
+        Doc(sentence.replace("jointly ", "")),          # 유사 문장 (숫자 동일)
+        Doc("information from different subspaces.", {"document_id": 2, "source": "b.pdf"}),  # 잘린 조각
+        Doc("Attention was used."),                      # 짧은 새 문장
+    ]
+    packer = ContextPacker(budget=10_000)
+    context, used = packer.pack(docs)
+    assert used == [1, 4]
+    assert packer.stats()["dropped_sentences"] == 2
+
+
+def test_short_fragment_inside_longer_sentence_is_kept():
+    docs = [Doc("The model reaches 28.4 BLEU on the WMT 2014 English-German task."), Doc("28.4")]
+    context, used = ContextPacker(budget=10_000).pack(docs)
+    assert used == [1, 2]
+
+
+def test_budget_truncates_last_chunk_by_sentence():
+    sentences = [f"Sentence number {i} describes a separate experimental setting in detail." for i in range(40)]
+    first = Doc(" ".join(sentences[:20]))
+    second = Doc(" ".join(sentences[20:]), {"document_id": 1, "source": "paper.pdf", "page": 2})
+    packer = ContextPacker(budget=10_000)
+    full, _ = packer.pack([first, second])
+    budget = count_tokens(full, model=packer.model) * 3 // 4
+
+    context, used = packer.pack([first, second], budget=budget)
+
+    assert used == [1, 2]
+    assert count_tokens(context, model=packer.model) <= budget
+    body = _bodies(context)[1].split("\n")
+    assert 0 < len(body) < 20 and body == sentences[20:20 + len(body)]
+    assert packer.stats()["truncated_docs"] >= 1
+
+
+def test_chunks_past_budget_are_skipped_and_not_used_for_overlap():
+    shared = "Positional encodings have the same dimension as the embeddings so they can be summed."
+    big = Doc(" ".join(f"Filler sentence {i} about training details and schedules." for i in range(200)) + " " + shared)
+    after = Doc(shared + " Sinusoidal encodings were chosen.")
+    packer = ContextPacker(budget=10_000)
+    small_budget = count_tokens(after.page_content, model=packer.model) + 40
+
+    context, used = packer.pack([after, big], budget=small_budget)
+
+    assert used == [1]
+    assert shared in context
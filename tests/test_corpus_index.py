@@ -0,0 +1,105 @@
+# tests/test_corpus_index.py
+# CorpusIndex: 축소 차원 sq8 샤드, 재등록 시 그래프 재구성, 메모리 예산에 따른 샤드 내림/재로드, 저널 복구
+
+from dataclasses import dataclass, field
+
+import pytest
+
+np = pytest.importorskip("numpy")
+faiss = pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from services import corpus_index as ci  # noqa: E402
+
+
+@dataclass
+class Doc:
+    page_content: str
+    metadata: dict = field(default_factory=dict)
+
+
+class FakeVectorStore:
+    """add_document가 읽는 속성만 가진 벡터스토어 (index / docstore / index_to_docstore_id)"""
+
+    def __init__(self, vectors, texts):
+        self.index = faiss.IndexFlatL2(vectors.shape[1])
+        self.index.add(vectors)
+        self.exact_vectors = vectors
+        self._docs = {str(i): Doc(t, {"page": i}) for i, t in enumerate(texts)}
+        self.index_to_docstore_id = {i: str(i) for i in range(len(texts))}
+        self.docstore = self
+
+    def search(self, _id):
+        return self._docs[_id]
+
+
+@pytest.fixture
+def corpus_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ci, "CORPUS_DIR", str(tmp_path / "corpus"))
+    monkeypatch.setattr(ci, "CORPUS_DIM", 32)
+    monkeypatch.setattr(ci, "CORPUS_STORAGE", "sq8")
+    return tmp_path
+
+
+def _vectors(seed, n=40, d=64):
+    return np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+
+
+def test_search_uses_reduced_dim_sq8_and_finds_own_chunk(corpus_dir):
+    index = ci.CorpusIndex()
+    vectors = _vectors(0)
+    index.add_document(1, "NLP", FakeVectorStore(vectors, [f"c{i}" for i in range(40)]))
+
+    shard = index._shards[ci._shard_key("NLP")]
+    assert shard.dim == 32
+    assert isinstance(faiss.downcast_index(shard.index.index), faiss.IndexHNSWSQ)
+    hits = index.search(vectors[7].tolist(), k=3)
+    assert hits[0]["text"] == "c7" and hits[0]["document_id"] == 1
+    # 3072→32차원 sq8: 청크당 상주 크기가 float32 전체 차원보다 훨씬 작음
+    assert shard.nbytes() - shard.text_bytes < 40 * 64 * 4 + 40 * 16 + 40 * ci.CORPUS_HNSW_M * 2 * 4
+
+
+def test_readding_document_rebuilds_graph_without_old_vectors(corpus_dir):
+    index = ci.CorpusIndex()
+    index.add_document(1, "NLP", FakeVectorStore(_vectors(0), [f"old{i}" for i in range(40)]))
+    index.add_document(2, "NLP", FakeVectorStore(_vectors(1, n=10), [f"other{i}" for i in range(10)]))
+    new = _vectors(2, n=20)
+    index.add_document(1, "NLP", FakeVectorStore(new, [f"new{i}" for i in range(20)]))
+
+    shard = index._shards[ci._shard_key("NLP")]
+    assert shard.index.ntotal == 30 and shard.tombstones == 0
+    hits = index.search(new[3].tolist(), k=30)
+    assert hits[0]["text"] == "new3"
+    assert not any(h["text"].startswith("old") for h in hits)
+
+
+def test_budget_unloads_least_recently_used_shard_and_reloads_on_search(corpus_dir):
+    index = ci.CorpusIndex(max_bytes=1)
+    a, b = _vectors(0), _vectors(1)
+    index.add_document(1, "NLP", FakeVectorStore(a, [f"a{i}" for i in range(40)]))
+    index.add_document(2, "Vision", FakeVectorStore(b, [f"b{i}" for i in range(40)]))
+
+    stats = index.stats()
+    assert stats["resident_shards"] == 1 and stats["shards"] == 2 and stats["unloads"] == 1
+    assert list(index._shards) == [ci._shard_key("Vision")]
+
+    hits = index.search(a[5].tolist(), k=1, domain="NLP")
+    assert hits[0]["text"] == "a5"
+    assert index.stats()["reloads"] == 1
+    assert list(index._shards) == [ci._shard_key("NLP")]
+
+    # 내려간 샤드에 대한 쓰기도 다시 로드해서 반영
+    index.remove_document(2)
+    assert index.search(b[0].tolist(), k=1, domain="Vision") == []
+
+
+def test_restart_replays_journal(corpus_dir):
+    index = ci.CorpusIndex()
+    vectors = _vectors(0)
+    index.add_document(1, "NLP", FakeVectorStore(vectors, [f"c{i}" for i in range(40)]))
+    index.add_document(2, "NLP", FakeVectorStore(_vectors(1, n=5), [f"d{i}" for i in range(5)]))
+    index.remove_document(2)
+
+    reopened = ci.CorpusIndex()
+    assert reopened.has_document(1) and not reopened.has_document(2)
+    assert reopened.search(vectors[11].tolist(), k=1)[0]["text"] == "c11"
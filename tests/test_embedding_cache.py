@@ -0,0 +1,123 @@
+# tests/test_embedding_cache.py
+# QueryEmbeddingCache: 동시 질문 배치 합치기 + LRU 적중/축출
+
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from services.embedding_cache import QueryEmbeddingCache  # noqa: E402
+
+
+class FakeEmbeddings:
+    """embed_documents 호출 기록 (텍스트 길이를 벡터로 반환)"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def test_concurrent_distinct_queries_share_one_batch():
+    inner = FakeEmbeddings()
+    n = 16
+    cache = QueryEmbeddingCache(inner, window_ms=500, max_batch=64)
+    barrier = threading.Barrier(n)
+    results = {}
+
+    def worker(i):
+        q = f"질문 {i}" + "?" * i
+        barrier.wait()
+        results[q] = cache.embed(q)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(inner.calls) == 1
+    assert sorted(inner.calls[0]) == sorted(results)
+    for q, vec in results.items():
+        assert vec == [float(len(q)), 1.0]
+    assert cache.stats()["batches"] == 1
+
+
+def test_full_batch_flushes_without_waiting_for_window():
+    inner = FakeEmbeddings()
+    n = 4
+    cache = QueryEmbeddingCache(inner, window_ms=60_000, max_batch=n)
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        cache.embed(f"q{i}")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    assert not any(t.is_alive() for t in threads)
+    assert [sorted(c) for c in inner.calls] == [[f"q{i}" for i in range(n)]]
+
+
+def test_lru_hit_skips_embedding_and_normalizes_whitespace():
+    inner = FakeEmbeddings()
+    cache = QueryEmbeddingCache(inner, window_ms=0)
+
+    first = cache.embed("BLEU 점수는?")
+    second = cache.embed("  BLEU   점수는? ")
+
+    assert first == second
+    assert len(inner.calls) == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_lru_evicts_least_recently_used():
+    inner = FakeEmbeddings()
+    cache = QueryEmbeddingCache(inner, max_entries=2, window_ms=0)
+
+    cache.embed("a")
+    cache.embed("b")
+    cache.embed("a")      # a를 최근 사용으로
+    cache.embed("c")      # b 축출
+    cache.embed("a")
+    cache.embed("b")
+
+    assert [c[0] for c in inner.calls] == ["a", "b", "c", "b"]
+
+
+def test_embed_many_dedupes_and_reuses_lru():
+    inner = FakeEmbeddings()
+    cache = QueryEmbeddingCache(inner, window_ms=0)
+    cache.embed("x")
+
+    vectors = cache.embed_many(["x", "yy", "yy", "zzz"])
+
+    assert inner.calls[1:] == [["yy", "zzz"]]
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+
+
+def test_failed_batch_propagates_and_is_not_cached():
+    class Failing(FakeEmbeddings):
+        def embed_documents(self, texts):
+            super().embed_documents(texts)
+            raise RuntimeError("429")
+
+    inner = Failing()
+    cache = QueryEmbeddingCache(inner, window_ms=0)
+    for _ in range(2):
+        try:
+            cache.embed("q")
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("expected RuntimeError")
+    assert len(inner.calls) == 2
@@ -0,0 +1,107 @@
+# tests/test_hybrid_retriever.py
+# RRF 병합, BM25 전용 질의 판별, 임베딩 생략 경로 (단건/배치)
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document  # noqa: E402
+
+from services.hybrid_retriever import HybridRetriever, is_lexical_query, reciprocal_rank_fusion  # noqa: E402
+from services.lexical_index import BM25Index  # noqa: E402
+
+TEXTS = [
+    "ResNet-50 reaches 76.1 top-1 accuracy on ImageNet.",
+    "The Transformer relies entirely on self-attention.",
+    "BLEU 28.4 on WMT 2014 English-German.",
+    "Adam optimizer with warmup steps.",
+]
+
+
+class FakeVectorStore:
+    """BM25 + 고정 순서 '벡터' 검색, 임베딩/벡터 검색 호출 기록"""
+
+    def __init__(self, dense_order):
+        self.docs = [Document(page_content=t, metadata={"i": i}) for i, t in enumerate(TEXTS)]
+        self.index_to_docstore_id = {i: str(i) for i in range(len(TEXTS))}
+        self.lexical = BM25Index(TEXTS)
+        self.dense_order = dense_order
+        self.dense_calls = 0
+        self.batch_vectors = None
+
+    @property
+    def docstore(self):
+        return self
+
+    def search(self, _id):
+        return self.docs[int(_id)]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5):
+        self.dense_calls += 1
+        return [self.docs[i] for i in self.dense_order[:k]]
+
+    def max_marginal_relevance_search_batch_by_vectors(self, vectors, k=4, fetch_k=20, lambda_mult=0.5):
+        self.batch_vectors = vectors
+        return [[self.docs[i] for i in self.dense_order[:k]] for _ in vectors]
+
+
+def _ids(docs):
+    return [d.metadata["i"] for d in docs]
+
+
+@pytest.mark.parametrize("question, expected", [
+    ('"self-attention"', True),
+    ("ResNet-50", True),
+    ("BLEU 28.4", True),
+    ("GPT-4o ResNet-50 BLEU WMT", True),
+    ("GPT-4o ResNet-50 BLEU WMT 2014", False),   # LEXICAL_QUERY_MAX_TERMS 초과
+    ("what is attention", False),                 # 소문자 일반 단어
+    ("트랜스포머 구조", False),
+    ("", False),
+])
+def test_is_lexical_query(question, expected):
+    assert is_lexical_query(question) is expected
+
+
+def test_rrf_rewards_documents_ranked_in_both_lists():
+    a, b, c = (Document(page_content=t) for t in "abc")
+    fused = reciprocal_rank_fusion([[a, b, c], [b, c]], k=3)
+    assert [d.page_content for d in fused] == ["b", "c", "a"]
+    assert [d.page_content for d in reciprocal_rank_fusion([[a, b], [a, b]], k=1)] == ["a"]
+
+
+def test_lexical_query_skips_dense_search():
+    vs = FakeVectorStore(dense_order=[3, 1, 0, 2])
+    retriever = HybridRetriever(vectorstore=vs, k=2)
+    docs = retriever.invoke("ResNet-50")
+    assert _ids(docs)[0] == 0 and vs.dense_calls == 0
+
+
+def test_lexical_query_without_bm25_hit_falls_back_to_dense():
+    vs = FakeVectorStore(dense_order=[3, 1, 0, 2])
+    docs = HybridRetriever(vectorstore=vs, k=2).invoke("GPT-4o")
+    assert _ids(docs) == [3, 1] and vs.dense_calls == 1
+
+
+def test_hybrid_query_fuses_bm25_and_dense():
+    vs = FakeVectorStore(dense_order=[1, 3, 2, 0])
+    docs = HybridRetriever(vectorstore=vs, k=2).invoke("how does the Transformer use self-attention")
+    assert _ids(docs)[0] == 1 and vs.dense_calls == 1
+
+
+def test_retrieve_many_embeds_only_non_lexical_questions():
+    vs = FakeVectorStore(dense_order=[1, 3, 2, 0])
+    embedded = []
+
+    def embed_many(questions):
+        embedded.extend(questions)
+        return [[0.0] for _ in questions]
+
+    retriever = HybridRetriever(vectorstore=vs, k=2)
+    results = retriever.retrieve_many(["BLEU 28.4", "how is the model optimized", "GPT-4o"], embed_many)
+
+    assert embedded == ["how is the model optimized", "GPT-4o"]   # BM25 결과가 있는 식별자 질의는 임베딩 생략
+    assert _ids(results[0])[0] == 2
+    assert _ids(results[2]) == [1, 3]
+    assert len(vs.batch_vectors) == 2
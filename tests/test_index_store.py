@@ -0,0 +1,103 @@
+# tests/test_index_store.py
+# save_index → load_index(mmap) 왕복, 링크 교체 저장 (동시 읽기 중 덮어쓰기), 삭제
+
+import os
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+faiss = pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from services import index_store  # noqa: E402
+from services.vector_store import build_vectorstore  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_store, "INDEX_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _store(seed=0, n=300, d=32, storage="sq8", search_dim=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, d)).astype(np.float32)
+    texts = [f"chunk {seed}-{i} BLEU {i}" for i in range(n)]
+    return build_vectorstore(texts, vectors, [{"i": i} for i in range(n)], embedding=None,
+                             storage=storage, search_dim=search_dim), vectors
+
+
+@pytest.mark.parametrize("storage, search_dim", [("flat", 0), ("sq8", 0), ("flat", 8)])
+def test_save_load_round_trip(storage, search_dim):
+    store, vectors = _store(storage=storage, search_dim=search_dim)
+    index_store.save_index(1, store)
+
+    loaded = index_store.load_index(1, None)
+    assert loaded.storage == store.storage and loaded.search_dim == store.search_dim
+    assert loaded.index.ntotal == len(vectors)
+    if store.exact_vectors is not None:
+        assert isinstance(loaded.exact_vectors, np.memmap)
+        assert np.array_equal(np.asarray(loaded.exact_vectors), vectors)
+    query = vectors[17].tolist()
+    expected = [d.page_content for d, _ in store.similarity_search_with_score_by_vector(query, k=3)]
+    assert [d.page_content for d, _ in loaded.similarity_search_with_score_by_vector(query, k=3)] == expected
+    assert loaded.lexical.search("BLEU 17", 1)[0][0] == 17
+
+
+def test_missing_index_returns_none():
+    assert not index_store.has_index(5) and index_store.load_index(5, None) is None
+
+
+def test_overwrite_swaps_link_and_removes_old_version(index_dir):
+    index_store.save_index(1, _store(seed=0)[0])
+    index_store.save_index(1, _store(seed=1)[0])
+
+    assert os.path.islink(index_dir / "1")
+    assert sorted(p for p in os.listdir(index_dir) if p.startswith("1.")) == [os.readlink(index_dir / "1")]
+    loaded = index_store.load_index(1, None)
+    assert loaded.docstore.search(loaded.index_to_docstore_id[0]).page_content.startswith("chunk 1-")
+
+
+def test_legacy_directory_is_replaced_by_link(index_dir):
+    store, _ = _store()
+    version = index_store.save_index(1, store)
+    real = os.path.realpath(version)
+    os.unlink(version)
+    os.rename(real, version)             # 이전 형식: faiss_index/1 이 실제 디렉터리
+    assert index_store.load_index(1, None) is not None
+
+    index_store.save_index(1, _store(seed=2)[0])
+    assert os.path.islink(index_dir / "1")
+    assert len([p for p in os.listdir(index_dir) if p.startswith("1.")]) == 1
+
+
+def test_readers_never_see_missing_index_during_overwrite():
+    index_store.save_index(1, _store(seed=0)[0])
+    stop = threading.Event()
+    failures = []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                if index_store.load_index(1, None) is None:
+                    failures.append("missing")
+            except Exception as e:  # pragma: no cover - 실패 시 원인 표시
+                failures.append(repr(e))
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for seed in range(1, 8):
+        index_store.save_index(1, _store(seed=seed)[0])
+    stop.set()
+    for t in threads:
+        t.join()
+    assert failures == []
+
+
+def test_delete_index_removes_link_and_version(index_dir):
+    index_store.save_index(1, _store()[0])
+    index_store.delete_index(1)
+    assert os.listdir(index_dir) == []
+    assert index_store.load_index(1, None) is None
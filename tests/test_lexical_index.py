@@ -0,0 +1,57 @@
+# tests/test_lexical_index.py
+# BM25 토크나이저(조사 제거 + 음절 bigram, 영문/숫자 용어 보존)와 BM25 순위
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from services.lexical_index import BM25Index, tokenize  # noqa: E402
+
+
+def test_korean_josa_is_stripped_and_bigrams_added():
+    assert tokenize("트랜스포머는") == ["트랜스포머", "트랜", "랜스", "스포", "포머"]
+    assert tokenize("모델에서는") == ["모델"]          # 긴 조사(에서는)부터 제거, 2음절 어간은 bigram 없음
+    assert tokenize("데이터를") == ["데이터", "데이", "이터"]
+
+
+def test_josa_only_word_after_identifier_is_dropped():
+    assert tokenize("ResNet-50의 성능") == ["resnet-50", "resnet", "50", "성능"]
+
+
+def test_identifiers_and_numbers_keep_whole_token_and_parts():
+    assert tokenize("GPT-4o") == ["gpt-4o", "gpt", "4o"]
+    assert tokenize("BLEU 28.4") == ["bleu", "28.4", "28", "4"]
+    assert tokenize("") == [] and tokenize(None) == []
+
+
+def test_spacing_variants_share_bigrams():
+    joined = set(tokenize("자연어처리"))
+    spaced = set(tokenize("자연어 처리"))
+    assert {"자연", "연어"} <= joined & spaced
+
+
+def test_bm25_ranks_term_frequency_and_rarity():
+    index = BM25Index([
+        "The model reaches 28.4 BLEU on WMT 2014.",
+        "BLEU BLEU scores are reported for every model.",
+        "Attention is all you need.",
+        "We train the model with Adam.",
+    ])
+    hits = index.search("BLEU", 4)
+    assert [i for i, _ in hits] == [1, 0]
+    assert hits[0][1] > hits[1][1] > 0
+
+    # 희귀 용어(28.4)가 흔한 용어(model)보다 점수에 크게 기여
+    assert index.search("model 28.4", 1)[0][0] == 0
+
+
+def test_bm25_korean_query_matches_inflected_form():
+    index = BM25Index(["트랜스포머는 어텐션만 사용한다.", "합성곱 신경망을 사용한다."])
+    assert index.search("트랜스포머의 구조", 2)[0][0] == 0
+
+
+def test_bm25_no_match_and_empty_index():
+    index = BM25Index(["alpha beta", "gamma"])
+    assert index.search("delta", 3) == []
+    assert BM25Index([]).search("alpha", 3) == []
+    assert index.nbytes() > 0
@@ -0,0 +1,86 @@
+# tests/test_qa_citations.py
+# QA 근거(citations)는 컨텍스트에 실제로 들어간 청크만 — 예산/중복으로 빠진 청크는 제외
+
+import os
+from dataclasses import dataclass, field
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+for name, value in (("AOAI_API_KEY", "test"), ("AOAI_ENDPOINT", "https://example.invalid"),
+                    ("AOAI_DEPLOY_GPT4O", "test")):
+    os.environ.setdefault(name, value)
+
+from services import summarizer  # noqa: E402
+from services.context_packer import ContextPacker  # noqa: E402
+
+
+@dataclass
+class Doc:
+    page_content: str
+    metadata: dict = field(default_factory=dict)
+
+
+class FakeChain:
+    def __init__(self):
+        self.contexts = []
+
+    def invoke(self, inputs):
+        self.contexts.append(inputs["context"])
+        return "answer"
+
+    def stream(self, inputs):
+        self.contexts.append(inputs["context"])
+        yield "answer"
+
+
+class FakeRetriever:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def get_relevant_documents(self, question):
+        return self.docs
+
+
+def _docs():
+    sentence = "The Transformer uses multi-head self-attention in both the encoder and the decoder stacks."
+    filler = " ".join(f"Appendix sentence {i} lists another hyperparameter setting in detail." for i in range(60))
+    return [
+        Doc(sentence, {"document_id": 1, "source": "a.pdf", "page": 1}),
+        Doc(sentence, {"document_id": 2, "source": "b.pdf", "page": 4}),   # 중복 → 생략
+        Doc("Training used 8 P100 GPUs for 3.5 days.", {"document_id": 1, "source": "a.pdf", "page": 7}),
+        Doc(filler, {"document_id": 3, "source": "c.pdf", "page": 2}),     # 예산 초과 → 생략
+    ]
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    fake = FakeChain()
+    monkeypatch.setattr(summarizer, "qa_chain", fake)
+    monkeypatch.setattr(summarizer, "context_packer", ContextPacker(budget=120))
+    return fake
+
+
+def test_answer_from_docs_cites_only_packed_chunks(chain):
+    out = summarizer.answer_from_docs("What does the Transformer use?", _docs())
+
+    assert [c["doc"] for c in out["citations"]] == [1, 3]
+    assert [c["page"] for c in out["citations"]] == [1, 7]
+    for c in out["citations"]:
+        assert f"[Doc#{c['doc']} " in chain.contexts[0]
+    assert "[Doc#2 " not in chain.contexts[0] and "[Doc#4 " not in chain.contexts[0]
+
+
+def test_qa_with_retrieval_and_stream_cite_only_packed_chunks(chain):
+    state = {"user_input": "q", "retriever": FakeRetriever(_docs()), "top_k": 4}
+
+    out = summarizer.qa_with_retrieval(state)
+    events = list(summarizer.stream_qa(state))
+
+    assert [c["doc"] for c in out["citations"]] == [1, 3]
+    assert events[0]["event"] == "citations"
+    assert [c["doc"] for c in events[0]["data"]] == [1, 3]
+
+
+def test_citations_without_used_list_cover_all_docs():
+    assert [c["doc"] for c in summarizer.citations_from_docs(_docs())] == [1, 2, 3, 4]
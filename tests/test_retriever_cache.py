@@ -0,0 +1,159 @@
+# tests/test_retriever_cache.py
+# retriever 캐시: 바이트 예산 LRU 축출, TTL 만료, single-flight (스레드 + asyncio 태스크), 세대 검사
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langchain_community")
+
+from services import retriever_cache as rc  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """모듈 전역 캐시 초기화 + 디스크 인덱스 없음 + 벡터스토어 크기 = 정수 값 그대로"""
+    monkeypatch.setattr(rc, "_RETRIEVER_CACHE", rc.OrderedDict())
+    monkeypatch.setattr(rc, "_STATS", {k: 0 for k in rc._STATS})
+    monkeypatch.setattr(rc, "_INFLIGHT", {})
+    monkeypatch.setattr(rc, "_GENERATION", {})
+    monkeypatch.setattr(rc, "load_index", lambda doc_id, embedding: None)
+    monkeypatch.setattr(rc, "get_embedding_model", lambda: None)
+    monkeypatch.setattr(rc, "estimate_vectorstore_bytes", lambda vs: vs or 0)
+    monkeypatch.setattr(rc, "RETRIEVER_CACHE_TTL_SEC", 0)
+
+
+class CountingBuilder:
+    def __init__(self, delay=0.2):
+        self.calls = 0
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return f"retriever-{self.calls}", 100
+
+
+def test_budget_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(rc, "RETRIEVER_CACHE_MAX_BYTES", 250)
+    rc.set_retriever(1, "r1", 100)
+    rc.set_retriever(2, "r2", 100)
+    assert rc.get_retriever(1) == "r1"   # 1을 최근 사용으로
+    rc.set_retriever(3, "r3", 100)
+
+    assert not rc.has_retriever(2)
+    assert rc.has_retriever(1) and rc.has_retriever(3)
+    stats = rc.cache_stats()
+    assert stats["evictions"] == 1 and stats["resident_bytes"] == 200 and stats["entries"] == 2
+
+
+def test_single_entry_over_budget_is_kept(monkeypatch):
+    monkeypatch.setattr(rc, "RETRIEVER_CACHE_MAX_BYTES", 50)
+    rc.set_retriever(1, "r1", 100)
+    assert rc.has_retriever(1)
+
+
+def test_ttl_expiry(monkeypatch):
+    monkeypatch.setattr(rc, "RETRIEVER_CACHE_TTL_SEC", 10)
+    now = [1000.0]
+    monkeypatch.setattr(rc.time, "time", lambda: now[0])
+    rc.set_retriever(1, "r1", 100)
+    now[0] += 5
+    assert rc.get_retriever(1) == "r1"
+    now[0] += 11
+    assert rc.get_retriever(1) is None   # 만료 → 디스크 인덱스도 없음
+    stats = rc.cache_stats()
+    assert stats["evictions"] == 1 and stats["resident_bytes"] == 0 and stats["misses"] == 1
+
+
+def test_concurrent_get_or_build_builds_once():
+    builder = CountingBuilder()
+    n = 8
+    barrier = threading.Barrier(n)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(rc.get_or_build(7, builder))
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert builder.calls == 1
+    assert results == ["retriever-1"] * n
+    assert rc.cache_stats()["coalesced"] == n - 1
+    assert rc.get_or_build(7, builder) == "retriever-1" and builder.calls == 1
+
+
+def test_builder_error_reaches_every_waiter():
+    def failing():
+        time.sleep(0.1)
+        raise RuntimeError("boom")
+
+    errors = []
+
+    def worker():
+        try:
+            rc.get_or_build(3, failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == ["boom"] * 4
+    assert not rc.has_retriever(3) and rc._INFLIGHT == {}
+
+
+def test_async_tasks_and_threads_share_one_build():
+    builder = CountingBuilder()
+
+    async def main():
+        thread_result = []
+        t = threading.Thread(target=lambda: thread_result.append(rc.get_or_build(9, builder)))
+        tasks = [rc.aget_or_build(9, builder) for _ in range(6)]
+        t.start()
+        results = await asyncio.gather(*tasks)
+        await asyncio.get_running_loop().run_in_executor(None, t.join)
+        return results + thread_result
+
+    results = asyncio.run(main())
+    assert builder.calls == 1
+    assert results == ["retriever-1"] * 7
+
+
+def test_aget_or_build_returns_resident_without_building():
+    rc.set_retriever(5, "cached", 10)
+    builder = CountingBuilder()
+    assert asyncio.run(rc.aget_or_build(5, builder)) == "cached"
+    assert builder.calls == 0
+
+
+def test_clear_during_build_is_not_cached():
+    started = threading.Event()
+
+    def builder():
+        started.set()
+        time.sleep(0.2)
+        return "stale", 100
+
+    result = []
+    t = threading.Thread(target=lambda: result.append(rc.get_or_build(4, builder)))
+    t.start()
+    started.wait()
+    rc.clear_retriever(4)
+    t.join()
+
+    assert result == ["stale"]           # 기다리던 호출자는 결과를 받지만
+    assert not rc.has_retriever(4)       # 삭제된 문서는 캐시에 다시 올라가지 않음
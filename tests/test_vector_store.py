@@ -0,0 +1,111 @@
+# tests/test_vector_store.py
+# 압축 저장 모드(flat/fp16/sq8/pq) 선택·크기 계산 + 정확 벡터 재채점 결과가 flat 검색과 같은지
+
+import pytest
+
+np = pytest.importorskip("numpy")
+faiss = pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from services import vector_store as vs  # noqa: E402
+
+
+def _corpus(n=3000, d=64, rank=8, seed=0):
+    """저차원 구조 + 잡음 (실제 임베딩처럼 양자화 후에도 이웃 구조가 남는 데이터)"""
+    rng = np.random.default_rng(seed)
+    latent = rng.standard_normal((n, rank)).astype(np.float32)
+    proj = rng.standard_normal((rank, d)).astype(np.float32)
+    return (latent @ proj + 0.05 * rng.standard_normal((n, d))).astype(np.float32), rng
+
+
+def _exact_top(vectors, query, k):
+    return list(np.argsort(np.sum((vectors - query) ** 2, axis=1))[:k])
+
+
+@pytest.mark.parametrize("storage, expected", [
+    ("flat", "flat"), ("fp16", "fp16"), ("sq8", "sq8"), ("pq", "pq"),
+])
+def test_build_faiss_index_storage_modes(monkeypatch, storage, expected):
+    monkeypatch.setattr(vs, "VECTOR_PQ_M", 8)
+    vectors, _ = _corpus()
+    index = vs.build_faiss_index(vectors, storage)
+
+    assert vs.storage_mode(index) == expected
+    assert index.ntotal == len(vectors)
+    # 코드 + PQ 코드북/SQ 범위까지 센 추정치가 직렬화 크기와 거의 같음
+    assert abs(vs.index_nbytes(index) - len(faiss.serialize_index(index))) < 1024
+
+
+def test_pq_falls_back_to_sq8_when_codebook_does_not_pay_off(monkeypatch):
+    monkeypatch.setattr(vs, "VECTOR_PQ_M", 64)      # 코드 64B/청크 → 코드북 포함 시 sq8보다 큼
+    vectors, _ = _corpus(n=600)
+    assert vs.pq_nbytes(600, 64, 64, 8) >= vs.sq8_nbytes(600, 64)
+    assert vs.storage_mode(vs.build_faiss_index(vectors, "pq")) == "sq8"
+
+    tiny, _ = _corpus(n=10)                         # 코드북 학습에 벡터가 부족
+    assert vs.storage_mode(vs.build_faiss_index(tiny, "pq")) == "sq8"
+
+
+@pytest.mark.parametrize("storage", ["fp16", "sq8", "pq"])
+def test_rescored_top_k_matches_flat_search(monkeypatch, storage):
+    monkeypatch.setattr(vs, "VECTOR_PQ_M", 8)
+    vectors, rng = _corpus()
+    store = vs.build_vectorstore(
+        [f"c{i}" for i in range(len(vectors))], vectors, [{"i": i} for i in range(len(vectors))],
+        embedding=None, storage=storage, search_dim=0,
+    )
+    assert store.storage == storage and store.exact_vectors is not None
+
+    for _ in range(5):
+        query = vectors[rng.integers(len(vectors))] + 0.1 * rng.standard_normal(vectors.shape[1]).astype(np.float32)
+        hits = store.similarity_search_with_score_by_vector(query.tolist(), k=5, fetch_k=100)
+        assert [d.metadata["i"] for d, _ in hits] == _exact_top(vectors, query, 5)
+        # 점수는 압축 코드가 아닌 정확 벡터 기준 L2 거리
+        d0, s0 = hits[0]
+        assert s0 == pytest.approx(float(np.sum((vectors[d0.metadata["i"]] - query) ** 2)), rel=1e-4)
+
+
+def test_flat_storage_keeps_no_exact_copy():
+    vectors, _ = _corpus(n=50)
+    store = vs.build_vectorstore(["t"] * 50, vectors, [{}] * 50, embedding=None, storage="flat", search_dim=0)
+    assert store.storage == "flat" and store.exact_vectors is None
+
+
+def _matryoshka(n=2000, d=64, seed=1):
+    """앞쪽 차원에 에너지가 몰린 벡터 (text-embedding-3의 Matryoshka 표현 흉내)"""
+    rng = np.random.default_rng(seed)
+    scale = np.linspace(1.0, 0.05, d).astype(np.float32)
+    return (rng.standard_normal((n, d)).astype(np.float32) * scale), rng
+
+
+def test_search_dim_truncates_index_and_rescores_with_full_vectors():
+    vectors, rng = _matryoshka()
+    store = vs.build_vectorstore(
+        [f"c{i}" for i in range(len(vectors))], vectors, [{"i": i} for i in range(len(vectors))],
+        embedding=None, storage="flat", search_dim=16,
+    )
+    assert store.search_dim == 16 and store.index.d == 16
+    assert store.exact_vectors.shape == vectors.shape
+
+    for _ in range(5):
+        query = vectors[rng.integers(len(vectors))] + 0.05 * rng.standard_normal(64).astype(np.float32)
+        hits = store.similarity_search_with_score_by_vector(query.tolist(), k=5, fetch_k=200)
+        assert [d.metadata["i"] for d, _ in hits] == _exact_top(vectors, query, 5)
+
+    batch = store.max_marginal_relevance_search_batch_by_vectors([vectors[3].tolist()], k=1, fetch_k=50)
+    assert batch[0][0].metadata["i"] == 3
+
+
+def test_search_dim_larger_than_embedding_is_ignored():
+    vectors, _ = _matryoshka(n=50)
+    store = vs.build_vectorstore(["t"] * 50, vectors, [{}] * 50, embedding=None, storage="flat", search_dim=128)
+    assert store.search_dim == 0 and store.index.d == 64
+
+
+def test_search_dim_rejects_metadata_filter():
+    vectors, _ = _matryoshka(n=50)
+    store = vs.build_vectorstore(["t"] * 50, vectors, [{"page": 1}] * 50, embedding=None, storage="flat", search_dim=16)
+    with pytest.raises(ValueError):
+        store.similarity_search_with_score_by_vector(vectors[0].tolist(), k=3, filter={"page": 1})
+    with pytest.raises(ValueError):
+        store.max_marginal_relevance_search_with_score_by_vector(vectors[0].tolist(), k=3, filter={"page": 1})